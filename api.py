@@ -1,10 +1,9 @@
 import os
-import uvicorn
 import logging
-from fastapi import FastAPI, APIRouter
-from routers import health, order
-
-from trader import Trader
+from fastapi import FastAPI, APIRouter, Request
+from fastapi.concurrency import run_in_threadpool
+from routers import debug, export, health, log, order
+from common.profiler import SamplingProfiler
 
 logging.basicConfig(level=logging.WARNING)
 
@@ -13,17 +12,56 @@ router = APIRouter()
 
 @router.post("/")
 def cron():
+    from trader import Trader
     if Trader().run():
         return {"Status": "Success"}
     else:
         return {"Status": "Failure"}
 
+@router.post("/backfill")
+def backfill(symbol: str = None, dry_run: bool = True):
+    from trader import Trader
+    return Trader().backfill_reports(symbol=symbol, dry_run=dry_run)
+
+@router.post("/warmup")
+def warm_up():
+    from trader import Trader
+    return Trader().warm_up()
+
+@router.post("/screen")
+def screen(top: int = 20, dry_run: bool = True):
+    from trader import Trader
+    from trading.screener import Screener
+    trader = Trader()
+    return Screener(trader.alpaca_trading_client, trader.data_client).run(top=top, dry_run=dry_run)
+
 
 app = FastAPI()
 app.include_router(health.router)
 app.include_router(order.router)
+app.include_router(log.router)
+app.include_router(debug.router)
+app.include_router(export.router)
 app.include_router(router)
 
 
+@app.middleware("http")
+async def profile(request: Request, call_next):
+    '''Runs the cron and order requests under the sampling profiler when asked with ?profile=1 or X-Profile: 1.'''
+    flag = request.query_params.get("profile", None) or request.headers.get("x-profile", None)
+    path = request.url.path
+    profiled = path == "/" or (path.startswith("/v1/order") and path != "/v1/order/stream")
+    profiler = SamplingProfiler()
+    if flag not in ("1", "true") or not profiled or not profiler.start():
+        return await call_next(request)
+    try:
+        response = await call_next(request)
+    finally:
+        profiler.stop()
+    response.headers["X-Profile-Id"] = await run_in_threadpool(debug.save_profile, profiler, request.method, path)
+    return response
+
+
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,146 @@
+import os
+import random
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, UTC
+from itertools import product
+from multiprocessing import shared_memory
+
+from backtest.simulator import simulate, swing_sums
+from data.bar_store import BarStore
+from data.data_client import DataClient, LogLevel
+
+
+DEFAULT_SPACE = {
+    "entry_period": [5, 7, 10, 14],
+    "exit_period": [10, 20, 30, 45],
+    "entry_swing": [0.1, 0.25, 0.5, 0.75],
+    "exit_swing": [0.1, 0.25, 0.5, 0.75],
+    "rebuy_drop": [0.01, 0.025, 0.05, 0.1],
+    "batch_size": [20],
+    "total_allowed_batches": [3, 5, 8],
+}
+
+
+class ParameterSpace():
+    def __init__(self, space: dict = None):
+        self.space = space if space else DEFAULT_SPACE
+
+    def __len__(self):
+        total = 1
+        for values in self.space.values():
+            total *= len(values)
+        return total
+
+    def grid(self):
+        names = list(self.space.keys())
+        for values in product(*self.space.values()):
+            yield dict(zip(names, values))
+
+    def sample(self, n: int, seed: int = None):
+        rng = random.Random(seed)
+        for _ in range(n):
+            yield {name: rng.choice(values) for name, values in self.space.items()}
+
+
+# worker state, attached once per process by _attach
+_WORKER = dict()
+
+
+def _attach(name: str, n: int):
+    shm = shared_memory.SharedMemory(name=name)
+    view = shm.buf.cast("d")
+    _WORKER["shm"] = shm
+    _WORKER["h"], _WORKER["l"], _WORKER["c"] = view[0:n], view[n:2 * n], view[2 * n:3 * n]
+    _WORKER["sums"] = swing_sums(_WORKER["h"], _WORKER["l"])
+
+
+def _evaluate(chunk: list[dict]) -> list[tuple]:
+    h, l, c, sums = _WORKER["h"], _WORKER["l"], _WORKER["c"], _WORKER["sums"]
+    return [(params, simulate(params, h, l, c, sums)) for params in chunk]
+
+
+class Optimizer():
+    def __init__(self, data_client: DataClient, bar_store: BarStore = None, workers: int = None, chunk_size: int = 64):
+        self.data_client = data_client
+        self.bar_store = bar_store if bar_store else BarStore()
+        self.workers = workers if workers else os.cpu_count()
+        self.chunk_size = chunk_size
+
+    def load_bars(self, client, symbol: str, days: int = 365 * 3):
+        '''Syncs daily bars into the bar store and returns the high/low/close columns.'''
+        end = datetime.now(UTC)
+        start = end - timedelta(days=days)
+        if client:
+            self.bar_store.sync(client, symbol, "1D", start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
+        series = self.bar_store.read(symbol, "1D", start)
+        return series["h"], series["l"], series["c"]
+
+    def search(self, h, l, c, candidates, max_capital: float = None) -> list[tuple]:
+        '''Evaluates every candidate in a process pool; the bars are shared, not copied, with the workers.'''
+        n = len(c)
+        shm = shared_memory.SharedMemory(create=True, size=max(3 * n, 1) * 8)
+        view = shm.buf.cast("d")
+        try:
+            view[0:n], view[n:2 * n], view[2 * n:3 * n] = array("d", h), array("d", l), array("d", c)
+
+            chunks, chunk = list(), list()
+            for params in candidates:
+                chunk.append(params)
+                if len(chunk) >= self.chunk_size:
+                    chunks.append(chunk)
+                    chunk = list()
+            if chunk:
+                chunks.append(chunk)
+
+            results = list()
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_attach, initargs=(shm.name, n)) as pool:
+                for evaluated in pool.map(_evaluate, chunks):
+                    results.extend(evaluated)
+        finally:
+            view.release()
+            shm.close()
+            shm.unlink()
+
+        if max_capital:
+            results = [r for r in results if r[1]["peak_capital"] <= max_capital]
+        # realized profit first, never-sold inventory breaks ties
+        results.sort(key=lambda r: (r[1]["profit"], r[1]["unrealized"]), reverse=True)
+        return results
+
+    def optimize(self, client, symbol: str, space: ParameterSpace = None, samples: int = None, max_capital: float = None, seed: int = None) -> dict | None:
+        '''Grid searches the space, or randomly samples it when `samples` is set; returns the best parameters.'''
+        space = space if space else ParameterSpace()
+        h, l, c = self.load_bars(client, symbol)
+        candidates = space.sample(samples, seed) if samples else space.grid()
+        results = self.search(h, l, c, candidates, max_capital)
+        if not results:
+            return None
+
+        params, result = results[0]
+        self.data_client.log(
+            message=f"Optimized {symbol}; profit {result['profit']} over {len(c)} bars",
+            log_level=LogLevel.INFO,
+            symbol=symbol,
+            obj={"params": params, "result": result, "evaluated": len(results)}
+        )
+        return {"params": params, "result": result}
+
+    def apply(self, watchlist_id, params: dict):
+        '''Writes the winning parameters back to one watchlist document, each account has its own per symbol.'''
+        return self.data_client.update("watchlist", {"_id": watchlist_id}, params, upsert=False)
+
+
+if __name__ == '__main__':
+    from trader import Trader
+
+    trader = Trader()
+    optimizer = Optimizer(trader.data_client)
+    # a symbol on several accounts' watchlists is searched once
+    searched = dict()
+    for doc in trader.data_client.read("watchlist", {"is_active": True, "type": "stock"}):
+        if doc["symbol"] not in searched:
+            searched[doc["symbol"]] = optimizer.optimize(trader.alpaca_trading_client, doc["symbol"], samples=5000)
+        best = searched[doc["symbol"]]
+        if best:
+            optimizer.apply(doc["_id"], best["params"])
@@ -0,0 +1,75 @@
+from itertools import accumulate
+
+
+# the watchlist fields the strategy reads, and their live defaults
+DEFAULT_PARAMS = {
+    "entry_period": 7,
+    "exit_period": 30,
+    "entry_swing": 0.25,
+    "exit_swing": 0.25,
+    "rebuy_drop": 0.025,
+    "batch_size": 20,
+    "total_allowed_batches": 5,
+}
+
+
+def swing_sums(h, l) -> list:
+    '''Prefix sums of the daily swing, so any window average is two lookups.'''
+    return [0.0] + list(accumulate(h[i] - l[i] for i in range(len(h))))
+
+
+def simulate(params: dict, h, l, c, sums: list = None) -> dict:
+    '''Replays strategy.swing.SwingStrategy over ascending daily bars.
+
+    Each bar stands in for one tick: the window ends at the bar (like the live
+    bars request that includes today) and its close is the latest price.
+    '''
+    p = {**DEFAULT_PARAMS, **params}
+    entry_period, exit_period = p["entry_period"], p["exit_period"]
+    sums = sums if sums else swing_sums(h, l)
+
+    lots = list()
+    profit = 0.0
+    buys = sells = 0
+    peak_capital = 0.0
+
+    def avg_swing(period, i):
+        return (sums[i + 1] - sums[i + 1 - period]) / period
+
+    def entry(i, close):
+        day_high = max(h[i + 1 - entry_period:i + 1])
+        return (day_high - close) > avg_swing(entry_period, i) * p["entry_swing"]
+
+    for i in range(max(entry_period, exit_period) - 1, len(c)):
+        close = c[i]
+        if not lots:
+            if entry(i, close):
+                lots.append((close, p["batch_size"] / close))
+                buys += 1
+        else:
+            # SwingStrategy sells
+            target_swing = avg_swing(exit_period, i) * p["exit_swing"]
+            remaining = list()
+            for lot in lots:
+                if round(lot[0] + target_swing, 2) <= close:
+                    profit += round((close - lot[0]) * lot[1], 2)
+                    sells += 1
+                else:
+                    remaining.append(lot)
+            # SwingStrategy rebuy, evaluated against the lots open at the start of the tick
+            if len(lots) < p["total_allowed_batches"] and close <= lots[-1][0] * (1 - p["rebuy_drop"]) and entry(i, close):
+                remaining.append((close, p["batch_size"] / close))
+                buys += 1
+            lots = remaining
+        capital = sum(lot[0] * lot[1] for lot in lots)
+        peak_capital = max(peak_capital, capital)
+
+    unrealized = sum((c[-1] - lot[0]) * lot[1] for lot in lots) if len(c) else 0.0
+    return {
+        "profit": round(profit, 2),
+        "unrealized": round(unrealized, 2),
+        "buys": buys,
+        "sells": sells,
+        "open_lots": len(lots),
+        "peak_capital": round(peak_capital, 2),
+    }
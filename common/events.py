@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+
+from data.data_client import LogLevel
+from models.order import Order
+
+
+def buy_event(order: Order) -> dict:
+    return {
+        "id": str(order.buy_order_id),
+        "type": "buy",
+        "content": f"Bought {order.quantity}@{order.buy_price}",
+        "target": order.symbol,
+        "date": order.buy_at_utc.strftime("%b %d"),
+        "datetime": order.buy_at_utc.strftime("%Y-%m-%d"),
+        "profit": 0.0,
+    }
+
+def sell_event(order: Order) -> dict:
+    return {
+        "id": str(order.sell_order_id),
+        "type": "sell",
+        "content": f"Sold {order.quantity}@{order.sell_price}; Profit: {order.profit}",
+        "target": order.symbol,
+        "date": order.sell_at_utc.strftime("%b %d"),
+        "datetime": order.sell_at_utc.strftime("%Y-%m-%d"),
+        # the change to the realized p&l, the dashboard adds it to the totals from /v1/order/profit/
+        "profit": order.profit,
+    }
+
+
+class EventBus():
+    '''In-process pub/sub between the trading clients and the order stream.
+
+    publish() is called from the trader's worker threads; every subscriber is an asyncio.Queue
+    fed on its own event loop. A slow subscriber loses its oldest events rather than blocking trading.
+    '''
+    MAX_QUEUE = 100
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = dict()
+        self.relay = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.MAX_QUEUE)
+        with self.lock:
+            self.subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self.lock:
+            self.subscribers.pop(queue, None)
+
+    def publish(self, event: dict):
+        with self.lock:
+            subscribers = list(self.subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, event)
+            except RuntimeError:
+                # the loop is closed, the subscriber went away without unsubscribing
+                self.unsubscribe(queue)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, event: dict):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def start_relay(self, data_client, session_id: str):
+        '''Relays fills written by other instances from the order change stream, once per process.'''
+        with self.lock:
+            if self.relay and self.relay.is_alive():
+                return
+            self.relay = threading.Thread(target=self._relay, args=(data_client, session_id), daemon=True)
+            self.relay.start()
+
+    def _relay(self, data_client, session_id: str):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update"]}}}]
+        while True:
+            try:
+                for change in data_client.watch("order", pipeline):
+                    order = Order.from_mongo(change["fullDocument"])
+                    fields = change.get("updateDescription", {}).get("updatedFields", {})
+                    # this process already published its own orders
+                    if change["operationType"] == "insert" and order.buy_status == "filled" and order.buy_session != session_id:
+                        self.publish(buy_event(order))
+                    elif fields.get("sell_status", None) == "filled" and order.sell_session != session_id:
+                        self.publish(sell_event(order))
+            except Exception as e:
+                data_client.log(message="Order change stream failed; reconnecting.", log_level=LogLevel.ERROR, obj={"error": str(e)})
+                time.sleep(5)
+
+
+bus = EventBus()
@@ -0,0 +1,54 @@
+from decimal import Decimal, ROUND_HALF_EVEN
+
+from bson.decimal128 import Decimal128
+
+# money is held in micro-dollars and quantities in nano-shares, alpaca fractional orders go to 9 decimals
+MONEY_SCALE = 10**6
+QUANTITY_SCALE = 10**9
+CENT = MONEY_SCALE // 100
+
+
+def to_decimal(value) -> Decimal | None:
+    '''The shortest decimal for a float, 0.1 stays 0.1 rather than its binary expansion.'''
+    if value is None:
+        return None
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+def to_fixed(value, scale: int = MONEY_SCALE) -> int | None:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        # exact for anything with at most scale's decimals below 2**53 units, and far cheaper than Decimal
+        return round(value * scale)
+    return int((to_decimal(value) * scale).to_integral_value(ROUND_HALF_EVEN))
+
+def from_fixed(value: int | None, scale: int = MONEY_SCALE) -> float | None:
+    if value is None:
+        return None
+    # int / int is correctly rounded, the float nearest to the exact amount
+    return value / scale
+
+def div_round(n: int, d: int) -> int:
+    '''Integer division rounding half to even, like round() on an exact value.'''
+    q, r = divmod(n, d)
+    if r * 2 > d or (r * 2 == d and q % 2):
+        q += 1
+    return q
+
+def profit(buy_price, sell_price, quantity) -> int:
+    '''(sell - buy) * quantity in micro-dollars, rounded to the cent without any float step.'''
+    exact = (to_fixed(sell_price) - to_fixed(buy_price)) * to_fixed(quantity, QUANTITY_SCALE)
+    return div_round(exact, CENT * QUANTITY_SCALE) * CENT
+
+def to_decimal128(value) -> Decimal128 | None:
+    if value is None:
+        return None
+    return Decimal128(to_decimal(value))
+
+def from_decimal128(value) -> float | None:
+    '''Reads a stored amount, documents written before Decimal128 hold plain floats.'''
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    return value
@@ -1,10 +1,20 @@
 import base64
 import json
-import requests
-from datetime import datetime, timedelta, UTC
+from array import array
+from bisect import bisect_left
+from datetime import datetime, UTC
+from itertools import accumulate
 
 from abc import ABC, abstractmethod
 
+from common import fixed_point
+
+
+def aware(value: datetime | None) -> datetime | None:
+    # pymongo hands back naive utc datetimes
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value
 
 def get_local_config() -> dict:
     with open(".secret/config-local.json", "r") as f:
@@ -21,6 +31,11 @@ class Notifier(ABC):
     def alert():
         pass
 
+class NullNotifier(Notifier):
+    '''Drops every alert, e.g. the simulated orders of shadow mode.'''
+    def alert(self, message: str, bot_id: str = None, channel_id: str = None):
+        return None
+
 class TelegramNotifier(Notifier):
     def __init__(self, bot_id: str, channel_id: str = "-1002416451737"):
         self.bot_id = bot_id
@@ -33,6 +48,8 @@ class TelegramNotifier(Notifier):
         if not channel_id:
             channel_id = self.channel_id
 
+        import requests
+
         uri = f"https://api.telegram.org/bot{bot_id}/sendMessage?chat_id={channel_id}&text={message}"
         ret = requests.get(uri)
         return ret
@@ -80,33 +97,26 @@ class Helper():
         return ret
 
     @staticmethod
-    def calculate_profit(records: dict) -> dict:
-        ret = dict()
-        
-        today = 0.0
-        last_30 = 0.0
-        last_60 = 0.0
-        all_time = 0.0
-        symbols = dict()
+    def calculate_profit(records: list) -> dict:
+        '''Realized profit today, over the last 30 and 60 days, all time and per symbol.'''
+        # sums are taken over integer micro-dollars so thousands of lots add up exactly
+        today = datetime.now(UTC).date().toordinal()
+        ledger = sorted((record.sell_at_utc.date().toordinal(), fixed_point.to_fixed(record.profit or 0), record.symbol) for record in records)
+        days = array("l", (day for day, _, _ in ledger))
+        # running[i] is the profit of every sale before ledger[i], a window is one subtraction
+        running = array("q", accumulate((profit for _, profit, _ in ledger), initial=0))
+
+        def since(day: int) -> float:
+            return fixed_point.from_fixed(running[-1] - running[bisect_left(days, day)])
 
-        for record in records:
-            if record.sell_at_utc.date() == datetime.now(UTC).date():
-                today += record.profit
-            if record.sell_at_utc.date() <= datetime.now(UTC).date() + timedelta(days=30):
-                last_30 += record.profit
-            if record.sell_at_utc.date() <= datetime.now(UTC).date() + timedelta(days=60):
-                last_60 += record.profit
-            
-            all_time += record.profit
-            
-            if record.symbol not in ret:
-                symbols[f'{record.symbol}'] = 0
-            symbols[f'{record.symbol}'] += record.profit
-        
-        ret["today"] = today
-        ret["last_30"] = last_30
-        ret["last_60"] = last_60
-        ret["all_time"] = all_time
-        ret["symbols"] = symbols
-
-        return ret
\ No newline at end of file
+        symbols = dict()
+        for _, profit, symbol in ledger:
+            symbols[symbol] = symbols.get(symbol, 0) + profit
+
+        return {
+            "today": since(today),
+            "last_30": since(today - 30),
+            "last_60": since(today - 60),
+            "all_time": fixed_point.from_fixed(running[-1]),
+            "symbols": {symbol: fixed_point.from_fixed(profit) for symbol, profit in symbols.items()},
+        }
\ No newline at end of file
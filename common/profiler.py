@@ -0,0 +1,60 @@
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SamplingProfiler():
+    '''Samples the stack of every thread from a background thread while it is running.
+
+    The result is in the folded format flamegraph.pl and speedscope read: one
+    "thread;outer;...;inner count" line per distinct stack.
+    '''
+    INTERVAL = 0.01
+    MAX_STACKS = 5000
+    # one profile at a time, a second request runs unprofiled
+    ACTIVE = threading.Lock()
+
+    def __init__(self, interval: float = INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.duration = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> bool:
+        if not self.ACTIVE.acquire(blocking=False):
+            return False
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.time() - self.started_at
+        self.ACTIVE.release()
+
+    def _run(self):
+        names = dict()
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = list()
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common(self.MAX_STACKS))
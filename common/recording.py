@@ -0,0 +1,218 @@
+import copy
+import threading
+import time
+from collections import deque
+from datetime import datetime, UTC
+from types import SimpleNamespace
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+# query parameters derived from the clock, they differ between a recording and its replay
+VOLATILE_PARAMS = ("start", "end", "after", "until")
+# config keys that are never written to an archive
+SECRET_KEYS = ("key", "secret", "uri", "bot", "token", "password")
+RESULT_FIELDS = ("inserted_id", "inserted_count", "matched_count", "modified_count", "upserted_count", "upserted_id", "deleted_count")
+
+
+def http_key(method: str, url: str, account: str = None) -> str:
+    '''Account, method and url of a request without the parameters that depend on when it ran.'''
+    parts = urlsplit(url)
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if k not in VOLATILE_PARAMS])
+    return f"{account} {method} {parts.path}?{query}" if query else f"{account} {method} {parts.path}"
+
+def mongo_key(operation: str, collection: str, query: dict = None) -> str:
+    '''Account, operation, collection and the fields a query filters on; the other values hold times and ids.
+
+    Writes are keyed without their query, the result counts of two accounts' writes may be swapped on replay.
+    '''
+    account = query.get("account", None) if query else None
+    return f"{account} {operation} {collection} {','.join(sorted(query))}" if query else f"{account} {operation} {collection}"
+
+def redact(config):
+    '''The config without credentials, also inside the "accounts" list.'''
+    if isinstance(config, dict):
+        return {k: redact(v) for k, v in config.items() if not any(s in k for s in SECRET_KEYS)}
+    if isinstance(config, list):
+        return [redact(v) for v in config]
+    return config
+
+def result(res) -> dict | None:
+    '''The counts of a pymongo write result, what callers read of it.'''
+    if res is None:
+        return None
+    return {f: getattr(res, f) for f in RESULT_FIELDS if hasattr(res, f)}
+
+
+class Response():
+    '''The parts of a requests.Response that TradingClient.request reads.'''
+
+    def __init__(self, status_code: int, headers: dict, content: str):
+        from requests.structures import CaseInsensitiveDict
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content.encode()
+
+    @classmethod
+    def from_response(cls, res) -> "Response":
+        return cls(res.status_code, dict(res.headers), res.content.decode(errors="replace"))
+
+    def to_json(self) -> dict:
+        return {"status_code": self.status_code, "headers": dict(self.headers), "content": self.content.decode()}
+
+
+class Recorder():
+    '''Appends every broker request and mongo call of the process to a JSONL archive.
+
+    The first line holds the config without its secrets, then one line per call:
+    {"source", "key", "thread", "at", "elapsed", "response"} or "error" instead of "response".
+    '''
+
+    def __init__(self, path: str, config: dict = None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8")
+        self.write({"source": "archive", "recorded_at": datetime.now(UTC), "config": redact(config or {})})
+
+    def write(self, entry: dict):
+        from bson import json_util
+        line = json_util.dumps(entry, json_options=json_util.CANONICAL_JSON_OPTIONS)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def call(self, source: str, key: str, fn, encode=None, decode=None, write: bool = False):
+        started = time.perf_counter()
+        entry = {"source": source, "key": key, "thread": threading.current_thread().name, "at": time.time()}
+        try:
+            ret = fn()
+        except Exception as e:
+            self.write({**entry, "elapsed": time.perf_counter() - started, "error": str(e)})
+            raise
+        self.write({**entry, "elapsed": time.perf_counter() - started, "response": encode(ret) if encode else ret})
+        return ret
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class Replayer():
+    '''Answers calls from an archive instead of alpaca and mongo.
+
+    Calls with the same (source, key) get the recorded responses in order, the last one repeats once
+    they run out. Each answer is held for the recorded latency times `latency_scale`, 0 answers at once.
+    A read that was never recorded raises, a write that was not (e.g. a log sampled out) returns None.
+    '''
+
+    def __init__(self, path: str, latency_scale: float = 1.0):
+        from bson import json_util
+        self.path = path
+        self.latency_scale = latency_scale
+        self.lock = threading.Lock()
+        self.config = dict()
+        self.calls = dict()
+        self.ticks = list()
+        self.misses = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                entry = json_util.loads(line)
+                if entry["source"] == "archive":
+                    self.config = entry["config"]
+                elif entry["source"] == "tick":
+                    self.ticks.append(entry)
+                else:
+                    self.calls.setdefault((entry["source"], entry["key"]), deque()).append(entry)
+
+    def call(self, source: str, key: str, fn, encode=None, decode=None, write: bool = False):
+        with self.lock:
+            queue = self.calls.get((source, key), None)
+            if not queue:
+                self.misses += 1
+                if write:
+                    return None
+                raise Exception(f"Not recorded: {source} {key}")
+            entry = queue.popleft() if len(queue) > 1 else queue[0]
+        if self.latency_scale:
+            time.sleep(entry["elapsed"] * self.latency_scale)
+        if "error" in entry:
+            raise Exception(entry["error"])
+        # the last response may be handed out again, callers must not see each other's changes
+        ret = copy.deepcopy(entry["response"])
+        return decode(ret) if decode else ret
+
+    def write(self, entry: dict):
+        pass
+
+    def close(self):
+        pass
+
+
+# the Recorder or Replayer of the process, None calls straight through
+ARCHIVE = None
+ARCHIVE_LOCK = threading.Lock()
+
+
+def record(path: str, config: dict = None) -> Recorder:
+    '''Starts recording to `path`; a Trader built again for the same archive keeps appending to it.'''
+    global ARCHIVE
+    with ARCHIVE_LOCK:
+        if not (isinstance(ARCHIVE, Recorder) and ARCHIVE.path == path):
+            ARCHIVE = Recorder(path, config)
+        return ARCHIVE
+
+def replay(path: str, latency_scale: float = 1.0) -> Replayer:
+    global ARCHIVE
+    with ARCHIVE_LOCK:
+        ARCHIVE = Replayer(path, latency_scale)
+        return ARCHIVE
+
+def replaying() -> bool:
+    return isinstance(ARCHIVE, Replayer)
+
+def stop():
+    global ARCHIVE
+    with ARCHIVE_LOCK:
+        if ARCHIVE:
+            ARCHIVE.close()
+        ARCHIVE = None
+
+def call(source: str, key: str, fn, encode=None, decode=None, write: bool = False):
+    '''Runs `fn`, recording or replaying its result when an archive is active.
+
+    `encode` turns the result into something json_util can store, `decode` turns it back on replay.
+    '''
+    archive = ARCHIVE
+    if archive is None:
+        return fn()
+    return archive.call(source, key, fn, encode, decode, write)
+
+def http(method: str, url: str, fn, account: str = None):
+    return call("http", http_key(method, url, account), fn, encode=lambda res: Response.from_response(res).to_json(), decode=lambda res: Response(**res))
+
+def mongo(operation: str, collection: str, fn, query: dict = None, write: bool = False):
+    if write:
+        return call("mongo", mongo_key(operation, collection), fn, encode=result, decode=lambda res: SimpleNamespace(**res) if res is not None else None, write=True)
+    return call("mongo", mongo_key(operation, collection, query), fn)
+
+def tick(elapsed: float, stats: dict = None):
+    '''Marks the end of a Trader.run in the archive, replays run one tick per mark.'''
+    archive = ARCHIVE
+    if archive is not None:
+        archive.write({"source": "tick", "elapsed": elapsed, "stats": stats or {}})
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Replays the ticks of an archive against Trader.run")
+    parser.add_argument("archive")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="1 replays the recorded latencies, 0 none")
+    args = parser.parse_args()
+
+    replayer = replay(args.archive, args.latency_scale)
+    from trader import Trader
+    for i, recorded in enumerate(replayer.ticks or [{"elapsed": None}]):
+        trader = Trader({**replayer.config, "uri": None, "record": None})
+        started = time.perf_counter()
+        trader.run()
+        print(json.dumps({"tick": i, "recorded": recorded["elapsed"], "replayed": round(time.perf_counter() - started, 3), "misses": replayer.misses}))
@@ -0,0 +1,189 @@
+import mmap
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, UTC
+
+
+# alpaca bar fields and the typecode each one is stored as, one file per column
+COLUMNS = {
+    "t": "q",
+    "o": "d",
+    "h": "d",
+    "l": "d",
+    "c": "d",
+    "v": "d",
+    "n": "q",
+    "vw": "d",
+}
+
+TIMEFRAMES = {
+    "1Min": 60,
+    "5Min": 300,
+    "15Min": 900,
+    "30Min": 1800,
+    "1Hour": 3600,
+    "1H": 3600,
+    "1Day": 86400,
+    "1D": 86400,
+}
+
+
+def to_epoch(value: str | datetime | int) -> int:
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not value.tzinfo:
+        value = value.replace(tzinfo=UTC)
+    return int(value.timestamp())
+
+
+def from_epoch(value: int) -> str:
+    return datetime.fromtimestamp(value, UTC).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class BarSeries():
+    '''Columnar OHLCV bars in ascending time order; columns are memoryviews over the store's mmaps.'''
+    def __init__(self, columns: dict):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns["t"])
+
+    def __getitem__(self, column: str):
+        return self.columns[column]
+
+    def slice(self, start: int, end: int):
+        return BarSeries({name: column[start:end] for name, column in self.columns.items()})
+
+    def to_bars(self, desc: bool = True) -> dict:
+        '''Returns the bars in the same shape as the alpaca bars endpoint, so Helper.process_bar can consume them.'''
+        index = range(len(self) - 1, -1, -1) if desc else range(len(self))
+        bars = list()
+        for i in index:
+            bar = {name: column[i] for name, column in self.columns.items()}
+            bar["t"] = from_epoch(bar["t"])
+            bars.append(bar)
+        return {"bars": bars}
+
+
+class BarStore():
+    def __init__(self, root: str = ".bars"):
+        self.root = root
+        self.maps = dict()
+
+    def path(self, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.root, symbol.replace("/", "_"), timeframe)
+
+    def _open(self, symbol: str, timeframe: str) -> BarSeries:
+        key = (symbol, timeframe)
+        if key not in self.maps:
+            path = self.path(symbol, timeframe)
+            self._repair(path)
+            columns = dict()
+            for name, typecode in COLUMNS.items():
+                file = os.path.join(path, f"{name}.bin")
+                if not os.path.exists(file) or os.path.getsize(file) == 0:
+                    columns[name] = memoryview(array(typecode))
+                    continue
+                with open(file, "rb") as f:
+                    m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                columns[name] = memoryview(m).cast(typecode)
+            self.maps[key] = BarSeries(columns)
+        return self.maps[key]
+
+    @staticmethod
+    def _repair(path: str):
+        '''Truncates every column to the shortest one, an append that crashed midway leaves them uneven.'''
+        files = {name: os.path.join(path, f"{name}.bin") for name in COLUMNS}
+        sizes = {name: os.path.getsize(file) if os.path.exists(file) else 0 for name, file in files.items()}
+        rows = min(sizes[name] // array(typecode).itemsize for name, typecode in COLUMNS.items())
+        for name, typecode in COLUMNS.items():
+            if sizes[name] > rows * array(typecode).itemsize:
+                os.truncate(files[name], rows * array(typecode).itemsize)
+
+    def last_timestamp(self, symbol: str, timeframe: str) -> int | None:
+        t = self._open(symbol, timeframe)["t"]
+        return t[-1] if len(t) else None
+
+    def append(self, symbol: str, timeframe: str, bars: list[dict]) -> int:
+        '''Appends alpaca bars (any order) newer than the last stored bar; returns the number written.'''
+        last = self.last_timestamp(symbol, timeframe)
+        rows = sorted(((to_epoch(bar["t"]), bar) for bar in bars), key=lambda row: row[0])
+        if last is not None:
+            rows = [row for row in rows if row[0] > last]
+        # drop duplicate timestamps inside the batch
+        rows = [row for i, row in enumerate(rows) if i == 0 or row[0] != rows[i - 1][0]]
+        if not rows:
+            return 0
+
+        path = self.path(symbol, timeframe)
+        os.makedirs(path, exist_ok=True)
+        # t goes last, until it is written the other columns' new rows are cut off again by _repair
+        for name, typecode in sorted(COLUMNS.items(), key=lambda column: column[0] == "t"):
+            if name == "t":
+                values = array(typecode, (row[0] for row in rows))
+            elif typecode == "q":
+                values = array(typecode, (int(row[1].get(name, 0) or 0) for row in rows))
+            else:
+                values = array(typecode, (float(row[1].get(name, 0) or 0) for row in rows))
+            with open(os.path.join(path, f"{name}.bin"), "ab") as f:
+                values.tofile(f)
+
+        # the files grew, remap on the next read
+        self.maps.pop((symbol, timeframe), None)
+        return len(rows)
+
+    def read(self, symbol: str, timeframe: str, start: str | datetime | int = None, end: str | datetime | int = None) -> BarSeries:
+        '''Returns the bars with start <= t < end without copying them.'''
+        series = self._open(symbol, timeframe)
+        t = series["t"]
+        lo = bisect_left(t, to_epoch(start)) if start is not None else 0
+        hi = bisect_left(t, to_epoch(end)) if end is not None else len(t)
+        return series.slice(lo, hi)
+
+    def read_resampled(self, symbol: str, timeframe: str, source: str = "1Min", start=None, end=None, offset: int = 0) -> BarSeries:
+        return self.resample(self.read(symbol, source, start, end), timeframe, offset)
+
+    @staticmethod
+    def resample(series: BarSeries, timeframe: str, offset: int = 0) -> BarSeries:
+        '''Aggregates bars into `timeframe` buckets; `offset` shifts the bucket boundaries in seconds.'''
+        seconds = TIMEFRAMES[timeframe]
+        out = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        t, o, h, l, c, v, n, vw = (series[name] for name in COLUMNS)
+
+        i = 0
+        total = len(t)
+        while i < total:
+            bucket = (t[i] - offset) // seconds * seconds + offset
+            close = bucket + seconds
+            j = bisect_right(t, close - 1, i)
+            volume = sum(v[i:j])
+            out["t"].append(bucket)
+            out["o"].append(o[i])
+            out["h"].append(max(h[i:j]))
+            out["l"].append(min(l[i:j]))
+            out["c"].append(c[j - 1])
+            out["v"].append(volume)
+            out["n"].append(sum(n[i:j]))
+            out["vw"].append(sum(vw[k] * v[k] for k in range(i, j)) / volume if volume else c[j - 1])
+            i = j
+
+        return BarSeries({name: memoryview(column) for name, column in out.items()})
+
+    def sync(self, client, symbol: str, timeframe: str, start: str, end: str) -> int:
+        '''Downloads the bars missing from the store through an AlpacaTradingClient.'''
+        last = self.last_timestamp(symbol, timeframe)
+        if last is not None:
+            start = max(start, from_epoch(last + 1))
+        # pages come back newest first, so collect them all before appending
+        bars = list()
+        page_token = None
+        while True:
+            res = client.get_historical_bars(symbol, timeframe, 10000, start, end, page_token=page_token)
+            bars.extend(res.get("bars") or [])
+            page_token = res.get("next_page_token", None)
+            if not page_token:
+                break
+        return self.append(symbol, timeframe, bars)
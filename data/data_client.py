@@ -1,44 +1,174 @@
 from datetime import datetime, UTC
-from pymongo import MongoClient
+import random
+import threading
 import uuid
 
+from common import recording
+
 class LogLevel:
     INFO = "info"
     ERROR = "error"
     WARNING = "warning"
     DEBUG = "debug"
 
+# share of the messages per level that are written to the log collection, errors and warnings are always kept
+DEFAULT_LOG_SAMPLE_RATES = {
+    LogLevel.INFO: 1.0,
+    LogLevel.DEBUG: 0.1,
+}
+LOG_TTL_DAYS = 30
+
+
+def truncate(obj, max_items: int = 10, max_length: int = 500, depth: int = 3):
+    '''Bounds a log payload: long lists and strings are cut and deep nesting is stringified.'''
+    if isinstance(obj, str):
+        return obj if len(obj) <= max_length else f"{obj[:max_length]}...(+{len(obj) - max_length})"
+    if isinstance(obj, dict):
+        if depth <= 0:
+            return truncate(str(obj), max_items, max_length, 0)
+        items = list(obj.items())
+        ret = {str(k): truncate(v, max_items, max_length, depth - 1) for k, v in items[:max_items]}
+        if len(items) > max_items:
+            ret["..."] = f"+{len(items) - max_items} keys"
+        return ret
+    if isinstance(obj, (list, tuple)):
+        if depth <= 0:
+            return truncate(str(obj), max_items, max_length, 0)
+        ret = [truncate(v, max_items, max_length, depth - 1) for v in obj[:max_items]]
+        if len(obj) > max_items:
+            ret.append(f"+{len(obj) - max_items} items")
+        return ret
+    return obj
+
 # TODO: convert this to mongo client
 class DataClient():
-    def __init__(self, uri: str, database: str = "crowemi-trades", session_id: str = None):
+    # log indexes are created once per process
+    LOG_INDEXED = False
+    # writes to these bump a counter in the meta collection, the api's conditional GETs key on it
+    VERSIONED = ("order",)
+    # one MongoClient (and its connection pool) per uri for the life of the process, a Trader is built per request
+    CLIENTS = dict()
+    CLIENTS_LOCK = threading.Lock()
+
+    def __init__(self, uri: str, database: str = "crowemi-trades", session_id: str = None, log_ttl_days: int = LOG_TTL_DAYS, log_sample_rates: dict = None):
         if not session_id:
             session_id = uuid.uuid4().hex
         
         self.session_id = session_id
-        self.client: MongoClient = MongoClient(uri)
-        self.db = self.client.get_database(database)
+        self.uri = uri
+        self.database = database
+        self._client = None
+        self.log_ttl_days = log_ttl_days
+        self.log_sample_rates = {**DEFAULT_LOG_SAMPLE_RATES, **(log_sample_rates or {})}
+
+    @property
+    def client(self):
+        # pymongo is imported and connected on first use so the api can start without it
+        if self._client is None:
+            with DataClient.CLIENTS_LOCK:
+                if self.uri not in DataClient.CLIENTS:
+                    from pymongo import MongoClient
+                    DataClient.CLIENTS[self.uri] = MongoClient(self.uri)
+                self._client = DataClient.CLIENTS[self.uri]
+        return self._client
+
+    @property
+    def db(self):
+        return self.client.get_database(self.database)
 
     def log(self, message: str, log_level: str = LogLevel.INFO, symbol: str = None, obj: dict = None):
-        print(f"crowemi-trades: {self.session_id} {log_level}: {message}")
-        if obj:
-            print(f"crowemi-trades: {self.session_id} {log_level}: {obj}")
+        obj = truncate(obj) if obj else obj
+        print(f"crowemi-trades: {self.session_id} {log_level}: {message}{f' {obj}' if obj else ''}")
+        if random.random() >= self.log_sample_rates.get(log_level, 1.0):
+            return
+        self.ensure_log_indexes()
         self.write("log", {"created_at": datetime.now(UTC), "message": message, "level": log_level, "symbol": symbol, "obj": obj, "session": self.session_id})
 
-    def read(self, collection: str, query: dict):
+    def ensure_log_indexes(self):
+        if DataClient.LOG_INDEXED:
+            return
+        DataClient.LOG_INDEXED = True
+
+        def create():
+            collection = self.db.get_collection("log")
+            # documents expire log_ttl_days after they are written
+            collection.create_index("created_at", expireAfterSeconds=self.log_ttl_days * 86400)
+            collection.create_index([("session", 1), ("created_at", -1)])
+            collection.create_index([("symbol", 1), ("created_at", -1)])
+            collection.create_index([("level", 1), ("created_at", -1)])
+            # e.g. the errors of one symbol, most of a symbol's (symbol, created_at) range is info logs
+            collection.create_index([("symbol", 1), ("level", 1), ("created_at", -1)])
+
         try:
-            ret = list()
-            res = self.db.get_collection(collection).find(query)
-            [ret.append(doc) for doc in res]
-            return ret
+            recording.mongo("create_index", "log", create, write=True)
+        except Exception as e:
+            # e.g. the ttl changed, the existing index has to be dropped by hand
+            print(f"Error creating log indexes: {e}")
+
+    def read(self, collection: str, query: dict, projection: dict = None, sort: list = None, limit: int = 0):
+        try:
+            return recording.mongo("read", collection, lambda: list(self.db.get_collection(collection).find(query, projection, sort=sort, limit=limit)), query=query)
         except Exception as e:
             raise e
 
-    def write(self, collection: str, data: dict):
+    def iterate(self, collection: str, query: dict, projection: dict = None, sort: list = None, batch_size: int = 1000):
+        '''Documents one at a time from a cursor, only batch_size of them are held in memory.'''
+        cursor = self.db.get_collection(collection).find(query, projection, sort=sort, batch_size=batch_size)
         try:
+            yield from cursor
+        finally:
+            # also when the consumer stops early, e.g. a client disconnects mid export
+            cursor.close()
+
+    def write(self, collection: str, data: dict):
+        def insert():
             ret = self.db.get_collection(collection).insert_one(data)
+            self.bump_version(collection)
             return ret
+
+        try:
+            return recording.mongo("write", collection, insert, write=True)
         except Exception as e:
             raise e
 
     def update(self, collection: str, query: dict, data: dict, upsert: bool = False):
-        return self.db.get_collection(collection).update_one(query, {"$set": data}, upsert=upsert)
+        def update():
+            ret = self.db.get_collection(collection).update_one(query, {"$set": data}, upsert=upsert)
+            self.bump_version(collection)
+            return ret
+
+        return recording.mongo("update", collection, update, write=True)
+
+    def bulk_write(self, collection: str, operations: list, ordered: bool = False):
+        if not operations:
+            return None
+
+        def bulk_write():
+            ret = self.db.get_collection(collection).bulk_write(operations, ordered=ordered)
+            self.bump_version(collection)
+            return ret
+
+        return recording.mongo("bulk_write", collection, bulk_write, write=True)
+
+    def bump_version(self, collection: str):
+        if collection in self.VERSIONED:
+            # acknowledged, a lost bump leaves the etag stale and clients get 304 for changed data
+            self.db.get_collection("meta").update_one({"_id": f"{collection}_version"}, {"$inc": {"version": 1}}, upsert=True)
+
+    def version(self, collection: str) -> int:
+        '''Number of writes made to a VERSIONED collection.'''
+        doc = recording.mongo("version", collection, lambda: self.db.get_collection("meta").find_one({"_id": f"{collection}_version"}))
+        return doc["version"] if doc else 0
+
+    def watch(self, collection: str, pipeline: list = None):
+        '''Change stream over a collection; needs a replica set (atlas clusters are).'''
+        return self.db.get_collection(collection).watch(pipeline, full_document="updateLookup")
+
+    @staticmethod
+    def update_op(query: dict, data: dict, upsert: bool = False, on_insert: dict = None):
+        '''Builds an update for bulk_write, mirrors update().'''
+        from pymongo import UpdateOne
+        update = {"$set": data} if data else {}
+        if on_insert:
+            update["$setOnInsert"] = on_insert
+        return UpdateOne(query, update, upsert=upsert)
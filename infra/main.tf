@@ -98,3 +98,26 @@ resource "google_cloud_scheduler_job" "this" {
     }
   }
 }
+
+# before the open, so the first tick only fetches today's bars and the latest prices
+resource "google_cloud_scheduler_job" "warmup" {
+  name             = "${local.name}-warmup"
+  region           = local.region
+  project          = local.project
+  schedule         = "15 9 * * 1-5"
+  time_zone        = "America/New_York"
+  attempt_deadline = "320s"
+
+  retry_config {
+    retry_count = 1
+  }
+
+  http_target {
+    http_method = "POST"
+    uri         = "${google_cloud_run_v2_service.this.uri}/warmup"
+
+    oidc_token {
+      service_account_email = google_service_account.this.email
+    }
+  }
+}
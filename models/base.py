@@ -5,6 +5,8 @@ from dataclasses import dataclass, asdict, fields
 
 from bson import json_util
 
+from common import fixed_point
+
 IGNORE_FIELDS = ["_id"]
 
 
@@ -21,6 +23,9 @@ class BaseModel():
     updated_at: datetime = datetime(1970, 1, 1, 0, 0, 0, 0, UTC)
     updated_at_session: str = None
 
+    # amounts stored as Decimal128 so mongo keeps them exact, they are floats on the model
+    DECIMAL_FIELDS = ()
+
     @classmethod
     def from_json(cls, json_str):
         data = json.loads(json_str)
@@ -31,7 +36,7 @@ class BaseModel():
     @classmethod
     def from_mongo(cls, mongo_dict):
         field_names = {f.name for f in fields(cls)}
-        filtered_data = {k: v for k, v in mongo_dict.items() if k in field_names}
+        filtered_data = {k: fixed_point.from_decimal128(v) for k, v in mongo_dict.items() if k in field_names}
         return cls(**filtered_data)
 
     def to_json(self):
@@ -41,6 +46,8 @@ class BaseModel():
         ret = dict()
         for f in fields(self):
             # we don't want to return the mongodb _id field
-            if f.name not in IGNORE_FIELDS:
+            if f.name in self.DECIMAL_FIELDS:
+                ret[f.name] = fixed_point.to_decimal128(getattr(self, f.name))
+            elif f.name not in IGNORE_FIELDS:
                 ret[f.name] = getattr(self, f.name)
         return ret
@@ -3,6 +3,7 @@ from dataclasses import dataclass
 
 from bson import ObjectId
 
+from common import fixed_point
 from models.base import BaseModel, AssetType
 
 
@@ -10,6 +11,7 @@ from models.base import BaseModel, AssetType
 class Order(BaseModel):
     _id: ObjectId = None
     type: AssetType = None
+    account: str = None
     symbol: str = None
     quantity: float = None
     notional: float = None
@@ -20,12 +22,17 @@ class Order(BaseModel):
     buy_price: float = 0
     buy_at_utc: datetime = datetime(1970, 1, 1, 0, 0, 0, 0, UTC)
     buy_session: str = None
+    # trading.timeline.Timeline of the broker order as a dict
+    buy_timeline: dict = None
 
     sell_order_id: str = None
     sell_status: str = None
     sell_price: float = 0
     sell_at_utc: datetime | None = None
     sell_session: str = None
+    sell_timeline: dict = None
+
+    DECIMAL_FIELDS = ("quantity", "notional", "profit", "buy_price", "sell_price")
 
     def calculate_profit(self):
-        self.profit = round((self.sell_price - self.buy_price) * self.quantity, 2)
\ No newline at end of file
+        self.profit = fixed_point.from_fixed(fixed_point.profit(self.buy_price, self.sell_price, self.quantity))
\ No newline at end of file
@@ -3,12 +3,22 @@ from dataclasses import dataclass
 
 from bson import ObjectId
 
+from common import fixed_point
 from models.base import BaseModel, AssetType
 
+
+class ExitMode:
+    # the strategy evaluates every open lot on each tick
+    TICK = "tick"
+    # a take-profit limit rests at the broker for every lot, see AlpacaTradingClient.arm_exit
+    BROKER = "broker"
+
+
 @dataclass
 class Watchlist(BaseModel):
     _id: ObjectId = None
     type: AssetType = None
+    account: str = None
     symbol: str = None
     is_active: bool = True
     is_suspend: bool = False
@@ -16,13 +26,45 @@ class Watchlist(BaseModel):
     last_buy_session: str = None
     last_sell_at: datetime = None
     last_sell_session: str = None
+    last_exit_check_at: datetime = None
     total_buy: int = 0
     total_sell: int = 0
     total_profit: float = 0.0
     extended_hours: bool = False
     batch_size: int = 20
     total_allowed_batches: int = 5
+    # name of the strategy in strategy/registry.py, None is the default swing strategy
+    strategy: str = None
+    # ExitMode, None is ExitMode.TICK
+    exit_mode: str = None
+    # strategy parameters, tuned per symbol by backtest/optimizer.py
+    entry_period: int = 7
+    exit_period: int = 30
+    entry_swing: float = 0.25
+    exit_swing: float = 0.25
+    rebuy_drop: float = 0.025
+    # set by trading/screener.py, the return of one swing trade at the time of the screen
+    screen_score: float = None
+    screened_at: datetime = None
+    # thresholds at the last evaluation, trading/scheduler.py evaluates symbols far from both less often
+    # entry or rebuy price
+    threshold_low: float = None
+    # lowest sell target of the open lots
+    threshold_high: float = None
+    threshold_swing: float = None
+    evaluated_at: datetime = None
+
+    DECIMAL_FIELDS = ("total_profit",)
+    # written by the ticks rather than set by hand; shadow mode keeps its own in shadow_watchlist
+    STATE_FIELDS = (
+        "last_buy_at", "last_buy_session", "last_sell_at", "last_sell_session", "last_exit_check_at",
+        "total_buy", "total_sell", "total_profit", "threshold_low", "threshold_high", "threshold_swing", "evaluated_at",
+    )
 
+    @staticmethod
+    def lookback_days(period: int) -> int:
+        '''Calendar days of daily bars needed to cover `period` trading days.'''
+        return max(30, period + period // 2)
 
     def update_buy(self, session_id: str):
         self.last_buy_at = datetime.now(UTC)
@@ -36,4 +78,4 @@ class Watchlist(BaseModel):
         # TODO: add total profit calculation
         self.updated_at = datetime.now(UTC)
         self.updated_at_session = session_id
-        self.total_profit = self.total_profit + profit
+        self.total_profit = fixed_point.from_fixed(fixed_point.to_fixed(self.total_profit) + fixed_point.to_fixed(profit))
@@ -0,0 +1,40 @@
+import threading
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+# clients keep the body but revalidate every time, an unchanged answer is a 304 without a body
+CACHE_CONTROL = "private, no-cache"
+
+
+class ResponseCache():
+    '''Last body per route, tagged with the version of the data it was computed from.'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = dict()
+
+    @staticmethod
+    def if_none_match(request: Request) -> set[str]:
+        header = request.headers.get("if-none-match", "")
+        return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+
+    def respond(self, request: Request, key: str, version: str, compute) -> Response:
+        '''304 if the client has `version`, otherwise the cached or freshly computed body.'''
+        etag = f'"{key}-{version}"'
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        tags = self.if_none_match(request)
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+        with self.lock:
+            entry = self.entries.get(key, None)
+        if entry and entry[0] == etag:
+            body = entry[1]
+        else:
+            body = compute()
+            with self.lock:
+                self.entries[key] = (etag, body)
+        return JSONResponse(body, headers=headers)
+
+
+cache = ResponseCache()
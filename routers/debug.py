@@ -0,0 +1,46 @@
+import uuid
+from datetime import datetime, UTC
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from common.profiler import SamplingProfiler
+from routers.order import get_trader
+
+MAX_LIMIT = 100
+
+router = APIRouter(
+    prefix="/v1/debug",
+    tags=["debug"]
+)
+
+def save_profile(profiler: SamplingProfiler, method: str, path: str) -> str:
+    '''Stores a finished profile in the profile collection and returns its id.'''
+    data_client = get_trader().data_client
+    profile_id = uuid.uuid4().hex
+    data_client.write("profile", {
+        "_id": profile_id,
+        "session": data_client.session_id,
+        "method": method,
+        "path": path,
+        "created_at": datetime.now(UTC),
+        "duration": round(profiler.duration, 3),
+        "interval": profiler.interval,
+        "samples": profiler.samples,
+        "folded": profiler.folded(),
+    })
+    return profile_id
+
+@router.get("/profiles")
+def get_profiles(session: str = None, limit: int = 20):
+    query = {"session": session} if session else {}
+    limit = min(max(limit, 1), MAX_LIMIT)
+    return get_trader().data_client.read("profile", query, {"folded": 0}, sort=[("created_at", -1)], limit=limit)
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    '''The folded stacks, ready for flamegraph.pl or speedscope.'''
+    profiles = get_trader().data_client.read("profile", {"_id": profile_id}, limit=1)
+    if not profiles:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profiles[0]["folded"], headers={"Content-Disposition": f"attachment; filename={profile_id}.folded"})
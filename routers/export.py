@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+from dataclasses import fields
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from models.order import Order
+from routers.order import get_trader
+
+# rows per chunk written to the response
+CHUNK_ROWS = 500
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+ORDER_COLUMNS = [f.name for f in fields(Order)]
+LOG_COLUMNS = ["_id", "created_at", "session", "level", "symbol", "message", "obj"]
+
+router = APIRouter(
+    prefix="/v1/export",
+    tags=["export"]
+)
+
+def to_json(value):
+    '''json.dumps default for the bson types in order and log documents.'''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, "to_decimal"):
+        # Decimal128 amounts keep their exact digits
+        return str(value.to_decimal())
+    # ObjectId
+    return str(value)
+
+def ndjson(docs):
+    '''One json document per line, CHUNK_ROWS lines per chunk.'''
+    chunk = list()
+    for doc in docs:
+        chunk.append(json.dumps(doc, default=to_json))
+        if len(chunk) >= CHUNK_ROWS:
+            yield "\n".join(chunk) + "\n"
+            chunk = list()
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+def csv_rows(docs, columns: list[str]):
+    '''A header and one row per document; nested values are json in their cell.'''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    rows = 0
+    for doc in docs:
+        row = list()
+        for column in columns:
+            value = doc.get(column, None)
+            if value is None:
+                row.append("")
+            elif isinstance(value, (dict, list)):
+                row.append(json.dumps(value, default=to_json))
+            elif isinstance(value, (str, int, float, bool)):
+                row.append(value)
+            else:
+                row.append(to_json(value))
+        writer.writerow(row)
+        rows += 1
+        if rows >= CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def query(symbol: str = None, start: datetime = None, end: datetime = None, sessions: dict = None) -> dict:
+    '''The filter of an export; `sessions` is the session condition, it differs per collection.'''
+    ret = dict(sessions or {})
+    if symbol:
+        ret["symbol"] = symbol
+    if start or end:
+        ret["created_at"] = dict()
+        if start:
+            ret["created_at"]["$gte"] = start
+        if end:
+            ret["created_at"]["$lt"] = end
+    return ret
+
+def export(collection: str, query: dict, columns: list[str], format: str) -> StreamingResponse:
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    # a sync generator, starlette runs it in the threadpool so the cursor's blocking reads stay off the event loop
+    docs = get_trader().data_client.iterate(collection, query, sort=[("created_at", 1)])
+    body = ndjson(docs) if format == "ndjson" else csv_rows(docs, columns)
+    return StreamingResponse(body, media_type=FORMATS[format], headers={"Content-Disposition": f"attachment; filename={collection}.{format}"})
+
+@router.get("/orders")
+def export_orders(format: str = "ndjson", symbol: str = None, start: datetime = None, end: datetime = None, session: str = None):
+    '''Orders created in [start, end), oldest first; `session` matches the session that bought or sold.'''
+    sessions = {"$or": [{"buy_session": session}, {"sell_session": session}]} if session else None
+    return export("order", query(symbol, start, end, sessions), ORDER_COLUMNS, format)
+
+@router.get("/logs")
+def export_logs(format: str = "ndjson", symbol: str = None, start: datetime = None, end: datetime = None, session: str = None):
+    '''Logs written in [start, end), oldest first.'''
+    sessions = {"session": session} if session else None
+    return export("log", query(symbol, start, end, sessions), LOG_COLUMNS, format)
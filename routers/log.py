@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from fastapi import APIRouter
+
+from routers.order import get_trader
+
+MAX_LIMIT = 1000
+
+router = APIRouter(
+    prefix="/v1/logs",
+    tags=["logs"]
+)
+
+@router.get("/")
+def get_logs(session: str = None, symbol: str = None, level: str = None, before: datetime = None, limit: int = 100):
+    # single filters and symbol+level have an index ending in created_at; a session is one process's logs,
+    # so the other filters combined with it are applied to that session's index range
+    query = dict()
+    if session:
+        query["session"] = session
+    if symbol:
+        query["symbol"] = symbol
+    if level:
+        query["level"] = level
+    if before:
+        query["created_at"] = {"$lt": before}
+    limit = min(max(limit, 1), MAX_LIMIT)
+    return get_trader().data_client.read("log", query, {"_id": 0}, sort=[("created_at", -1)], limit=limit)
@@ -1,18 +1,61 @@
+import asyncio
 import json
+import time
+from datetime import datetime, UTC
+from functools import lru_cache
 
-from fastapi import APIRouter, status
+from fastapi import APIRouter, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 
 from models.order import Order
-from trader import Trader
 from common.helper import Helper
+from common.events import bus, buy_event, sell_event
+from routers.cache import cache
+from trading.timeline import Timeline, latency_report
 
-TRADER = Trader()
+KEEP_ALIVE_SECONDS = 15
+# positions move with the market, not only with our orders
+POSITION_TTL_SECONDS = 60
+
+
+@lru_cache(maxsize=1)
+def get_trader():
+    # built on the first order request rather than at import so the app starts without mongo or broker clients
+    from trader import Trader
+    return Trader()
 
 router = APIRouter(
     prefix="/v1/order",
     tags=["order"]
 )
 
+# declared before /{order_id} so "stream" is not taken for an id
+@router.get("/stream")
+async def stream(request: Request):
+    '''Server-sent events: a profit snapshot, then every buy and sell as it is persisted.'''
+    trader = get_trader()
+    if trader.order_change_stream:
+        bus.start_relay(trader.data_client, trader.SESSION_ID)
+
+    async def events():
+        queue = bus.subscribe()
+        try:
+            # the aggregation blocks, it runs in the threadpool so the loop keeps serving
+            yield f"event: profit\ndata: {json.dumps(await run_in_threadpool(profit))}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), KEEP_ALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            bus.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @router.get("/{order_id}")
 async def get_order(order_id: str):
 
@@ -26,20 +69,42 @@ async def get_order():
 async def update(order_id: str):
     return status.HTTP_401_UNAUTHORIZED 
 
-@router.get("/profit/")
-async def get_profit():
-    records = [Order.from_mongo(record) for record in TRADER.mongo_client.read("order", {"sell_status": "filled"})]
+def order_version() -> int:
+    # blocking, the routes that call it are plain def so starlette runs them in its threadpool
+    return get_trader().data_client.version("order")
+
+def profit() -> dict:
+    records = [Order.from_mongo(record) for record in get_trader().data_client.read("order", {"sell_status": "filled"})]
     return Helper.calculate_profit(records)
 
+@router.get("/profit/")
+def get_profit(request: Request):
+    # today and the 30/60 day windows also move at midnight
+    return cache.respond(request, "profit", f"{order_version()}-{datetime.now(UTC).date()}", profit)
+
 @router.get("/position/")
-async def get_position():
-    ret = Trader().alpaca_trading_client.get_positions()
-    return ret
+def get_position(request: Request):
+    version = f"{order_version()}-{int(time.time() // POSITION_TTL_SECONDS)}"
+    return cache.respond(request, "position", version, get_trader().alpaca_trading_client.get_positions)
 
-@router.get("/feed/")
-async def get_feed():
+def latency() -> dict:
+    orders = [Order.from_mongo(record) for record in get_trader().data_client.read(
+        "order", {"$or": [{"buy_timeline": {"$ne": None}}, {"sell_timeline": {"$ne": None}}]}
+    )]
+    timelines = [(o.symbol, Timeline.from_mongo(o.buy_timeline)) for o in orders if o.buy_timeline]
+    # lots sold together carry the same sell timeline
+    sells = {(o.symbol, o.sell_order_id): o.sell_timeline for o in orders if o.sell_timeline}
+    timelines += [(symbol, Timeline.from_mongo(timeline)) for (symbol, _), timeline in sells.items()]
+    return latency_report(timelines)
+
+@router.get("/latency/")
+def get_latency(request: Request):
+    '''Signal to fill latency and slippage percentiles per endpoint and symbol.'''
+    return cache.respond(request, "latency", str(order_version()), latency)
+
+def feed() -> str:
     ret = list()
-    orders = [Order().from_mongo(record) for record in TRADER.mongo_client.read("order", {})]
+    orders = [Order().from_mongo(record) for record in get_trader().data_client.read("order", {})]
     # id: 1,
     # content: 'Bought 0.08728136 @229.144',
     # target: 'AAPL',
@@ -48,28 +113,17 @@ async def get_feed():
     # datetime: '2024-11-22',
     # icon: PlusCircleIcon,
     # iconBackground: 'bg-green-500',
+    # the same items are pushed by /v1/order/stream
     for order in orders:
         # buy order
-        ret.append({
-            "id": str(order.buy_order_id),
-            "type": "buy", 
-            "content": f"Bought {order.quantity}@{order.buy_price}", 
-            "target": order.symbol, 
-            "date": order.buy_at_utc.strftime("%b %d"), 
-            "datetime": order.buy_at_utc.strftime("%Y-%m-%d"),
-            "sort_key": order.buy_at_utc,
-        })
+        ret.append({**buy_event(order), "sort_key": order.buy_at_utc})
         # sell order
         if order.sell_order_id:
-            ret.append({
-                "id": str(order.sell_order_id), 
-                "type": "sell",
-                "content": f"Sold {order.quantity}@{order.sell_price}; Profit: {order.profit}", 
-                "target": order.symbol, 
-                "date": order.sell_at_utc.strftime("%b %d"), 
-                "datetime": order.sell_at_utc.strftime("%Y-%m-%d"),
-                "sort_key": order.sell_at_utc,
-            })
+            ret.append({**sell_event(order), "sort_key": order.sell_at_utc})
     ret.sort(key=lambda x: x["sort_key"], reverse=True)
     [record.pop("sort_key") for record in ret]
-    return json.dumps(ret[0:10])
\ No newline at end of file
+    return json.dumps(ret[0:10])
+
+@router.get("/feed/")
+def get_feed(request: Request):
+    return cache.respond(request, "feed", str(order_version()), feed)
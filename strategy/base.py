@@ -0,0 +1,106 @@
+import time
+from abc import ABC, abstractmethod
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime, UTC
+
+from models.order import Order
+from models.watchlist import Watchlist, ExitMode
+from trading.signals import Signals
+from common.helper import aware
+
+
+class Action:
+    BUY = "buy"
+    SELL = "sell"
+
+
+@dataclass
+class Decision():
+    '''What a strategy wants done for one watchlist; the broker client executes it.'''
+    action: str
+    watchlist: Watchlist
+    # the lots a sell closes
+    lots: list[Order] = field(default_factory=list)
+    limit_price: float = None
+    reason: str = None
+    # the order is expected to rest at the broker, the client does not wait for its fill
+    resting: bool = False
+    # the price the decision was made at and when, the start of the order's Timeline
+    price: float = None
+    decided_ns: int = field(default_factory=time.time_ns)
+
+
+class Snapshot():
+    '''The tick's market state and open lots for a group of watchlists, held as columns.
+
+    Row i describes watchlists[i]; lot j belongs to row lot_row[j]. Broker clients build it
+    (AlpacaTradingClient.snapshot) so strategies never make a request of their own.
+    '''
+
+    def __init__(self):
+        self.watchlists: list[Watchlist] = list()
+        self.signals: list[Signals] = list()
+        self.last = array("d")
+        self.entry_price = array("d")
+        self.target_swing = array("d")
+        self.rebuy_drop = array("d")
+        self.allowed_batches = array("l")
+        self.suspended = array("b")
+        # a lot of the row was bought today and the account may not day trade
+        self.pdt = array("b")
+        # exits of the row are take-profit limits resting at the broker
+        self.broker_exit = array("b")
+        self.lots: list[Order] = list()
+        self.lot_row = array("l")
+        self.buy_price = array("d")
+        # the lot has a sell resting at the broker, it counts as a batch but is not sold again
+        self.armed = array("b")
+        # highest price since the lot's exit was last evaluated, 0 when unknown
+        self.high = array("d")
+        # index of the newest lot of each row, -1 without lots
+        self.last_lot = array("l")
+        # watchlists that could not be evaluated, with the exception
+        self.skipped: list[tuple[Watchlist, Exception]] = list()
+
+    def __len__(self) -> int:
+        return len(self.watchlists)
+
+    def add(self, watchlist: Watchlist, last: float, signals: Signals, lots: list[Order], highs: list[float], strict_pdt: bool = False):
+        row = len(self.watchlists)
+        self.watchlists.append(watchlist)
+        self.signals.append(signals)
+        self.last.append(last)
+        self.entry_price.append(signals.entry_price)
+        self.target_swing.append(signals.target_swing)
+        self.rebuy_drop.append(signals.rebuy_drop)
+        self.allowed_batches.append(watchlist.total_allowed_batches)
+        self.suspended.append(watchlist.is_suspend)
+        today = datetime.now(UTC).date()
+        self.pdt.append(strict_pdt and any(lot.buy_at_utc.date() == today for lot in lots))
+        self.broker_exit.append(watchlist.exit_mode == ExitMode.BROKER)
+        newest = -1
+        for lot, high in zip(lots, highs):
+            if newest < 0 or aware(lot.created_at) > aware(self.lots[newest].created_at):
+                newest = len(self.lots)
+            self.lots.append(lot)
+            self.lot_row.append(row)
+            self.buy_price.append(lot.buy_price)
+            self.armed.append(lot.sell_order_id is not None)
+            self.high.append(high or 0.0)
+        self.last_lot.append(newest)
+
+    def lot_count(self) -> array:
+        counts = array("l", [0]) * len(self)
+        for row in self.lot_row:
+            counts[row] += 1
+        return counts
+
+
+class Strategy(ABC):
+    '''Entry and exit rules, evaluated for every watchlist of a tick in one call.'''
+    name: str = None
+
+    @abstractmethod
+    def evaluate(self, snapshot: Snapshot) -> list[Decision]:
+        pass
@@ -0,0 +1,14 @@
+from strategy.base import Strategy
+from strategy.swing import SwingStrategy
+
+
+DEFAULT_STRATEGY = SwingStrategy.name
+STRATEGIES = {strategy.name: strategy() for strategy in (SwingStrategy,)}
+
+
+def strategy_factory(name: str = None) -> Strategy:
+    '''The strategy a watchlist names, strategies hold no state so one instance is shared.'''
+    strategy = STRATEGIES.get(name or DEFAULT_STRATEGY, None)
+    if strategy is None:
+        raise Exception(f"Invalid strategy {name}")
+    return strategy
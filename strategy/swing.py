@@ -0,0 +1,60 @@
+from strategy.base import Strategy, Snapshot, Decision, Action
+
+
+class SwingStrategy(Strategy):
+    '''Buys a dip below the recent high and sells each lot a share of the average daily swing above its price.
+
+    entry: the price is entry_swing of the entry_period average swing below the entry_period high
+    exit: a lot is sold once the price, or the intrabar high since the last check, reaches its target
+    rebuy: another batch once the price is rebuy_drop below the newest lot and the entry holds
+
+    With ExitMode.BROKER every lot below its target gets a take-profit limit at the target instead.
+    A symbol with a limit resting at the broker is not rebought, alpaca rejects the buy as a potential wash trade.
+    '''
+    name = "swing"
+
+    def evaluate(self, snapshot: Snapshot) -> list[Decision]:
+        last = snapshot.last
+        # one pass over each column, every row and lot of the tick together
+        entry = [not suspended and price < threshold for suspended, price, threshold in zip(snapshot.suspended, last, snapshot.entry_price)]
+        counts = snapshot.lot_count()
+        targets = [round(price + snapshot.target_swing[row], 2) for price, row in zip(snapshot.buy_price, snapshot.lot_row)]
+
+        market = [list() for _ in range(len(snapshot))]
+        limit = [list() for _ in range(len(snapshot))]
+        limit_price = [0.0] * len(snapshot)
+        take_profit = [list() for _ in range(len(snapshot))]
+        resting = [False] * len(snapshot)
+        for i, (row, target, high) in enumerate(zip(snapshot.lot_row, targets, snapshot.high)):
+            resting[row] = resting[row] or snapshot.armed[i]
+            if snapshot.pdt[row] or snapshot.armed[i]:
+                continue
+            if target <= last[row]:
+                market[row].append(snapshot.lots[i])
+            elif snapshot.broker_exit[row]:
+                # a new lot, or one whose day limit expired, one limit per lot at its own target
+                take_profit[row].append((snapshot.lots[i], target))
+            elif target <= high:
+                # the target traded between ticks but the price came back, a limit at the target never sells below it
+                limit[row].append(snapshot.lots[i])
+                # the highest target keeps every lot in the order at or above its own target
+                limit_price[row] = max(limit_price[row], target)
+
+        decisions = list()
+        for row, watchlist in enumerate(snapshot.watchlists):
+            if not counts[row]:
+                if entry[row]:
+                    decisions.append(Decision(Action.BUY, watchlist, reason=f"entry below {snapshot.entry_price[row]:.2f}", price=last[row]))
+                continue
+            if market[row]:
+                decisions.append(Decision(Action.SELL, watchlist, lots=market[row], reason=f"target reached at {last[row]}", price=last[row]))
+            if limit[row]:
+                decisions.append(Decision(Action.SELL, watchlist, lots=limit[row], limit_price=limit_price[row], reason="target reached intrabar", price=last[row]))
+            for lot, target in take_profit[row]:
+                decisions.append(Decision(Action.SELL, watchlist, lots=[lot], limit_price=target, reason="take profit at target", price=last[row], resting=True))
+            # evaluated against the lots open at the start of the tick
+            newest = snapshot.buy_price[snapshot.last_lot[row]]
+            rebuy_price = newest - newest * snapshot.rebuy_drop[row]
+            if counts[row] < snapshot.allowed_batches[row] and last[row] <= rebuy_price and entry[row] and not (resting[row] or take_profit[row]):
+                decisions.append(Decision(Action.BUY, watchlist, reason=f"rebuy below {rebuy_price:.2f}", price=last[row]))
+        return decisions
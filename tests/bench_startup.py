@@ -0,0 +1,40 @@
+'''Cold start benchmark: python tests/bench_startup.py [runs]
+
+Each run is a fresh interpreter, like a new scale-to-zero instance, and
+measures the time to import the app and to answer the first health check.
+'''
+import json
+import statistics
+import subprocess
+import sys
+
+RUN = '''
+import json, time
+start = time.perf_counter()
+import api
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+res = TestClient(api.app).get("/v1/health/")
+assert res.status_code == 200, res.content
+done = time.perf_counter()
+print(json.dumps({"import": imported - start, "first_health": done - start, "modules": len(__import__("sys").modules)}))
+'''
+
+
+def bench(runs: int = 5) -> dict:
+    samples = list()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", RUN], capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        "runs": runs,
+        "import_ms": round(statistics.median(s["import"] for s in samples) * 1000, 1),
+        "first_health_ms": round(statistics.median(s["first_health"] for s in samples) * 1000, 1),
+        "heavy_modules_loaded": [m for m in ("pymongo", "jwt", "cryptography", "trader") if m in subprocess.run(
+            [sys.executable, "-c", "import api, sys; print(' '.join(sys.modules))"], capture_output=True, text=True
+        ).stdout.split()],
+    }
+
+
+if __name__ == '__main__':
+    print(json.dumps(bench(int(sys.argv[1]) if len(sys.argv) > 1 else 5), indent=2))
@@ -20,22 +20,15 @@ class TestAlpaca(unittest.TestCase):
             data_client=DataClient(config.get("uri", None))
         )
 
-    def test_process_sell(self):
-        pass
+    def test_snapshot(self):
+        watchlist = Watchlist(symbol="MSFT")
+        snapshot = self.client.snapshot([watchlist], {"MSFT": list()})
+        self.assertEqual(len(snapshot), 1)
+        self.assertEqual(snapshot.skipped, [])
 
     def test_is_runnable(self):
         pass
 
-    def test_process_rebuy(self):
-        orders: list[Order]
-        watchlist: Watchlist
-        last_close: float
-
-        self.client.process_rebuy(orders, watchlist, last_close)
-
-    def test_process_buy(self):
-        self.assertTrue(self.client.process_buy("MSFT"))
-
     def test_buy(self):
         pass
 
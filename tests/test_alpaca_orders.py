@@ -0,0 +1,275 @@
+import importlib.util
+import os
+import unittest
+from datetime import datetime, timedelta, UTC
+from types import SimpleNamespace
+
+from bson import ObjectId
+
+from common import fixed_point
+from common.helper import Notifier
+from data.data_client import DataClient
+from models.order import Order
+from models.watchlist import Watchlist, ExitMode
+from trading.alpaca_client import AlpacaTradingClient
+from trading.order_journal import IntentStatus
+from trading.rate_limiter import RateLimitExceeded, EndpointClass, Priority
+
+
+def broker_order(i: int, side: str = "buy", status: str = "filled", price: str = "100.0", qty: str = "1.0", submitted_at: str = "2024-11-22T14:30:00.000001Z") -> dict:
+    return {"id": str(i), "symbol": "AAPL", "side": side, "status": status, "filled_avg_price": price, "filled_qty": qty, "submitted_at": submitted_at, "filled_at": submitted_at}
+
+def lot(quantity: float, buy_price: float) -> Order:
+    return Order(_id=ObjectId(), symbol="AAPL", account="main", quantity=quantity, buy_price=buy_price, buy_status="filled")
+
+def load_trader():
+    # tests/trader.py shadows the module on pytest's path, load the one at the repository root
+    spec = importlib.util.spec_from_file_location("trader", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "trader.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Trader
+
+
+class FakeNotifier(Notifier):
+    def __init__(self):
+        self.messages = list()
+
+    def alert(self, message: str):
+        self.messages.append(message)
+
+
+class TestAlpacaOrders(unittest.TestCase):
+    '''Order handling of AlpacaTradingClient against canned broker responses and an in-memory order collection.'''
+
+    def setUp(self):
+        self.notifier = FakeNotifier()
+        self.client = AlpacaTradingClient(api_key=None, api_secret_key=None, base_url="https://paper", data_base_url="https://data", data_client=DataClient(None, session_id="test"), notifier=self.notifier, account="main")
+        self.urls = list()
+        self.pages = list()
+        self.payloads = list()
+        self.client.post = lambda url, payload, **kwargs: (self.payloads.append(payload), {"id": "b1" if payload["side"] == "buy" else "s1", "status": "new"})[1]
+        # documents per collection
+        self.docs = dict()
+        self.updates = list()
+        self.bulk_writes = list()
+        self.client.get = lambda url, **kwargs: (self.urls.append(url), self.pages.pop(0))[1]
+        data_client = self.client.data_client
+        data_client.log = lambda *args, **kwargs: None
+        data_client.write = lambda collection, data: None
+        data_client.update = lambda collection, query, data, upsert=False: self.updates.append((collection, query, data))
+        data_client.read = lambda collection, query, projection=None, sort=None, limit=0: list(self.docs.get(collection, list()))
+        data_client.bulk_write = lambda collection, operations, ordered=False: (self.bulk_writes.append(operations), SimpleNamespace(upserted_count=1, modified_count=len(operations) - 1))[1] if operations else None
+
+    def test_list_orders_pages(self):
+        # orders 2 and 3 share a submitted_at across the page boundary
+        self.pages = [
+            [broker_order(1, submitted_at="2024-11-22T14:30:00Z"), broker_order(2, submitted_at="2024-11-22T14:30:01.5Z")],
+            [broker_order(2, submitted_at="2024-11-22T14:30:01.5Z"), broker_order(3, submitted_at="2024-11-22T14:30:01.5Z")],
+            [broker_order(3, submitted_at="2024-11-22T14:30:01.5Z")],
+        ]
+        orders = self.client.list_orders(after="2024-11-22T00:00:00Z", limit=2)
+        self.assertEqual([o["id"] for o in orders], ["1", "2", "3"])
+        self.assertEqual(len(self.urls), 3)
+        # a microsecond before the last order, after is exclusive
+        self.assertIn("after=2024-11-22T14%3A30%3A01.499999Z", self.urls[1])
+
+    def test_list_orders_stops_on_repeats(self):
+        page = [broker_order(1), broker_order(2)]
+        self.pages = [page, list(page)]
+        self.assertEqual(len(self.client.list_orders(limit=2)), 2)
+        self.assertEqual(len(self.urls), 2)
+
+    def test_backfill(self):
+        known_buy = {"_id": ObjectId(), "symbol": "AAPL", "quantity": fixed_point.to_decimal128(1.0), "buy_order_id": "2", "buy_status": "new", "buy_price": None}
+        known_sell = {"_id": ObjectId(), "symbol": "AAPL", "quantity": fixed_point.to_decimal128(2.0), "buy_order_id": "9", "buy_status": "filled", "buy_price": fixed_point.to_decimal128(100.0), "sell_order_id": "3", "sell_status": "new", "sell_price": None}
+        self.docs = {"order": [known_buy, known_sell]}
+        self.pages = [[
+            # filled and unknown, canceled and unknown, known but stale
+            broker_order(1), broker_order(4, status="canceled", price=None, qty="0"), broker_order(2),
+            broker_order(3, side="sell", price="101.0", qty="2.0"), broker_order(5, side="sell"),
+        ]]
+        report = self.client.backfill()
+        self.assertEqual((report["missing_buy"], report["stale_buy"], report["stale_sell"], report["orphan_sell"]), (["1"], ["2"], ["3"], ["5"]))
+        self.assertEqual(report["operations"], 3)
+        # a dry run writes nothing
+        self.assertEqual(self.bulk_writes, [])
+
+        self.pages = [[broker_order(1), broker_order(2), broker_order(3, side="sell", price="101.0", qty="2.0")]]
+        report = self.client.backfill(dry_run=False)
+        self.assertEqual((report["upserted"], report["modified"]), (1, 2))
+        upsert, buy, sell = self.bulk_writes[0]
+        self.assertEqual(upsert._filter, {"buy_order_id": "1"})
+        self.assertTrue(upsert._upsert)
+        self.assertEqual(upsert._doc["$setOnInsert"]["buy_status"], "filled")
+        self.assertEqual(buy._doc["$set"]["buy_status"], "filled")
+        self.assertEqual(buy._doc["$set"]["buy_at_utc"], datetime(2024, 11, 22, 14, 30, 0, 1, tzinfo=UTC))
+        self.assertEqual(fixed_point.from_decimal128(sell._doc["$set"]["profit"]), 2.0)
+
+    def test_sell_aggregated(self):
+        w = Watchlist(symbol="AAPL")
+        lots = [lot(0.3, 100.0), lot(0.6, 99.0)]
+        self.pages = [broker_order("s1", side="sell", price="101.0", qty="0.9")]
+        self.client.sell(w, lots)
+        # one broker order for the summed quantity, without the float noise of 0.3 + 0.6
+        self.assertEqual(len(self.payloads), 1)
+        self.assertEqual(self.payloads[0]["qty"], 0.9)
+        self.assertEqual([(o.sell_order_id, o.sell_status, o.sell_price) for o in lots], [("s1", "filled", 101.0)] * 2)
+        self.assertEqual([o.profit for o in lots], [0.3, 1.2])
+        self.assertEqual((w.total_sell, w.total_profit), (2, 1.5))
+        # every lot in one write
+        self.assertEqual(len(self.bulk_writes), 1)
+        self.assertEqual([op._filter["_id"] for op in self.bulk_writes[0]], [o._id for o in lots])
+        self.assertIn("Profit 1.5", self.notifier.messages[0])
+
+    def test_sell_partially_filled(self):
+        w = Watchlist(symbol="AAPL")
+        lots = [lot(0.3, 100.0), lot(0.6, 99.0)]
+        # canceled with part of the quantity filled, polled until the retries run out
+        self.pages = [broker_order("s1", side="sell", status="canceled", price="101.0", qty="0.4")] * 3
+        self.client.sell(w, lots)
+        # the lots keep the broker order, reconcile_sells settles them on the next tick
+        self.assertEqual([(o.sell_order_id, o.sell_status, o.profit) for o in lots], [("s1", "canceled", None)] * 2)
+        self.assertEqual((w.total_sell, w.total_profit), (0, 0.0))
+        self.assertEqual(len(self.bulk_writes), 1)
+        self.assertEqual(len(self.bulk_writes[0]), 2)
+        # a market sell has no price to alert
+        self.assertEqual(self.notifier.messages, [])
+
+    def test_sell_limit_open(self):
+        w = Watchlist(symbol="AAPL")
+        self.pages = [broker_order("s1", side="sell", status="new", price=None, qty="0")] * 3
+        self.client.sell(w, [lot(1.0, 100.0)], limit_price=101.0)
+        self.assertEqual(self.notifier.messages, ["sell order placed AAPL@101.0; 1 lots; status new"])
+        # a resting take-profit is not alerted
+        self.client.sell(w, [lot(1.0, 100.0)], limit_price=101.0, wait=False)
+        self.assertEqual(len(self.notifier.messages), 1)
+
+    def test_recover_partial_buy(self):
+        created_at = datetime.now(UTC) - timedelta(minutes=2)
+        self.docs = {"order_intent": [
+            {"_id": "c1", "symbol": "AAPL", "side": "buy", "lots": [], "created_at": created_at},
+            {"_id": "c2", "symbol": "MSFT", "side": "buy", "lots": [], "created_at": created_at},
+        ]}
+        # AAPL expired after filling 0.4, MSFT is still working
+        self.pages = [[
+            {**broker_order("b1", status="expired", qty="0.4"), "client_order_id": "c1"},
+            {**broker_order("b2", status="new", price=None, qty="0"), "client_order_id": "c2"},
+        ]]
+        self.assertEqual(self.client.recover_intents(), {"MSFT"})
+        [upsert] = self.bulk_writes[0]
+        self.assertEqual(upsert._filter, {"buy_order_id": "b1"})
+        self.assertEqual(upsert._doc["$setOnInsert"]["buy_status"], "filled")
+        self.assertEqual(fixed_point.from_decimal128(upsert._doc["$setOnInsert"]["quantity"]), 0.4)
+        self.assertEqual([(query["_id"], data["status"]) for _, query, data in self.updates], [("c1", IntentStatus.RESOLVED)])
+
+    def test_recover_unfilled_buy(self):
+        w = Watchlist(symbol="AAPL")
+        # still new after polling, the lot is recorded and the intent left submitted
+        self.pages = [{**broker_order("b1", status="new", price=None, qty="0"), "filled_at": None}] * 3
+        self.assertTrue(self.client.buy(w))
+        self.assertEqual([data["status"] for _, query, data in self.updates if query.get("_id") != w._id], [IntentStatus.SUBMITTED])
+
+        # it filled before the next tick
+        client_order_id = self.payloads[0]["client_order_id"]
+        self.docs = {
+            "order_intent": [{"_id": client_order_id, "symbol": "AAPL", "side": "buy", "lots": [], "created_at": datetime.now(UTC)}],
+            "order": [{"buy_order_id": "b1", "buy_status": "new"}],
+        }
+        self.updates.clear()
+        self.pages = [[{**broker_order("b1", price="100.5", qty="0.2"), "client_order_id": client_order_id}]]
+        self.assertEqual(self.client.recover_intents(), set())
+        [refresh] = self.bulk_writes[0]
+        self.assertEqual((refresh._filter, refresh._upsert), ({"buy_order_id": "b1"}, False))
+        data = refresh._doc["$set"]
+        self.assertEqual((data["buy_status"], fixed_point.from_decimal128(data["quantity"]), fixed_point.from_decimal128(data["buy_price"])), ("filled", 0.2, 100.5))
+        self.assertEqual(data["buy_at_utc"], datetime(2024, 11, 22, 14, 30, 0, 1, tzinfo=UTC))
+        self.assertEqual([(query["_id"], data["status"]) for _, query, data in self.updates], [(client_order_id, IntentStatus.RESOLVED)])
+
+    def test_rate_limited(self):
+        def post(url, payload, **kwargs):
+            raise RateLimitExceeded(EndpointClass.TRADING, Priority.ORDER, 1.0)
+
+        self.client.post = post
+        # raised to Trader.run_account, which defers the symbol
+        with self.assertRaises(RateLimitExceeded):
+            self.client.buy(Watchlist(symbol="AAPL"))
+        with self.assertRaises(RateLimitExceeded):
+            self.client.sell(Watchlist(symbol="AAPL"), [lot(1.0, 100.0)])
+
+    def test_reconcile_partial_fill(self):
+        w = Watchlist(symbol="AAPL")
+        lots = [lot(1.0, 100.0), lot(1.0, 99.0)]
+        for o in lots:
+            o.notional, o.sell_order_id, o.sell_status = 100.0, "s1", "new"
+        # the take-profit expired at the close with 1.5 of the 2.0 filled
+        self.client.sell_orders = {"s1": {**broker_order("s1", side="sell", status="expired", price="101.0", qty="1.5"), "filled_at": None, "updated_at": "2024-11-22T21:00:00Z"}}
+        [rest] = self.client.reconcile_sells(w, lots)
+        self.assertEqual([(o.quantity, o.sell_status, o.profit, o.notional) for o in lots], [(1.0, "filled", 1.0, 100.0), (0.5, "filled", 1.0, 50.0)])
+        self.assertEqual((rest.quantity, rest.notional, rest.buy_price, rest.sell_order_id, rest.sell_status), (0.5, 50.0, 99.0, None, None))
+        self.assertNotEqual(rest._id, lots[1]._id)
+        self.assertEqual((w.total_sell, w.total_profit), (2, 2.0))
+        first, second, insert = self.bulk_writes[0]
+        self.assertEqual(insert._filter, {"_id": rest._id})
+        self.assertEqual(fixed_point.from_decimal128(insert._doc["$setOnInsert"]["quantity"]), 0.5)
+        self.assertEqual(fixed_point.from_decimal128(second._doc["$set"]["quantity"]), 0.5)
+
+    def test_prefetch_sells(self):
+        w = Watchlist(symbol="AAPL")
+        lots = [lot(1.0, 100.0), lot(1.0, 99.0)]
+        for o, sell_order_id in zip(lots, ["s1", "s2"]):
+            o.sell_order_id, o.sell_status, o.sell_at_utc = sell_order_id, "new", datetime(2024, 11, 22, 14, 30, tzinfo=UTC)
+        # one listing for every pending sell of the account, orders of other lots are dropped
+        self.pages = [[broker_order("s1", side="sell", status="new"), broker_order("s2", side="sell", price="100.5"), broker_order("x", side="sell")]]
+        self.client.prefetch_sells(lots)
+        self.assertEqual(set(self.client.sell_orders), {"s1", "s2"})
+        self.assertIn("after=2024-11-22T14%3A29%3A00Z", self.urls[0])
+        self.assertEqual(self.client.reconcile_sells(w, lots), [])
+        # no per-order reads
+        self.assertEqual(len(self.urls), 1)
+        self.assertEqual((lots[1].sell_status, lots[1].profit), ("filled", 1.5))
+
+    def test_reconcile_writes_changed(self):
+        w = Watchlist(symbol="AAPL")
+        lots = [lot(1.0, 100.0), lot(1.0, 99.0)]
+        for o, sell_order_id in zip(lots, ["s1", "s2"]):
+            o.sell_order_id, o.sell_status = sell_order_id, "new"
+        self.client.sell_orders = {"s1": broker_order("s1", side="sell", status="new"), "s2": broker_order("s2", side="sell", status="partially_filled")}
+        self.client.reconcile_sells(w, lots)
+        # the resting limit is not rewritten
+        self.assertEqual([op._filter["_id"] for op in self.bulk_writes[0]], [lots[1]._id])
+        self.client.sell_orders = {"s1": broker_order("s1", side="sell", status="new"), "s2": broker_order("s2", side="sell", status="partially_filled")}
+        self.client.reconcile_sells(w, lots)
+        self.assertEqual(len(self.bulk_writes), 1)
+
+    def test_arm_exit(self):
+        w = Watchlist(symbol="AAPL", exit_mode=ExitMode.BROKER)
+        self.client.get_signals = lambda w: SimpleNamespace(target_price=lambda buy_price: round(buy_price + 1.0, 2))
+        self.pages = [broker_order("b1", price="100.0", qty="0.2")]
+        self.assertTrue(self.client.buy(w))
+        # the take-profit of the new lot is placed right away and left resting
+        buy, sell = self.payloads
+        self.assertEqual((sell["type"], sell["qty"], sell["limit_price"]), ("limit", 0.2, 101.0))
+        self.assertEqual(self.urls, ["https://paper/v2/orders/b1"])
+        [armed] = self.bulk_writes[0]
+        self.assertEqual(armed._doc["$set"]["sell_order_id"], "s1")
+
+        # under strict pdt the lot may not be sold today, the strategy arms it tomorrow
+        self.payloads.clear()
+        self.client.strict_pdt = True
+        self.pages = [broker_order("b1", price="100.0", qty="0.2")]
+        self.assertTrue(self.client.buy(w))
+        self.assertEqual([p["side"] for p in self.payloads], ["buy"])
+
+    def test_open_lots_armed(self):
+        trader = load_trader()({})
+        w = Watchlist(symbol="AAPL")
+        armed, unsold, sold = lot(1.0, 100.0), lot(1.0, 99.0), lot(1.0, 98.0)
+        armed.sell_order_id, armed.sell_status = "s1", "new"
+        sold.sell_order_id, sold.sell_status = "s2", "new"
+        self.client.sell_orders = {"s1": broker_order("s1", side="sell", status="new"), "s2": broker_order("s2", side="sell", price="99.0")}
+        # a lot with its take-profit resting is still open, the strategy counts it without selling it
+        self.assertEqual(trader.open_lots(self.client, w, [armed, unsold, sold]), [unsold, armed])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+from common.helper import Helper
+from data.bar_store import BarStore
+
+
+class TestBarStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = BarStore(self.dir.name)
+        # two days of 1Min bars, three bars each
+        self.bars = [
+            {'c': 10.5, 'h': 11.0, 'l': 10.0, 'n': 5, 'o': 10.0, 't': '2024-11-25T14:30:00Z', 'v': 100, 'vw': 10.4},
+            {'c': 11.5, 'h': 12.0, 'l': 10.5, 'n': 5, 'o': 10.5, 't': '2024-11-25T14:31:00Z', 'v': 100, 'vw': 11.4},
+            {'c': 11.0, 'h': 11.5, 'l': 9.5, 'n': 5, 'o': 11.5, 't': '2024-11-25T14:32:00Z', 'v': 200, 'vw': 10.9},
+            {'c': 12.0, 'h': 12.5, 'l': 11.0, 'n': 5, 'o': 11.0, 't': '2024-11-26T14:30:00Z', 'v': 100, 'vw': 12.1},
+            {'c': 12.5, 'h': 13.0, 'l': 11.5, 'n': 5, 'o': 12.0, 't': '2024-11-26T14:31:00Z', 'v': 100, 'vw': 12.4},
+            {'c': 13.0, 'h': 13.5, 'l': 12.5, 'n': 5, 'o': 12.5, 't': '2024-11-26T14:32:00Z', 'v': 100, 'vw': 13.1},
+        ]
+
+    def tearDown(self):
+        self.store.maps.clear()
+        self.dir.cleanup()
+
+    def test_append(self):
+        # alpaca returns bars newest first
+        self.assertEqual(self.store.append("AAPL", "1Min", list(reversed(self.bars[0:4]))), 4)
+        # overlapping bars are skipped
+        self.assertEqual(self.store.append("AAPL", "1Min", self.bars), 2)
+        series = self.store.read("AAPL", "1Min")
+        self.assertEqual(len(series), 6)
+        self.assertEqual(list(series["c"]), [bar["c"] for bar in self.bars])
+
+    def test_interrupted_append(self):
+        self.store.append("AAPL", "1Min", self.bars[0:3])
+        # a crash after some of the columns of the next append were written
+        path = self.store.path("AAPL", "1Min")
+        for name in ("o", "h"):
+            with open(os.path.join(path, f"{name}.bin"), "ab") as f:
+                f.write(b"\0" * 12)
+        self.store.maps.clear()
+        self.assertEqual(len(self.store.read("AAPL", "1Min")), 3)
+        self.assertEqual(os.path.getsize(os.path.join(path, "o.bin")), 3 * 8)
+        # the bars are written again
+        self.assertEqual(self.store.append("AAPL", "1Min", self.bars), 3)
+        self.assertEqual(list(self.store.read("AAPL", "1Min")["o"]), [bar["o"] for bar in self.bars])
+
+    def test_read_range(self):
+        self.store.append("AAPL", "1Min", self.bars)
+        series = self.store.read("AAPL", "1Min", "2024-11-25T14:31:00Z", "2024-11-26T14:31:00Z")
+        self.assertEqual(list(series["c"]), [11.5, 11.0, 12.0])
+        self.assertEqual(len(self.store.read("MSFT", "1Min")), 0)
+
+    def test_resample(self):
+        self.store.append("AAPL", "1Min", self.bars)
+        daily = self.store.read_resampled("AAPL", "1D")
+        self.assertEqual(len(daily), 2)
+        self.assertEqual(list(daily["o"]), [10.0, 11.0])
+        self.assertEqual(list(daily["h"]), [12.0, 13.5])
+        self.assertEqual(list(daily["l"]), [9.5, 11.0])
+        self.assertEqual(list(daily["c"]), [11.0, 13.0])
+        self.assertEqual(list(daily["v"]), [400, 300])
+
+    def test_to_bars(self):
+        self.store.append("AAPL", "1Min", self.bars)
+        bars = self.store.read_resampled("AAPL", "1D").to_bars()
+        self.assertEqual(bars["bars"][0]["t"], "2024-11-26T00:00:00Z")
+        ret = Helper.process_bar(bars, 2)
+        self.assertEqual(ret["day_high"], 13.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from routers.cache import ResponseCache
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.version = 1
+        self.computed = 0
+        cache = ResponseCache()
+        app = FastAPI()
+
+        def compute():
+            self.computed += 1
+            return {"computed": self.computed}
+
+        @app.get("/profit")
+        async def profit(request: Request):
+            return cache.respond(request, "profit", str(self.version), compute)
+
+        self.client = TestClient(app)
+
+    def test_conditional_get(self):
+        res = self.client.get("/profit")
+        self.assertEqual(res.json(), {"computed": 1})
+        self.assertEqual(res.headers["etag"], '"profit-1"')
+        self.assertEqual(res.headers["cache-control"], "private, no-cache")
+        # unchanged: a 304 for the client that has it, the cached body for one that does not
+        self.assertEqual(self.client.get("/profit", headers={"If-None-Match": 'W/"profit-1"'}).status_code, 304)
+        self.assertEqual(self.client.get("/profit").json(), {"computed": 1})
+        self.version = 2
+        res = self.client.get("/profit", headers={"If-None-Match": '"profit-1"'})
+        self.assertEqual((res.status_code, res.json()), (200, {"computed": 2}))
@@ -0,0 +1,59 @@
+import unittest
+
+from data.data_client import DataClient, LogLevel, truncate
+
+
+class TestDataClient(unittest.TestCase):
+
+    def setUp(self):
+        self.client = DataClient(None, log_sample_rates={LogLevel.DEBUG: 0.0})
+        self.written = list()
+        self.client.ensure_log_indexes = lambda: None
+        self.client.write = lambda collection, data: self.written.append((collection, data))
+
+    def test_truncate(self):
+        bars = {"bars": [{"c": i} for i in range(100)], "note": "x" * 1000}
+        ret = truncate(bars)
+        self.assertEqual(len(ret["bars"]), 11)
+        self.assertEqual(ret["bars"][-1], "+90 items")
+        self.assertTrue(ret["note"].endswith("...(+500)"))
+
+    def test_log_sampling(self):
+        self.client.log("debug message", LogLevel.DEBUG)
+        self.client.log("error message", LogLevel.ERROR, obj={"bars": list(range(50))})
+        self.assertEqual(len(self.written), 1)
+        collection, doc = self.written[0]
+        self.assertEqual(collection, "log")
+        self.assertEqual(doc["level"], LogLevel.ERROR)
+        self.assertEqual(len(doc["obj"]["bars"]), 11)
+
+
+    def test_version(self):
+        class Collection():
+            def __init__(self):
+                self.doc = None
+            def insert_one(self, data):
+                pass
+            def update_one(self, query, update, upsert=False):
+                if "$inc" in update:
+                    self.doc = {"version": (self.doc or {"version": 0})["version"] + update["$inc"]["version"]}
+            def find_one(self, query):
+                return self.doc
+
+        class Database():
+            def __init__(self):
+                self.collections = dict()
+            def get_collection(self, name, **options):
+                return self.collections.setdefault(name, Collection())
+
+        client = DataClient(None)
+        db = Database()
+        client._client = type("Client", (), {"get_database": lambda self, name: db})()
+        self.assertEqual(client.version("order"), 0)
+        client.write("order", {})
+        client.update("order", {}, {"profit": 1.0})
+        client.update("watchlist", {}, {"total_profit": 1.0})
+        self.assertEqual(client.version("order"), 2)
+
+if __name__ == '__main__':
+    unittest.main()
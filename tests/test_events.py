@@ -0,0 +1,39 @@
+import asyncio
+import threading
+import unittest
+
+from common.events import EventBus
+
+
+class TestEvents(unittest.TestCase):
+
+    def test_publish_from_thread(self):
+        bus = EventBus()
+
+        async def receive():
+            queue = bus.subscribe()
+            thread = threading.Thread(target=bus.publish, args=({"type": "buy"},))
+            thread.start()
+            event = await asyncio.wait_for(queue.get(), 1)
+            thread.join()
+            bus.unsubscribe(queue)
+            return event
+
+        self.assertEqual(asyncio.run(receive()), {"type": "buy"})
+        self.assertEqual(bus.subscribers, {})
+
+    def test_slow_subscriber_drops_oldest(self):
+        bus = EventBus()
+        bus.MAX_QUEUE = 2
+
+        async def receive():
+            queue = bus.subscribe()
+            [bus.publish({"i": i}) for i in range(3)]
+            await asyncio.sleep(0)
+            return [queue.get_nowait() for _ in range(queue.qsize())]
+
+        self.assertEqual(asyncio.run(receive()), [{"i": 1}, {"i": 2}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from datetime import datetime, timedelta, UTC
+
+from trading.exit_evaluator import ExitEvaluator
+
+
+class FakeFetcher():
+    def __init__(self, bars):
+        self.bars = bars
+        self.calls = 0
+
+    def fetch_bars(self, symbols, timeframe, start, end=None, limit=10000, page_token=None):
+        self.calls += 1
+        return {"bars": {symbol: self.bars.get(symbol, []) for symbol in symbols}, "next_page_token": None}
+
+
+class TestExitEvaluator(unittest.TestCase):
+
+    def setUp(self):
+        self.now = datetime.now(UTC).replace(second=0, microsecond=0)
+        minute = lambda i: (self.now - timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        self.fetcher = FakeFetcher({
+            "AAPL": [{"t": minute(3), "h": 101.0}, {"t": minute(2), "h": 105.0}, {"t": minute(1), "h": 102.0}],
+            "MSFT": [{"t": minute(1), "h": 400.0}],
+        })
+        self.evaluator = ExitEvaluator(self.fetcher)
+        self.evaluator.reset({"AAPL": None, "MSFT": self.now - timedelta(minutes=10)})
+
+    def test_high_since(self):
+        self.assertEqual(self.evaluator.high_since("AAPL"), 105.0)
+        self.assertEqual(self.evaluator.high_since("MSFT"), 400.0)
+        # one request for every symbol
+        self.assertEqual(self.fetcher.calls, 1)
+
+    def test_high_since_buy(self):
+        # bars before the lot was bought don't count, naive mongo datetimes are utc
+        bought = (self.now - timedelta(minutes=1)).replace(tzinfo=None)
+        self.assertEqual(self.evaluator.high_since("AAPL", bought), 102.0)
+        self.assertIsNone(self.evaluator.high_since("AAPL", self.now + timedelta(minutes=1)))
+        self.assertIsNone(self.evaluator.high_since("NVDA"))
+
+    def test_last_timestamp(self):
+        self.assertEqual(self.evaluator.last_timestamp("AAPL"), self.now - timedelta(minutes=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
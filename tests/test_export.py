@@ -0,0 +1,61 @@
+import csv
+import io
+import json
+import unittest
+from datetime import datetime, UTC
+
+from bson import ObjectId, Decimal128
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from data.data_client import DataClient
+from routers import export
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.docs = [
+            {"_id": ObjectId(), "symbol": "AAPL", "profit": Decimal128("0.10"), "buy_timeline": {"side": "buy"}, "created_at": datetime(2024, 11, 22, tzinfo=UTC)}
+            for _ in range(export.CHUNK_ROWS + 1)
+        ]
+        self.queries = list()
+        data_client = DataClient(None)
+
+        def iterate(collection, query, projection=None, sort=None, batch_size=1000):
+            self.queries.append((collection, query))
+            yield from self.docs
+
+        data_client.iterate = iterate
+        trader = type("Trader", (), {"data_client": data_client})
+        self.get_trader = export.get_trader
+        export.get_trader = lambda: trader
+        app = FastAPI()
+        app.include_router(export.router)
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        export.get_trader = self.get_trader
+
+    def test_ndjson(self):
+        res = self.client.get("/v1/export/orders", params={"symbol": "AAPL", "session": "s1", "start": "2024-11-01T00:00:00Z"})
+        self.assertEqual(res.headers["content-type"], "application/x-ndjson")
+        lines = res.text.splitlines()
+        self.assertEqual(len(lines), len(self.docs))
+        self.assertEqual(json.loads(lines[0])["profit"], "0.10")
+        collection, query = self.queries[0]
+        self.assertEqual(collection, "order")
+        self.assertEqual(query["symbol"], "AAPL")
+        self.assertEqual(query["$or"], [{"buy_session": "s1"}, {"sell_session": "s1"}])
+        self.assertEqual(list(query["created_at"]), ["$gte"])
+
+    def test_csv(self):
+        res = self.client.get("/v1/export/orders", params={"format": "csv"})
+        rows = list(csv.DictReader(io.StringIO(res.text)))
+        self.assertEqual(len(rows), len(self.docs))
+        self.assertEqual(rows[0]["created_at"], "2024-11-22T00:00:00+00:00")
+        self.assertEqual(json.loads(rows[0]["buy_timeline"]), {"side": "buy"})
+        self.assertEqual(rows[0]["sell_price"], "")
+
+    def test_format(self):
+        self.assertEqual(self.client.get("/v1/export/logs", params={"format": "xml"}).status_code, 400)
@@ -0,0 +1,44 @@
+import unittest
+from datetime import datetime, timedelta, UTC
+
+from bson.decimal128 import Decimal128
+
+from common import fixed_point
+from common.helper import Helper
+from models.order import Order
+
+
+class TestFixedPoint(unittest.TestCase):
+
+    def test_profit(self):
+        self.assertEqual(fixed_point.profit(224.188, 225.184, 0.04460542), 40000)
+        self.assertEqual(fixed_point.profit(100.0, 100.1, 0.05), 0)
+        # a float product of 0.125 rounds down to the even cent either way, a loss rounds symmetrically
+        self.assertEqual(fixed_point.profit(10.0, 10.25, 0.5), 120000)
+        self.assertEqual(fixed_point.profit(10.25, 10.0, 0.5), -120000)
+
+    def test_mongo_round_trip(self):
+        order = Order(symbol="AAPL", quantity=0.1, buy_price=229.144, sell_price=None)
+        doc = order.to_mongo()
+        self.assertEqual(doc["quantity"], Decimal128("0.1"))
+        self.assertIsNone(doc["sell_price"])
+        self.assertEqual(Order.from_mongo(doc).buy_price, 229.144)
+        # documents written before Decimal128 still load
+        self.assertEqual(Order.from_mongo({"buy_price": 1.5}).buy_price, 1.5)
+
+    def test_calculate_profit(self):
+        now = datetime.now(UTC)
+        records = [Order(symbol="AAPL", profit=0.1, sell_at_utc=now) for _ in range(3)]
+        records.append(Order(symbol="MSFT", profit=1.0, sell_at_utc=now - timedelta(days=45)))
+        records.append(Order(symbol="MSFT", profit=2.0, sell_at_utc=now - timedelta(days=90)))
+        ret = Helper.calculate_profit(records)
+        self.assertEqual(ret["today"], 0.3)
+        self.assertEqual(ret["last_30"], 0.3)
+        self.assertEqual(ret["last_60"], 1.3)
+        self.assertEqual(ret["all_time"], 3.3)
+        self.assertEqual(ret["symbols"], {"AAPL": 0.3, "MSFT": 3.0})
+        self.assertEqual(Helper.calculate_profit([])["all_time"], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, UTC
+
+from trading.market_data import MarketDataCache
+
+
+class FakeFetcher():
+    def __init__(self):
+        self.calls = list()
+
+    def fetch_latest_bars(self, symbols):
+        self.calls.append(("latest", tuple(symbols)))
+        return {symbol: {"c": 1.0} for symbol in symbols}
+
+    def fetch_historical_bars(self, asset, timeframe, limit, start, end, page_token=None):
+        self.calls.append(("bars", asset))
+        return {"bars": []}
+
+    def fetch_clock(self):
+        self.calls.append(("clock",))
+        return {"is_open": True}
+
+
+class TestMarketData(unittest.TestCase):
+
+    def setUp(self):
+        self.fetcher = FakeFetcher()
+        self.cache = MarketDataCache(self.fetcher)
+
+    def test_latest_bar_batched(self):
+        self.cache.register(["AAPL", "MSFT", "NVDA"])
+        self.assertEqual(self.cache.latest_bar("MSFT"), {"MSFT": {"c": 1.0}})
+        self.cache.latest_bar("AAPL")
+        self.cache.latest_bar("NVDA")
+        self.assertEqual(self.fetcher.calls, [("latest", ("AAPL", "MSFT", "NVDA"))])
+
+    def test_shared_between_accounts(self):
+        threads = [threading.Thread(target=self.cache.historical_bars, args=("AAPL", "1D", 7, "2024-01-01", "2024-02-01")) for _ in range(5)]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+        self.cache.clock()
+        self.cache.clock()
+        self.assertEqual(self.fetcher.calls, [("bars", "AAPL"), ("clock",)])
+
+    def test_owner_fails(self):
+        started, release = threading.Event(), threading.Event()
+        fetch_latest_bars = self.fetcher.fetch_latest_bars
+
+        def fail_first(symbols):
+            if not started.is_set():
+                started.set()
+                release.wait(5)
+                raise Exception("429")
+            return fetch_latest_bars(symbols)
+
+        self.fetcher.fetch_latest_bars = fail_first
+        errors, results = list(), list()
+        owner = threading.Thread(target=lambda: self.assertRaises(Exception, self.cache.latest_bar, "AAPL") or errors.append(1), daemon=True)
+        owner.start()
+        started.wait(5)
+        waiter = threading.Thread(target=lambda: results.append(self.cache.latest_bar("AAPL")), daemon=True)
+        waiter.start()
+        # let the waiter block on the owner's event
+        time.sleep(0.05)
+        release.set()
+        owner.join(5)
+        # the waiter fetches it itself instead of blocking on the lock
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual((errors, results), ([1], [{"AAPL": {"c": 1.0}}]))
+        self.assertEqual(self.cache.clock(), {"is_open": True})
+
+    def test_reset(self):
+        self.cache.clock()
+        self.cache.reset()
+        self.cache.clock()
+        self.assertEqual(len(self.fetcher.calls), 2)
+
+    def test_preloaded_clock(self):
+        now = datetime.now(UTC)
+        # stored before the open, the session has started since
+        self.cache.preload_clock({"is_open": False, "next_open": (now - timedelta(minutes=5)).isoformat(), "next_close": (now + timedelta(hours=6)).isoformat()})
+        self.assertTrue(self.cache.clock()["is_open"])
+        self.assertEqual(self.fetcher.calls, [])
+        # after the close the clock is asked again
+        self.cache.preload_clock({"is_open": False, "next_open": (now - timedelta(hours=7)).isoformat(), "next_close": (now - timedelta(hours=1)).isoformat()})
+        self.cache.clock()
+        self.assertEqual(self.fetcher.calls, [("clock",)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+from bson import ObjectId
+
+from backtest.optimizer import Optimizer, ParameterSpace
+from backtest.simulator import simulate
+from data.data_client import DataClient
+
+
+class TestOptimizer(unittest.TestCase):
+
+    def setUp(self):
+        # flat at 100 with a 2 point daily swing, a dip to 98 and a recovery to 101
+        self.c = [100.0, 100.0, 100.0, 98.0, 101.0]
+        self.h = [x + 1 for x in self.c]
+        self.l = [x - 1 for x in self.c]
+        self.params = {"entry_period": 3, "exit_period": 3, "entry_swing": 1.0, "batch_size": 98}
+
+    def test_simulate(self):
+        result = simulate(self.params, self.h, self.l, self.c)
+        # only the dip is 1x the swing below the high, buys 1 share at 98 and sells at 101
+        self.assertEqual(result["buys"], 1)
+        self.assertEqual(result["sells"], 1)
+        self.assertEqual(result["profit"], 3.0)
+        self.assertEqual(result["open_lots"], 0)
+
+    def test_parameter_space(self):
+        space = ParameterSpace({"entry_swing": [0.25, 0.5], "exit_swing": [0.25, 0.5, 0.75]})
+        self.assertEqual(len(space), 6)
+        self.assertEqual(len(list(space.grid())), 6)
+        self.assertEqual(len(list(space.sample(10, seed=1))), 10)
+
+    def test_search(self):
+        optimizer = Optimizer(None, workers=1)
+        space = ParameterSpace({"entry_period": [3], "exit_period": [3], "entry_swing": [1.0], "batch_size": [98], "exit_swing": [0.25, 10.0]})
+        results = optimizer.search(self.h, self.l, self.c, space.grid())
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0][0]["exit_swing"], 0.25)
+
+    def test_apply(self):
+        data_client = DataClient(None)
+        updates = list()
+        data_client.update = lambda collection, query, data, upsert=False: updates.append((collection, query, data))
+        watchlist_id = ObjectId()
+        Optimizer(data_client, workers=1).apply(watchlist_id, self.params)
+        # the symbol is on one watchlist per account, only this one is tuned
+        self.assertEqual(updates, [("watchlist", {"_id": watchlist_id}, self.params)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+from datetime import datetime, timedelta, UTC
+
+from data.data_client import DataClient
+from trading.order_journal import OrderJournal, IntentStatus
+
+
+class TestOrderJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.client = DataClient(None)
+        self.docs = dict()
+        self.client.write = lambda collection, data: self.docs.__setitem__(data["_id"], data)
+        self.client.update = lambda collection, query, data, upsert=False: self.docs[query["_id"]].update(data)
+        self.journal = OrderJournal(self.client, account="main")
+
+    def test_intent_before_submit(self):
+        payload = {"symbol": "AAPL", "side": "buy"}
+        client_order_id = self.journal.open("AAPL", "buy", payload)
+        self.assertEqual(payload["client_order_id"], client_order_id)
+        self.assertEqual(self.docs[client_order_id]["status"], IntentStatus.PENDING)
+        self.assertEqual(self.docs[client_order_id]["account"], "main")
+        self.journal.submitted(client_order_id, "1")
+        self.assertEqual(self.docs[client_order_id]["order_id"], "1")
+        self.journal.resolve(client_order_id)
+        self.assertEqual(self.docs[client_order_id]["status"], IntentStatus.RESOLVED)
+
+    def test_is_stale(self):
+        # pymongo returns naive utc datetimes
+        now = datetime.now(UTC).replace(tzinfo=None)
+        self.assertFalse(self.journal.is_stale({"created_at": now}))
+        self.assertTrue(self.journal.is_stale({"created_at": now - timedelta(minutes=10)}))
+
+
+if __name__ == '__main__':
+    unittest.main()
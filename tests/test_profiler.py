@@ -0,0 +1,29 @@
+import time
+import unittest
+
+from common.profiler import SamplingProfiler
+
+
+def busy(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_folded(self):
+        profiler = SamplingProfiler(interval=0.001)
+        self.assertTrue(profiler.start())
+        # only one profile runs at a time
+        self.assertFalse(SamplingProfiler().start())
+        busy(0.1)
+        profiler.stop()
+        self.assertGreater(profiler.samples, 10)
+        lines = profiler.folded().splitlines()
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertTrue(stack.startswith("MainThread;"))
+        self.assertIn("busy (", stack)
+        self.assertGreater(int(count), 0)
+        self.assertTrue(SamplingProfiler.ACTIVE.acquire(blocking=False))
+        SamplingProfiler.ACTIVE.release()
@@ -0,0 +1,45 @@
+import unittest
+
+from trading.rate_limiter import RateLimiter, TokenBucket, RateLimitExceeded, EndpointClass, Priority
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.bucket = TokenBucket(10, period=60.0, max_wait={Priority.ORDER: 0.0, Priority.TRADING: 0.0, Priority.DATA: 0.0})
+
+    def test_acquire(self):
+        for _ in range(7):
+            self.bucket.acquire(Priority.DATA)
+        self.assertEqual(self.bucket.utilization()["used"], 7)
+
+    def test_data_lane_leaves_reserve(self):
+        # 25% of the bucket is kept for trading and order requests
+        for _ in range(7):
+            self.bucket.acquire(Priority.DATA)
+        with self.assertRaises(RateLimitExceeded):
+            self.bucket.acquire(Priority.DATA)
+        # orders can still go through
+        self.bucket.acquire(Priority.TRADING)
+        self.bucket.acquire(Priority.ORDER)
+        self.assertEqual(self.bucket.utilization()["rejected"], 1)
+
+    def test_penalize(self):
+        self.bucket.penalize(30)
+        with self.assertRaises(RateLimitExceeded):
+            self.bucket.acquire(Priority.ORDER)
+
+    def test_observe(self):
+        self.bucket.observe(0)
+        with self.assertRaises(RateLimitExceeded):
+            self.bucket.acquire(Priority.ORDER)
+
+    def test_from_config(self):
+        limiter = RateLimiter.from_config({"market_data": 50})
+        utilization = limiter.utilization()
+        self.assertEqual(utilization[EndpointClass.MARKET_DATA.value]["capacity"], 50)
+        self.assertEqual(utilization[EndpointClass.TRADING.value]["capacity"], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime
+
+from bson import ObjectId
+
+from common import recording
+from data.data_client import DataClient
+
+
+class FakeResponse():
+    def __init__(self, status_code: int, content: bytes, headers: dict = None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+
+class TestRecording(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".jsonl")
+        os.close(fd)
+
+    def tearDown(self):
+        recording.stop()
+        os.remove(self.path)
+
+    def test_keys(self):
+        self.assertEqual(
+            recording.http_key("GET", "https://data.alpaca.markets/v2/stocks/bars?symbols=AAPL&timeframe=1D&start=2024-11-01&end=2024-11-22", "a1"),
+            "a1 GET /v2/stocks/bars?symbols=AAPL&timeframe=1D"
+        )
+        self.assertEqual(recording.mongo_key("read", "order", {"symbol": "AAPL", "account": "a1"}), "a1 read order account,symbol")
+        self.assertEqual(recording.mongo_key("read", "watchlist", {"is_active": True}), "None read watchlist is_active")
+        self.assertEqual(recording.redact({"uri": "mongodb://", "accounts": [{"alpaca_api_key": "k", "account": "a1"}], "debug": True}), {"accounts": [{"account": "a1"}], "debug": True})
+
+    def test_record_replay(self):
+        responses = iter([FakeResponse(200, b'{"n": 1}', {"X-RateLimit-Remaining": "199"}), FakeResponse(200, b'{"n": 2}')])
+        docs = [{"_id": ObjectId(), "created_at": datetime(2024, 11, 22)}]
+        recording.record(self.path, {"alpaca_api_key": "k", "debug": True})
+        for _ in range(2):
+            recording.http("GET", "https://paper-api.alpaca.markets/v2/orders?after=1", lambda: next(responses))
+        recording.mongo("read", "order", lambda: (time.sleep(0.05), docs)[1], query={"symbol": "AAPL"})
+        recording.mongo("bulk_write", "order", lambda: type("BulkWriteResult", (), {"upserted_count": 1, "modified_count": 2})(), write=True)
+        recording.tick(0.1)
+        recording.stop()
+
+        replayer = recording.replay(self.path, latency_scale=0)
+        self.assertEqual(replayer.config, {"debug": True})
+        self.assertEqual(len(replayer.ticks), 1)
+        fail = lambda: self.fail("replay called through")
+        # the after param differs between the recording and the replay
+        res = recording.http("GET", "https://paper-api.alpaca.markets/v2/orders?after=2", fail)
+        self.assertEqual((res.status_code, res.content, res.headers.get("x-ratelimit-remaining")), (200, b'{"n": 1}', "199"))
+        self.assertEqual(recording.http("GET", "https://paper-api.alpaca.markets/v2/orders", fail).content, b'{"n": 2}')
+        # the last response repeats once they run out
+        self.assertEqual(recording.http("GET", "https://paper-api.alpaca.markets/v2/orders", fail).content, b'{"n": 2}')
+        self.assertEqual(recording.mongo("read", "order", fail, query={"symbol": "MSFT"}), docs)
+        res = recording.mongo("bulk_write", "order", fail, write=True)
+        self.assertEqual((res.upserted_count, res.modified_count), (1, 2))
+        # a write that was never recorded is dropped, a read raises
+        self.assertIsNone(recording.mongo("write", "log", fail, write=True))
+        with self.assertRaises(Exception):
+            recording.mongo("read", "watchlist", fail, query={"is_active": True})
+
+    def test_accounts(self):
+        recording.record(self.path)
+        for account in ("a1", "a2"):
+            recording.mongo("read", "order", lambda: [{"account": account}], query={"symbol": "AAPL", "account": account})
+        recording.stop()
+        recording.replay(self.path, latency_scale=0)
+        self.assertTrue(recording.replaying())
+        fail = lambda: self.fail("replay called through")
+        # each account gets its own documents, whatever order the accounts run in
+        self.assertEqual(recording.mongo("read", "order", fail, query={"symbol": "AAPL", "account": "a2"}), [{"account": "a2"}])
+        self.assertEqual(recording.mongo("read", "order", fail, query={"symbol": "AAPL", "account": "a1"}), [{"account": "a1"}])
+
+    def test_latency_scale(self):
+        recording.record(self.path)
+        recording.mongo("read", "order", lambda: (time.sleep(0.1), [])[1])
+        recording.stop()
+        recording.replay(self.path, latency_scale=0.5)
+        started = time.perf_counter()
+        recording.mongo("read", "order", lambda: self.fail("replay called through"))
+        self.assertGreaterEqual(time.perf_counter() - started, 0.05)
+
+    def test_data_client(self):
+        recording.record(self.path)
+        recording.stop()
+        recording.replay(self.path, latency_scale=0)
+        # replay never connects, there is no uri
+        data_client = DataClient(None)
+        self.assertIsNone(data_client.update("watchlist", {"_id": 1}, {"evaluated_at": None}))
+        with self.assertRaises(Exception):
+            data_client.read("watchlist", {"is_active": True})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+from trading.risk import RiskEngine
+
+
+class FakeClient():
+    def __init__(self):
+        self.calls = 0
+
+    def get_account(self):
+        self.calls += 1
+        return {"buying_power": "100"}
+
+    def get_positions(self):
+        return [{"symbol": "AAPL", "market_value": "40"}, {"symbol": "MSFT", "market_value": "10"}]
+
+
+class TestRisk(unittest.TestCase):
+
+    def test_disabled(self):
+        client = FakeClient()
+        self.assertIsNone(RiskEngine().check("AAPL", 1000, client))
+        self.assertEqual(client.calls, 0)
+
+    def test_limits(self):
+        client = FakeClient()
+        risk = RiskEngine.from_config({"max_exposure": 80, "max_symbol_exposure": 50, "max_sector_exposure": 60, "sectors": {"AAPL": "tech", "MSFT": "tech"}})
+        self.assertIsNone(risk.check("AAPL", 10, client))
+        self.assertEqual(risk.check("AAPL", 10, client), "AAPL exposure limit 50")
+        self.assertEqual(risk.check("MSFT", 20, client), "tech exposure limit 60")
+        self.assertIsNone(risk.check("NVDA", 20, client))
+        self.assertEqual(risk.check("NVDA", 20, client), "exposure limit 80")
+        self.assertEqual(client.calls, 1)
+        risk.on_sell("AAPL", 50)
+        self.assertIsNone(risk.check("NVDA", 20, client))
+
+    def test_buying_power(self):
+        risk = RiskEngine({"min_buying_power": 90})
+        self.assertEqual(risk.check("AAPL", 20, FakeClient()), "buying power 100.00")
+        self.assertIsNone(risk.check("AAPL", 10, FakeClient()))
+        risk.reset()
+        self.assertFalse(risk.loaded)
@@ -0,0 +1,90 @@
+import unittest
+from datetime import datetime, timedelta, UTC
+
+from models.order import Order
+from models.watchlist import Watchlist
+from strategy.base import Snapshot
+from trading.scheduler import PriorityScheduler
+from trading.signals import Signals
+
+
+class FakeClient():
+    def __init__(self, prices: dict):
+        self.prices = prices
+        self.sell_orders = dict()
+
+    def get_latest_bar(self, symbol: str) -> dict:
+        return {symbol: {"c": self.prices[symbol]}}
+
+
+def watchlist(symbol: str, minutes: int = 1, low: float = 95.0, high: float = 110.0) -> Watchlist:
+    return Watchlist(symbol=symbol, threshold_low=low, threshold_high=high, threshold_swing=2.0, evaluated_at=datetime.now(UTC) - timedelta(minutes=minutes))
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = PriorityScheduler.from_config({"tick_seconds": 60, "max_interval_seconds": 900})
+
+    def test_disabled(self):
+        scheduler = PriorityScheduler.from_config(None)
+        watchlists = [watchlist("AAPL")]
+        self.assertEqual(scheduler.select(None, watchlists, {}), (watchlists, []))
+
+    def test_interval(self):
+        self.assertEqual(self.scheduler.interval(0.5), 60)
+        self.assertEqual(self.scheduler.interval(2.5), 240)
+        self.assertEqual(self.scheduler.interval(100), 900)
+
+    def test_select(self):
+        watchlists = [
+            # half a swing from the sell target, due every tick
+            watchlist("NEAR"),
+            # 2.5 swings from the sell target, waits 240s
+            watchlist("FAR"),
+            # as far but last evaluated 20 minutes ago
+            watchlist("STALE", minutes=20),
+            # jumped through its sell target
+            watchlist("CROSSED"),
+            # never evaluated
+            Watchlist(symbol="NEW"),
+            # a sell placed on an earlier tick is reconciled every tick
+            watchlist("PENDING"),
+            # unless the listing shows it still resting, e.g. a broker exit take-profit
+            watchlist("RESTING"),
+            # the listing shows it filled
+            watchlist("SOLD"),
+        ]
+        client = FakeClient({"NEAR": 109.0, "FAR": 105.0, "STALE": 105.0, "CROSSED": 120.0, "NEW": 100.0, "PENDING": 105.0, "RESTING": 105.0, "SOLD": 105.0})
+        client.sell_orders = {"2": {"id": "2", "status": "new"}, "3": {"id": "3", "status": "filled"}}
+        orders = {
+            (None, None, "PENDING"): [Order(sell_order_id="1", sell_status="new")],
+            (None, None, "RESTING"): [Order(sell_order_id="2", sell_status="new")],
+            (None, None, "SOLD"): [Order(sell_order_id="3", sell_status="new")],
+        }
+        selected, over_budget = self.scheduler.select(client, watchlists, orders)
+        self.assertEqual([w.symbol for w in selected], ["CROSSED", "NEW", "NEAR", "STALE", "PENDING", "SOLD"])
+        self.assertEqual(over_budget, [])
+        self.assertEqual(self.scheduler.stats(), {"evaluated": 6, "waiting": 2, "over_budget": 0})
+
+        # the budget goes to the nearest first
+        self.scheduler.budget = 2
+        selected, over_budget = self.scheduler.select(client, watchlists, orders)
+        self.assertEqual([w.symbol for w in selected], ["CROSSED", "NEW"])
+        self.assertEqual([w.symbol for w in over_budget], ["NEAR", "STALE", "PENDING", "SOLD"])
+
+    def test_thresholds(self):
+        signals = Signals(symbol="AAPL", timeframe="1D", window=45, entry=dict(), exit={"avg_daily_swing": 4.0}, entry_price=99.0, target_swing=1.0, rebuy_drop=0.1)
+        at = datetime.now(UTC)
+        snapshot = Snapshot()
+        snapshot.add(Watchlist(symbol="AAPL", total_allowed_batches=3), 100.0, signals, [Order(buy_price=100.0, created_at=at), Order(buy_price=102.0, created_at=at + timedelta(seconds=1))], [None, None])
+        snapshot.add(Watchlist(symbol="MSFT"), 100.0, signals, [], [])
+        (_, low, high, swing), (_, entry, target, _) = PriorityScheduler.thresholds(snapshot)
+        # rebuy 10% under the newest lot, the lowest target of the two lots
+        self.assertAlmostEqual(low, 91.8)
+        self.assertEqual((high, swing), (101.0, 4.0))
+        self.assertEqual((entry, target), (99.0, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from common.helper import Helper
+from data.data_client import DataClient
+from trading.screener import Screener
+
+
+def bars(base: float, swing: float, days: int = 40) -> list:
+    return [{"t": f"2024-10-{i:02d}", "o": base, "h": base + swing * (1 + i % 3), "l": base - swing, "c": base + i * 0.01, "v": 100000} for i in range(days)]
+
+
+class FakeClient():
+    account = "main"
+
+    def __init__(self):
+        self.bars = {"AAA": bars(50.0, 1.0), "BBB": bars(50.0, 0.5), "CHEAP": bars(2.0, 0.5), "NEW": bars(50.0, 1.0, days=5)}
+        self.requests = list()
+
+    def get_assets(self) -> list:
+        ret = [{"symbol": symbol, "tradable": True, "fractionable": True} for symbol in self.bars]
+        return ret + [{"symbol": "LOCKED", "tradable": False, "fractionable": True}]
+
+    def fetch_bars(self, symbols, timeframe, start, page_token=None):
+        self.requests.append(symbols)
+        # one page per symbol
+        symbols = [s for s in symbols if s in self.bars]
+        i = symbols.index(page_token) if page_token else 0
+        return {"bars": {symbols[i]: self.bars[symbols[i]]}, "next_page_token": symbols[i + 1] if i + 1 < len(symbols) else None}
+
+
+class TestScreener(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeClient()
+        self.screener = Screener(self.client, DataClient(None))
+        self.screener.data_client.log = lambda **kwargs: None
+
+    def test_score(self):
+        scored = self.screener.score(self.screener.bars(self.screener.universe()))
+        # CHEAP is under the minimum price and NEW lacks an exit period of bars
+        self.assertEqual([c["symbol"] for c in scored], ["AAA", "BBB"])
+        # the same metrics as the per-symbol path, which reads bars newest first
+        newest_first = {"bars": list(reversed(self.client.bars["AAA"]))}
+        entry = Helper.process_bar(newest_first, self.screener.defaults.entry_period)
+        exit = Helper.process_bar(newest_first, self.screener.defaults.exit_period)
+        self.assertEqual(scored[0]["day_high"], entry["day_high"])
+        self.assertAlmostEqual(scored[0]["avg_daily_swing"], exit["avg_daily_swing"])
+        self.assertAlmostEqual(scored[0]["entry_price"], entry["day_high"] - entry["avg_daily_swing"] * 0.25, places=4)
+
+    def test_batches(self):
+        self.screener.BATCH = 2
+        self.screener.bars(self.screener.universe())
+        self.assertEqual(sorted(self.client.requests), [["AAA", "BBB"], ["AAA", "BBB"], ["CHEAP", "NEW"], ["CHEAP", "NEW"]])
+
+    def test_run(self):
+        operations = list()
+        self.screener.data_client.bulk_write = lambda collection, ops: operations.extend(ops)
+        ret = self.screener.run(top=1, dry_run=False)
+        self.assertEqual(ret["universe"], 4)
+        self.assertEqual(len(operations), 1)
+        update = operations[0]._doc
+        self.assertEqual(operations[0]._filter, {"account": "main", "symbol": "AAA"})
+        self.assertFalse(update["$setOnInsert"]["is_active"])
+        self.assertNotIn("screen_score", update["$setOnInsert"])
+        self.assertEqual(update["$set"]["screen_score"], ret["candidates"][0]["score"])
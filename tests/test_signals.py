@@ -0,0 +1,70 @@
+import unittest
+from datetime import datetime, timedelta, UTC
+
+from models.watchlist import Watchlist
+from trading.signals import SignalCache
+
+
+class FakeFetcher():
+    def __init__(self):
+        self.calls = list()
+
+    def get_historical_bars(self, asset, timeframe, limit, start, end, page_token=None):
+        self.calls.append((asset, timeframe))
+        # newest first, like alpaca with sort=desc
+        return {"bars": [{"h": 12.0 - i * 0.1, "l": 10.0 - i * 0.1, "c": 11.0} for i in range(30)]}
+
+    def fetch_bars(self, symbols, timeframe, start, page_token=None):
+        self.calls.append((tuple(symbols), start))
+        return {"bars": {symbol: [{"t": f"{start}T04:00:00Z", "h": 13.0, "l": 12.0, "c": 12.5}] for symbol in symbols}}
+
+
+class TestSignals(unittest.TestCase):
+
+    def setUp(self):
+        self.fetcher = FakeFetcher()
+        self.cache = SignalCache(self.fetcher)
+
+    def test_shared_snapshot(self):
+        w = Watchlist(symbol="AAPL")
+        signals = self.cache.get(w)
+        self.assertIs(self.cache.get(w), signals)
+        self.assertIs(self.cache.get(Watchlist(symbol="AAPL", account="other")), signals)
+        self.assertEqual(len(self.fetcher.calls), 1)
+        self.assertEqual(self.cache.stats(), {"hits": 2, "misses": 1, "hit_rate": 0.667})
+        self.assertEqual(signals.target_swing, 0.5)
+        self.assertEqual(signals.entry_price, 11.5)
+        self.assertEqual(signals.target_price(100.0), 100.5)
+        self.assertEqual(signals.rebuy_price(100.0), 97.5)
+
+    def test_params_rebuild_without_refetch(self):
+        self.cache.get(Watchlist(symbol="AAPL"))
+        signals = self.cache.get(Watchlist(symbol="AAPL", exit_swing=0.5))
+        self.assertEqual(signals.target_swing, 1.0)
+        self.assertEqual(len(self.fetcher.calls), 1)
+
+    def test_reset(self):
+        self.cache.get(Watchlist(symbol="AAPL"))
+        self.cache.reset()
+        self.cache.get(Watchlist(symbol="AAPL"))
+        self.assertEqual(len(self.fetcher.calls), 2)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_preload(self):
+        days = [(datetime.now(UTC) - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(1, 60)]
+        history = {symbol: [{"t": f"{day}T04:00:00Z", "h": 12.0, "l": 10.0, "c": 11.0} for day in days] for symbol in ("AAPL", "MSFT")}
+        self.cache.preload(history, days[-1])
+        signals = self.cache.get(Watchlist(symbol="AAPL"))
+        self.cache.get(Watchlist(symbol="MSFT"))
+        # today's bar of both symbols in one request, the history is cut to the window
+        today = datetime.now(UTC).strftime("%Y-%m-%d")
+        self.assertEqual(self.fetcher.calls, [(("AAPL", "MSFT"), today)])
+        self.assertEqual(signals.entry["last"]["c"], 12.5)
+        self.assertEqual(signals.entry["day_high"], 13.0)
+        # a symbol the warm up did not store is fetched on its own
+        self.cache.get(Watchlist(symbol="NVDA"))
+        self.assertEqual(self.fetcher.calls[-1], ("NVDA", "1D"))
+
+
+if __name__ == '__main__':
+    unittest.main()
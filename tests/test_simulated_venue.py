@@ -0,0 +1,52 @@
+import unittest
+
+from common.helper import NullNotifier, TelegramNotifier
+from data.data_client import DataClient
+from trading.alpaca_client import AlpacaTradingClient
+from trading.simulated_venue import SimulatedVenue
+
+
+class FakeClient():
+    account = "shadow-test"
+
+    def __init__(self):
+        self.bar = {"c": 100.0, "h": 101.0}
+
+    def get_latest_bar(self, symbol):
+        return {symbol: self.bar}
+
+
+class TestSimulatedVenue(unittest.TestCase):
+
+    def setUp(self):
+        SimulatedVenue.ORDERS.clear()
+        self.client = FakeClient()
+        self.venue = SimulatedVenue(self.client, slippage_bps=10, cash=1000)
+
+    def test_market_fill_with_slippage(self):
+        order = self.venue.create_order({"symbol": "AAPL", "side": "buy", "type": "market", "notional": 100.1, "client_order_id": "c1"})
+        self.assertEqual(order["status"], "filled")
+        self.assertEqual(order["filled_avg_price"], "100.1")
+        self.assertEqual(order["filled_qty"], "1.0")
+        self.assertEqual(order["client_order_id"], "c1")
+        self.assertEqual(self.venue.get_account()["buying_power"], "899.9")
+        self.assertEqual(self.venue.get_positions()[0]["market_value"], "99.9")
+
+    def test_resting_limit(self):
+        order = self.venue.create_order({"symbol": "AAPL", "side": "sell", "type": "limit", "qty": 1, "limit_price": 102.0})
+        self.assertEqual(order["status"], "new")
+        self.client.bar = {"c": 101.0, "h": 102.5}
+        order = self.venue.get_order(order["id"])
+        self.assertEqual((order["status"], order["filled_avg_price"]), ("filled", "102.0"))
+        self.assertEqual(self.venue.get_order("unknown")["status"], "expired")
+
+    def test_shadow_client(self):
+        client = AlpacaTradingClient(api_key=None, api_secret_key=None, base_url=None, data_base_url=None, data_client=DataClient(None), notifier=TelegramNotifier(bot_id=None))
+        client.enable_shadow(SimulatedVenue(client))
+        # simulated orders never reach the live channel
+        self.assertIsInstance(client.notifier, NullNotifier)
+        self.assertEqual(client.collection("order"), "shadow_order")
+
+
+if __name__ == '__main__':
+    unittest.main()
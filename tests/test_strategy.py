@@ -0,0 +1,91 @@
+import unittest
+from datetime import datetime, timedelta, UTC
+
+from data.data_client import DataClient
+from models.order import Order
+from models.watchlist import Watchlist, ExitMode
+from strategy.base import Snapshot, Action
+from strategy.registry import strategy_factory
+from trading.coinbase_client import CoinbaseTradingClient
+from trading.signals import Signals
+
+
+def signals(symbol: str, entry_price: float = 99.0, target_swing: float = 1.0) -> Signals:
+    return Signals(symbol=symbol, timeframe="1D", window=45, entry=dict(), exit=dict(), entry_price=entry_price, target_swing=target_swing, rebuy_drop=0.025)
+
+def lot(buy_price: float, days: int = 1) -> Order:
+    at = datetime.now(UTC) - timedelta(days=days)
+    return Order(quantity=1.0, buy_price=buy_price, buy_at_utc=at, created_at=at)
+
+
+class TestStrategy(unittest.TestCase):
+
+    def setUp(self):
+        self.strategy = strategy_factory(None)
+
+    def test_batch(self):
+        snapshot = Snapshot()
+        # entry below 99, a second watchlist above it, and one suspended
+        snapshot.add(Watchlist(symbol="BUY"), 98.0, signals("BUY"), [], [])
+        snapshot.add(Watchlist(symbol="HOLD"), 100.0, signals("HOLD"), [], [])
+        snapshot.add(Watchlist(symbol="SUSPENDED", is_suspend=True), 98.0, signals("SUSPENDED"), [], [])
+        # lots at 100 and 99.5 reach their target at the latest price, 100.5 only intrabar, 102 not at all
+        lots = [lot(100.0, 3), lot(99.5, 2), lot(100.5, 1), lot(102.0)]
+        snapshot.add(Watchlist(symbol="SELL"), 101.0, signals("SELL", entry_price=90.0), lots, [101.0, 101.0, 101.6, 101.6])
+        decisions = self.strategy.evaluate(snapshot)
+
+        self.assertEqual([(d.action, d.watchlist.symbol) for d in decisions], [(Action.BUY, "BUY"), (Action.SELL, "SELL"), (Action.SELL, "SELL")])
+        self.assertEqual(decisions[1].lots, lots[:2])
+        self.assertIsNone(decisions[1].limit_price)
+        self.assertEqual(decisions[1].price, 101.0)
+        self.assertEqual(decisions[2].lots, lots[2:3])
+        self.assertEqual(decisions[2].limit_price, 101.5)
+
+    def test_rebuy(self):
+        snapshot = Snapshot()
+        # the newest lot at 100, 2.5% lower is 97.5
+        snapshot.add(Watchlist(symbol="AAPL", total_allowed_batches=3), 97.0, signals("AAPL"), [lot(110.0, 3), lot(100.0)], [None, None])
+        snapshot.add(Watchlist(symbol="MSFT", total_allowed_batches=1), 97.0, signals("MSFT"), [lot(100.0)], [None])
+        decisions = self.strategy.evaluate(snapshot)
+        self.assertEqual([(d.action, d.watchlist.symbol) for d in decisions], [(Action.BUY, "AAPL")])
+
+    def test_pdt(self):
+        snapshot = Snapshot()
+        snapshot.add(Watchlist(symbol="AAPL"), 110.0, signals("AAPL"), [lot(100.0, 0)], [None], strict_pdt=True)
+        self.assertEqual(self.strategy.evaluate(snapshot), [])
+
+    def test_broker_exit(self):
+        snapshot = Snapshot()
+        # 100 resting at the broker, 99.5 needs its take-profit, 99 reached its target at the latest price
+        armed = lot(100.0, 3)
+        armed.sell_order_id = "1"
+        lots = [armed, lot(99.5, 2), lot(99.0, 1)]
+        snapshot.add(Watchlist(symbol="AAPL", exit_mode=ExitMode.BROKER, total_allowed_batches=3), 100.0, signals("AAPL", entry_price=90.0), lots, [None, None, None])
+        decisions = self.strategy.evaluate(snapshot)
+        self.assertEqual([(d.lots, d.limit_price, d.resting) for d in decisions], [([lots[2]], None, False), ([lots[1]], 100.5, True)])
+
+    def test_broker_exit_rebuy(self):
+        # 97 is below the entry and 2.5% below the newest lot
+        armed = lot(100.0, 3)
+        armed.sell_order_id = "1"
+        snapshot = Snapshot()
+        snapshot.add(Watchlist(symbol="ARMED", exit_mode=ExitMode.BROKER, total_allowed_batches=3), 97.0, signals("ARMED"), [armed], [None])
+        snapshot.add(Watchlist(symbol="ARMING", exit_mode=ExitMode.BROKER, total_allowed_batches=3), 97.0, signals("ARMING"), [lot(100.0, 3)], [None])
+        snapshot.add(Watchlist(symbol="MARKET", total_allowed_batches=3), 97.0, signals("MARKET"), [lot(100.0, 3)], [None])
+        decisions = self.strategy.evaluate(snapshot)
+        # a buy against a resting sell limit is rejected as a potential wash trade
+        self.assertEqual([(d.action, d.watchlist.symbol) for d in decisions], [(Action.SELL, "ARMING"), (Action.BUY, "MARKET")])
+
+    def test_invalid(self):
+        with self.assertRaises(Exception):
+            strategy_factory("unknown")
+
+    def test_unsupported_client(self):
+        # crypto is not traded yet, its watchlists must not fail the tick
+        snapshot = CoinbaseTradingClient(None, None, None, DataClient(None)).snapshot([Watchlist(symbol="BTC-USD")], {})
+        self.assertEqual((len(snapshot), snapshot.skipped), (0, []))
+        self.assertEqual(self.strategy.evaluate(snapshot), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
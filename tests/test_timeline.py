@@ -0,0 +1,42 @@
+import unittest
+
+from trading.timeline import Timeline, to_ns, percentiles, latency_report
+
+SECOND = 1_000_000_000
+
+
+class TestTimeline(unittest.TestCase):
+
+    def test_fill(self):
+        decided = to_ns("2024-11-22T15:00:00Z")
+        timeline = Timeline(side="buy", decision_price=100.0, decided_ns=decided)
+        timeline.submit({"side": "buy", "type": "market"})
+        self.assertEqual(timeline.endpoint, "buy market")
+        timeline.submitted_ns = decided + SECOND // 100
+        timeline.acked_ns = decided + SECOND // 10
+        timeline.fill({"status": "filled", "filled_at": "2024-11-22T15:00:01.000500Z", "filled_avg_price": "100.05"})
+        self.assertEqual(timeline.filled_ns, decided + SECOND + 500_000)
+        self.assertEqual(timeline.latency_ms(), {"submit_ms": 10.0, "ack_ms": 90.0, "fill_ms": 900.5, "total_ms": 1000.5})
+        self.assertEqual(timeline.slippage_bps(), 5.0)
+        self.assertEqual(Timeline.from_mongo(timeline.to_mongo()), timeline)
+
+    def test_unfilled(self):
+        timeline = Timeline(side="sell", decision_price=100.0, decided_ns=SECOND)
+        timeline.fill({"status": "new"})
+        self.assertIsNone(timeline.latency_ms()["total_ms"])
+        self.assertIsNone(timeline.slippage_bps())
+        # a sell filled above the decision price is favourable
+        timeline.fill({"status": "filled", "filled_at": "2024-11-22T15:00:01Z", "filled_avg_price": "100.1"})
+        self.assertLess(timeline.slippage_bps(), 0)
+
+    def test_report(self):
+        self.assertEqual(percentiles(list(range(1, 101))), {"p50": 50, "p90": 90, "p99": 99})
+        self.assertEqual(percentiles([3.0]), {"p50": 3.0, "p90": 3.0, "p99": 3.0})
+        timelines = [
+            ("AAPL", Timeline(side="buy", endpoint="buy market", decision_price=100.0, decided_ns=0, submitted_ns=SECOND, fill_price=101.0)),
+            ("MSFT", Timeline(side="sell", endpoint="sell limit", decision_price=100.0, decided_ns=0, submitted_ns=2 * SECOND)),
+        ]
+        report = latency_report(timelines)
+        self.assertEqual(report["endpoints"]["buy market"]["submit_ms"], {"count": 1, "p50": 1000.0, "p90": 1000.0, "p99": 1000.0})
+        self.assertEqual(report["symbols"]["AAPL"]["slippage_bps"]["p50"], 100.0)
+        self.assertNotIn("slippage_bps", report["symbols"]["MSFT"])
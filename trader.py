@@ -1,13 +1,24 @@
 import json
 import os
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, UTC
 
-from common.helper import Helper, TelegramNotifier
+from common.helper import Helper, TelegramNotifier, NullNotifier
+from common import recording
 from trading.trading_client import TradingClient
 from trading.alpaca_client import AlpacaTradingClient
 from trading.coinbase_client import CoinbaseTradingClient
-from data.data_client import DataClient, LogLevel
+from trading.rate_limiter import RateLimiter, RateLimitExceeded
+from trading.market_data import MarketDataCache
+from trading.exit_evaluator import ExitEvaluator
+from trading.signals import SignalCache
+from trading.risk import RiskEngine
+from trading.simulated_venue import SimulatedVenue
+from trading.scheduler import PriorityScheduler
+from strategy.registry import strategy_factory
+from data.data_client import DataClient, LogLevel, LOG_TTL_DAYS
 
 from models.base import AssetType
 from models.watchlist import Watchlist 
@@ -15,6 +26,8 @@ from models.order import Order
 
 
 CONFIG = Helper.convert_config(os.getenv("CONFIG", None))
+# daily bars of completed sessions stored by Trader.warm_up, one document per symbol
+DAILY_BARS = "daily_bars"
 
 class Trader():
 
@@ -24,34 +37,75 @@ class Trader():
     SESSION_ID = uuid.uuid4().hex
 
     def __init__(self, config: dict = CONFIG):
+        # a path appends every broker request and mongo call to an archive, replayed with python -m common.recording
+        if config.get("record", None):
+            recording.record(config["record"], config)
         self.bot_id = config.get("bot_id", None)
         self.bot_channel = config.get("bot_channel", None)
-        self.data_client = DataClient(config.get("uri", None), session_id=self.SESSION_ID)
-        self.notifier = TelegramNotifier(bot_id=self.bot_id, channel_id=self.bot_channel)
-        # ALPACA
-        self.alpaca_trading_client = AlpacaTradingClient(
-            api_key=config.get("alpaca_api_key", None), 
-            api_secret_key=config.get("alpaca_api_secret_key", None), 
-            base_url=config.get("alpaca_api_url_base", None),
-            data_base_url=config.get("alpaca_data_api_url_base", None),
-            data_client=self.data_client,
-            notifier=self.notifier
+        self.data_client = DataClient(
+            config.get("uri", None),
+            session_id=self.SESSION_ID,
+            log_ttl_days=config.get("log_ttl_days", LOG_TTL_DAYS),
+            log_sample_rates=config.get("log_sample_rates", None)
         )
+        # a replay re-runs orders that were already alerted
+        self.notifier = NullNotifier() if recording.replaying() else TelegramNotifier(bot_id=self.bot_id, channel_id=self.bot_channel)
+        # ALPACA
+        # one client per account; without an "accounts" block the top level config is the only account
+        self.alpaca_accounts: list[AlpacaTradingClient] = [
+            self.alpaca_client_factory(account) for account in (config.get("accounts", None) or [config])
+        ]
+        self.alpaca_trading_client = self.alpaca_accounts[0]
+        # market data is fetched once per tick through the first account and shared by all of them
+        self.market_data = MarketDataCache(self.alpaca_trading_client)
+        self.exit_evaluator = ExitEvaluator(self.alpaca_trading_client)
+        self.signals = SignalCache(self.alpaca_trading_client)
+        # evaluates symbols far from their thresholds less often, off without a "scheduler" block
+        self.scheduler = PriorityScheduler.from_config(config.get("scheduler", None))
+        for client in self.alpaca_accounts:
+            client.market_data = self.market_data
+            client.exit_evaluator = self.exit_evaluator
+            client.signals = self.signals
+        # shadow mode trades every account against a simulated venue and keeps the results in shadow_ collections
+        self.shadow = config.get("shadow", False)
+        if self.shadow:
+            for client in self.alpaca_accounts:
+                client.enable_shadow(SimulatedVenue(client, slippage_bps=config.get("shadow_slippage_bps", 5.0), cash=config.get("shadow_cash", 100000.0)))
         # COINBASE
         self.coinbase_trading_client = CoinbaseTradingClient(
             api_key=config.get("coinbase_api_key", None),
             api_secret_key=config.get("coinbase_api_secret_key", None),
             base_url=config.get("coinbase_api_url_base", None),
             data_client=self.data_client,
-            notifier=self.notifier
+            notifier=self.notifier,
+            rate_limiter=RateLimiter.from_config(config.get("coinbase_rate_limits", None))
         )
         self.extended_hours = False
 
         self.debug = config.get("debug", False)
+        # relay fills from other instances to /v1/order/stream through a mongo change stream
+        self.order_change_stream = config.get("order_change_stream", False)
+
+    def alpaca_client_factory(self, config: dict) -> AlpacaTradingClient:
+        return AlpacaTradingClient(
+            api_key=config.get("alpaca_api_key", None), 
+            api_secret_key=config.get("alpaca_api_secret_key", None), 
+            base_url=config.get("alpaca_api_url_base", None),
+            data_base_url=config.get("alpaca_data_api_url_base", None),
+            data_client=self.data_client,
+            notifier=self.notifier,
+            rate_limiter=RateLimiter.from_config(config.get("rate_limits", None)),
+            account=config.get("account", None),
+            risk=RiskEngine.from_config(config.get("risk", None))
+        )
 
-    def client_factory(self, asset_type: AssetType) -> TradingClient:
+    def client_factory(self, asset_type: AssetType, account: str = None) -> TradingClient:
         if asset_type == AssetType.STOCK.value:
-            return self.alpaca_trading_client
+            for client in self.alpaca_accounts:
+                if client.account == account:
+                    return client
+            self.data_client.log(message="Invalid account", log_level=LogLevel.ERROR, obj={"account": account})
+            raise Exception("Invalid account")
         if asset_type == AssetType.CRYPTO.value:
             return self.coinbase_trading_client
         else:
@@ -59,58 +113,244 @@ class Trader():
             raise Exception("Invalid asset type")
 
     def run(self) -> bool:
+        started = time.perf_counter()
         self.data_client.log(message="Start", log_level=LogLevel.INFO)
         if self.debug:
             self.data_client.log(message="Debug mode enabled", log_level=LogLevel.DEBUG)
+        if self.shadow:
+            self.data_client.log(message="Shadow mode enabled; orders are simulated", log_level=LogLevel.INFO)
 
-        active_watchlists = [Watchlist.from_mongo(doc) for doc in self.data_client.read("watchlist", {"is_active": True })]
+        active_watchlists = self.read_watchlists()
 
+        # group the watchlists by the client that trades them
+        groups = dict()
         for watchlist in active_watchlists:
-            client: TradingClient = self.client_factory(watchlist.type)
-            if not client.is_runnable():
+            try:
+                client = self.client_factory(watchlist.type, watchlist.account)
+            except Exception:
+                continue
+            groups.setdefault(client, list()).append(watchlist)
+
+        # risk reloads the portfolio on its next check; orders a previous process submitted but never recorded are settled before the lots are read
+        deferred = list()
+        for client in self.alpaca_accounts:
+            client.risk.reset()
+            try:
+                client.recover_intents()
+            except RateLimitExceeded as e:
+                # out of quota, the symbols with unresolved intents wait for the next tick
+                client.pending_intents = {intent["symbol"] for intent in client.journal.unresolved()}
+                deferred.extend(sorted(client.pending_intents))
                 client.data_client.log(
-                    message=f"{watchlist.symbol} is not runnable.", 
-                    log_level=LogLevel.INFO, 
-                    symbol=watchlist.symbol
+                    message="Rate limit reached; deferring order intent recovery.",
+                    log_level=LogLevel.WARNING,
+                    obj={"account": client.account, "symbols": sorted(client.pending_intents), "error": str(e)}
                 )
-                continue
 
-            # TODO: move thise to client obj
-            latest_bar = client.get_latest_bar(watchlist.symbol)
-            last_close = float(latest_bar[watchlist.symbol]['c'])
-            
-            # get those orders that have not been filled
-            filter = {"symbol": watchlist.symbol, "type": watchlist.type, "buy_status": "filled", "sell_status": None}
-            open_orders = [Order.from_mongo(doc) for doc in client.data_client.read("order", filter)]
+        # every unsold lot of the tick in one query, grouped per watchlist
+        orders = dict()
+        for doc in self.data_client.read(self.alpaca_trading_client.collection("order"), {"buy_status": "filled", "sell_status": {"$ne": "filled"}}):
+            order = Order.from_mongo(doc)
+            orders.setdefault((order.type, order.account, order.symbol), list()).append(order)
+        # the sells resting at the broker of each account are read with one listing instead of one request per order
+        for client in self.alpaca_accounts:
+            try:
+                client.prefetch_sells([o for lots in orders.values() for o in lots if o.account == client.account and o.sell_status is not None])
+            except RateLimitExceeded:
+                # reconcile_sells reads them one by one
+                client.sell_orders = dict()
+
+        stocks = [w for w in active_watchlists if w.type == AssetType.STOCK.value]
+        self.market_data.reset()
+        self.signals.reset()
+        self.scheduler.reset()
+        self.preload(sorted({w.symbol for w in stocks}))
+        self.market_data.register([w.symbol for w in stocks])
+        # intrabar highs are only needed where there is something to sell
+        checks = dict()
+        for w in stocks:
+            if (w.type, w.account, w.symbol) in orders:
+                checks.setdefault(w.symbol, list()).append(w.last_exit_check_at)
+        self.exit_evaluator.reset({symbol: None if None in values else min(values) for symbol, values in checks.items()})
+
+        # every account ticks concurrently, symbols within an account run in order
+        with ThreadPoolExecutor(max_workers=max(len(groups), 1)) as pool:
+            futures = [pool.submit(self.run_account, client, watchlists, orders, deferred) for client, watchlists in groups.items()]
+            for future in futures:
+                future.result()
+
+        self.data_client.log(
+            message="Rate limit utilization",
+            log_level=LogLevel.INFO,
+            obj={
+                "deferred": deferred,
+                "market_data": self.market_data.stats(),
+                "signals": self.signals.stats(),
+                "scheduler": self.scheduler.stats(),
+                "alpaca": {str(client.account): client.rate_limiter.utilization() for client in self.alpaca_accounts},
+                "coinbase": self.coinbase_trading_client.rate_limiter.utilization(),
+            }
+        )
+        self.data_client.log(
+            message="End", 
+            log_level=LogLevel.INFO
+        )
+        recording.tick(time.perf_counter() - started, {"watchlists": len(active_watchlists), "scheduler": self.scheduler.stats()})
+        return True
+
+    def read_watchlists(self) -> list[Watchlist]:
+        '''The active watchlists; in shadow mode with the state earlier shadow ticks wrote to shadow_watchlist.'''
+        docs = self.data_client.read("watchlist", {"is_active": True })
+        if self.shadow and docs:
+            # the real watchlists stay the source of what is traded and how, a watchlist without a shadow copy starts from the real state
+            shadow = {doc["_id"]: doc for doc in self.data_client.read(self.alpaca_trading_client.collection("watchlist"), {"_id": {"$in": [doc["_id"] for doc in docs]}})}
+            for doc in docs:
+                state = shadow.get(doc["_id"], dict())
+                doc.update({k: state[k] for k in Watchlist.STATE_FIELDS if k in state})
+        return [Watchlist.from_mongo(doc) for doc in docs]
+
+    def warm_up(self) -> dict:
+        '''Pre-market: opens the mongo and http connection pools and stores what the first tick would fetch.
+
+        The clock and the daily bars of the completed sessions are kept for the day, run() preloads them so
+        the open only asks for today's bars and the latest prices. Signals are not precomputed, they use
+        today's bar.
+        '''
+        started = datetime.now(UTC)
+        today = started.strftime("%Y-%m-%d")
+        watchlists = [Watchlist.from_mongo(doc) for doc in self.data_client.read("watchlist", {"is_active": True })]
+        lots = self.data_client.read(self.alpaca_trading_client.collection("order"), {"buy_status": "filled", "sell_status": {"$ne": "filled"}}, {"_id": 1})
 
-            # no open orders
-            if not open_orders:
+        clock = self.alpaca_trading_client.fetch_clock()
+        self.data_client.update("meta", {"_id": "clock"}, {"date": today, "clock": clock}, upsert=True)
+
+        stocks = [w for w in watchlists if w.type == AssetType.STOCK.value]
+        symbols = sorted({w.symbol for w in stocks})
+        start = (started - timedelta(days=max((SignalCache.window(w) for w in stocks), default=0))).strftime("%Y-%m-%d")
+        history = self.signals.fetch(symbols, start) if symbols else dict()
+        # a symbol without bars is not stored, the tick fetches it the usual way
+        completed = {symbol: [bar for bar in bars if bar["t"] < today] for symbol, bars in history.items()}
+        self.data_client.bulk_write(DAILY_BARS, [
+            self.data_client.update_op({"_id": symbol}, {"date": today, "start": start, "bars": bars}, upsert=True)
+            for symbol, bars in completed.items() if bars
+        ])
+
+        ret = {
+            "watchlists": len(watchlists),
+            "lots": len(lots),
+            "symbols": len(symbols),
+            "bars": sum(len(bars) for bars in completed.values()),
+            "clock": clock,
+            "seconds": round((datetime.now(UTC) - started).total_seconds(), 3),
+        }
+        self.data_client.log(message="Warm up", log_level=LogLevel.INFO, obj=ret)
+        return ret
+
+    def preload(self, symbols: list[str]):
+        '''The clock and daily bars today's warm_up stored; without them the tick fetches everything itself.'''
+        today = datetime.now(UTC).strftime("%Y-%m-%d")
+        clocks = self.data_client.read("meta", {"_id": "clock", "date": today}, limit=1)
+        if clocks:
+            self.market_data.preload_clock(clocks[0]["clock"])
+        docs = self.data_client.read(DAILY_BARS, {"_id": {"$in": symbols}, "date": today}) if symbols else list()
+        if docs:
+            self.signals.preload({doc["_id"]: doc["bars"] for doc in docs}, min(doc["start"] for doc in docs))
+
+    def run_account(self, client: TradingClient, watchlists: list[Watchlist], orders: dict, deferred: list):
+        # the clock only needs to be checked once per client per tick
+        try:
+            if not client.is_runnable():
                 client.data_client.log(
-                    message=f"No active orders {watchlist.symbol}; running entry.", 
+                    message=f"{len(watchlists)} symbols are not runnable.", 
                     log_level=LogLevel.INFO, 
-                    symbol=watchlist.symbol
-                )
-                if client.process_buy(watchlist):
-                    client.buy(watchlist)
-            else:
-                client.data_client.log(
-                    message=f"Active orders found {watchlist.symbol}; total orders {len(open_orders)}; running sell.", 
-                    symbol=watchlist.symbol, 
-                    log_level=LogLevel.INFO
+                    obj={"symbols": [w.symbol for w in watchlists]}
                 )
-                # process sell criteria and execute sell if met
-                client.process_sell(open_orders, watchlist, last_close, latest_bar) # TODO: remove last_close, latest_bar
-                client.process_rebuy(open_orders, watchlist, last_close) # TODO: remove last_close
+                return
+        except RateLimitExceeded as e:
+            [self.defer(client, w, e, deferred) for w in watchlists]
+            return
+
+        # nearest to a threshold first, the rest wait for a later tick
+        watchlists, over_budget = self.scheduler.select(client, watchlists, orders)
+        if over_budget:
+            client.data_client.log(
+                message=f"Evaluation budget reached; {len(over_budget)} symbols wait for the next tick.",
+                log_level=LogLevel.INFO,
+                obj={"symbols": [w.symbol for w in over_budget]}
+            )
+
+        # open lots of every watchlist, then one strategy evaluation per strategy for the whole account
+        groups, lots = dict(), dict()
+        for watchlist in watchlists:
+            try:
+                lots[watchlist.symbol] = self.open_lots(client, watchlist, orders.get((watchlist.type, watchlist.account, watchlist.symbol), list()))
+            except RateLimitExceeded as e:
+                self.defer(client, watchlist, e, deferred)
+                continue
+            if lots[watchlist.symbol] is not None:
+                groups.setdefault(watchlist.strategy, list()).append(watchlist)
+
+        for name, group in groups.items():
+            snapshot = client.snapshot(group, lots)
+            for watchlist, e in snapshot.skipped:
+                if isinstance(e, RateLimitExceeded):
+                    self.defer(client, watchlist, e, deferred)
+                else:
+                    client.data_client.log(
+                        message=f"Error evaluating {watchlist.symbol}", 
+                        symbol=watchlist.symbol, 
+                        log_level=LogLevel.ERROR, 
+                        obj={"error": str(e)}
+                    )
+            for decision in strategy_factory(name).evaluate(snapshot):
+                try:
+                    client.execute(decision)
+                except RateLimitExceeded as e:
+                    self.defer(client, decision.watchlist, e, deferred)
+            client.mark_exit_checked(snapshot)
+            self.scheduler.record(client, snapshot)
 
+    def defer(self, client: TradingClient, watchlist: Watchlist, e: Exception, deferred: list):
+        # out of quota, leave the symbol for the next tick instead of failing the whole run
+        deferred.append(watchlist.symbol)
         client.data_client.log(
-            message="End", 
-            log_level=LogLevel.INFO
+            message=f"Rate limit reached; deferring {watchlist.symbol}.",
+            log_level=LogLevel.WARNING,
+            symbol=watchlist.symbol,
+            obj={"error": str(e)}
         )
-        return True
+
+    def open_lots(self, client: TradingClient, watchlist: Watchlist, orders: list[Order]) -> list[Order] | None:
+        '''The unsold lots of a watchlist, sells placed on an earlier tick are checked for fills first; None skips the symbol.
+
+        Lots whose sell is still resting at the broker are returned too, the strategy counts them but does not sell them.
+        '''
+        if watchlist.symbol in client.pending_intents:
+            client.data_client.log(
+                message=f"Order intent pending {watchlist.symbol}; skipping.", 
+                log_level=LogLevel.WARNING, 
+                symbol=watchlist.symbol
+            )
+            return None
+        open_orders = [order for order in orders if order.sell_status is None]
+        pending = [order for order in orders if order.sell_status is not None]
+        if pending:
+            open_orders.extend(client.reconcile_sells(watchlist, pending))
+            open_orders.extend(o for o in pending if o.sell_order_id and o.sell_status != "filled")
+        return open_orders
+
+    def backfill(self, symbol: str = None, dry_run: bool = True) -> bool:
+        '''Reconciles alpaca orders with the order collection; returns True if anything was missing or stale.'''
+        reports = self.backfill_reports(symbol=symbol, dry_run=dry_run).values()
+        return any(report["operations"] > 0 or len(report["orphan_sell"]) > 0 for report in reports)
+
+    def backfill_reports(self, symbol: str = None, dry_run: bool = True) -> dict:
+        '''The backfill report of every account, keyed by account.'''
+        return {client.account: client.backfill(symbol=symbol, dry_run=dry_run) for client in self.alpaca_accounts}
 
     def get_open_orders(self, symbol: str, type = AssetType.STOCK) -> list[Order]:
         filter = {"symbol": symbol, "type": type, "buy_status": "filled", "sell_status": None}
-        return [Order.from_mongo(doc) for doc in self.data_client.read("order", filter)]
+        return [Order.from_mongo(doc) for doc in self.data_client.read(self.alpaca_trading_client.collection("order"), filter)]
 
 
 
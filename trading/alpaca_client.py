@@ -1,26 +1,61 @@
-import requests
+import time
+from dataclasses import replace
+from urllib.parse import urlencode
+
+from bson import ObjectId
 from datetime import datetime, timedelta, UTC
 
 from models.base import AssetType
 from models.order import Order
-from models.watchlist import Watchlist
+from models.watchlist import Watchlist, ExitMode
 from data.data_client import DataClient, LogLevel
 from trading.trading_client import TradingClient
-from common.helper import Helper, Notifier
+from trading.rate_limiter import RateLimiter, RateLimitExceeded, EndpointClass, Priority
+from trading.signals import SignalCache, Signals
+from trading.order_journal import OrderJournal, IntentStatus
+from trading.risk import RiskEngine
+from trading.timeline import Timeline
+from strategy.base import Snapshot, Decision, Action
+from common.helper import Notifier, NullNotifier, aware
+from common.events import EventBus, bus, buy_event, sell_event
+from common import fixed_point
+
+# broker statuses of an order that will not fill any further
+TERMINAL = ("canceled", "expired", "rejected")
+
+
+def fill_status(order: dict) -> str | None:
+    '''The order's status, "filled" for a terminal order that filled part of its quantity; that part is a lot.'''
+    status = order.get("status", None)
+    if status in TERMINAL and float(order.get("filled_qty", None) or 0):
+        return "filled"
+    return status
 
 
 class AlpacaTradingClient(TradingClient):
-    def __init__(self, api_key: str, api_secret_key: str, base_url: str, data_base_url: str, data_client: DataClient, notifier: Notifier = None):
+    def __init__(self, api_key: str, api_secret_key: str, base_url: str, data_base_url: str, data_client: DataClient, notifier: Notifier = None, rate_limiter: RateLimiter = None, account: str = None, risk: RiskEngine = None):
         self.headers = {
             "accept": "application/json",
             "APCA-API-KEY-ID": api_key,
             "APCA-API-SECRET-KEY": api_secret_key
         }
-        super().__init__(self.headers, data_client, notifier)
+        super().__init__(self.headers, data_client, notifier, rate_limiter)
         
         self.base_url = base_url
         self.data_base_url = data_base_url
         self.strict_pdt = False
+        # name of the broker account, orders and watchlists are tagged with it
+        self.account = account
+        # per-tick MarketDataCache, ExitEvaluator and SignalCache shared between accounts, set by Trader
+        self.market_data = None
+        self.exit_evaluator = None
+        self.signals = None
+        self.journal = OrderJournal(data_client, account)
+        self.risk = risk if risk else RiskEngine()
+        # a SimulatedVenue in shadow mode, orders never reach alpaca
+        self.venue = None
+        # buys and fills are pushed to /v1/order/stream
+        self.events = bus
 
 
     def is_runnable(self) -> bool:
@@ -38,118 +73,69 @@ class AlpacaTradingClient(TradingClient):
         else:
             return True
 
-    def process_sell(self, o: list[Order], w: Watchlist, lc: float, lb: dict) -> None:
-        # IMPORTANT! we should sell stock before we buy
-        if self.strict_pdt:
-            # we need to skip the sell if we purchased the stock today
-            pdt = [order for order in o if order.buy_at_utc.date() == datetime.now(UTC).date()]
-            if len(pdt) > 0:
-                self.data_client.log(
-                    message=f"Stock {w.symbol} was purchased today {datetime.now(UTC).date()}", 
-                    symbol=w.symbol, 
-                    log_level=LogLevel.INFO
-                )
-                return False
-
-        end_date = datetime.now(UTC) # we want today minus thirty days for the calculation
-        start_date = end_date - timedelta(days=45)
-        # gets the historical bars for calculating the average daily swing
-        bars = self.get_historical_bars(w.symbol, "1D", 1000, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
-        avg_daily_swing_25 = Helper.process_bar(bars, 30)["avg_daily_swing_25"]
+    def snapshot(self, watchlists: list[Watchlist], lots: dict) -> Snapshot:
+        '''Market state and open lots of `watchlists` for a strategy; `lots` maps each symbol to its open lots.
+
+        Latest bars come from one batched request and daily bars from the tick's SignalCache.
+        '''
+        snapshot = Snapshot()
+        for w in watchlists:
+            try:
+                latest = float(self.get_latest_bar(w.symbol)[w.symbol]["c"])
+                signals = self.get_signals(w)
+                open_lots = lots.get(w.symbol, list())
+                # the highest price since the last check (or since the lot was bought), not only the latest close
+                highs = [self.exit_evaluator.high_since(w.symbol, lot.buy_at_utc, w.last_exit_check_at) if self.exit_evaluator else None for lot in open_lots]
+                snapshot.add(w, latest, signals, open_lots, highs, strict_pdt=self.strict_pdt)
+            except Exception as e:
+                snapshot.skipped.append((w, e))
+        return snapshot
+
+    def execute(self, decision: Decision) -> bool:
+        w = decision.watchlist
         self.data_client.log(
-            message=f"Stock {w.symbol} 25% average daily swing {avg_daily_swing_25}.",
-            symbol=w.symbol,
-            log_level=LogLevel.INFO
+            message=f"{decision.action} {w.symbol}; {decision.reason}", 
+            symbol=w.symbol, 
+            log_level=LogLevel.INFO,
+            obj={"lots": len(decision.lots), "limit_price": decision.limit_price}
         )
-
-        for order in o:
-            # sell if the stock has increased by 25% of the average daily swing for previous 30 days
-            target_price = round((order.buy_price + avg_daily_swing_25), 2)
-            latest_price = float(lb[w.symbol]['c'])
-            self.data_client.log(
-                message=f"Target price: {target_price}; Latest bar: {latest_price}",
-                symbol=w.symbol,
-                log_level=LogLevel.INFO
-            )
-            if target_price <= latest_price:
-                self.sell(w, order)
-
-    def process_rebuy(self, order_batch: list[Order], a: Watchlist, lc: float) -> bool:
-        '''This is the logic for determining if we should rebuy a stock'''
-        if len(order_batch) < a.total_allowed_batches:
-            #   1. the previous buy has dropped by 2.5%
-            last_order = max(order_batch, key=lambda obj: obj.created_at)
-            rebuy_price = last_order.buy_price - (last_order.buy_price * .025)
-            self.data_client.log(
-                message=f"Rebuy price {rebuy_price}; Last close price {lc}", 
-                symbol=a.symbol
-            )
-
-            if lc <= rebuy_price:
-                self.data_client.log(
-                    message=f"Rebuying stock {a.symbol}; last order {last_order.buy_price}; last close {lc}", 
-                    symbol=a.symbol
-                )
-                # rebuy the stock
-                if self.process_buy(a):
-                    self.buy(a)
-                    return True
-                else:
-                    self.data_client.log(
-                        message=f"Last close greater than rebuy, no rebuy {a.symbol}", 
-                        symbol=a.symbol
-                    )
-                    return False
-            else:
-                self.data_client.log(
-                    message=f"Last close greater than rebuy, no rebuy {a.symbol}", 
-                    symbol=a.symbol
-                )
-                return False
-            
-    def process_buy(self, watchlist: Watchlist) -> bool:
-        ret = True
+        timeline = Timeline(side=decision.action, decision_price=decision.price, decided_ns=decision.decided_ns)
+        if decision.action == Action.BUY:
+            return self.buy(w, timeline)
+        if decision.action == Action.SELL:
+            return self.sell(w, decision.lots, limit_price=decision.limit_price, timeline=timeline, wait=not decision.resting)
+        raise Exception(f"Invalid action {decision.action}")
+
+    def mark_exit_checked(self, snapshot: Snapshot):
+        '''Moves last_exit_check_at of every watchlist with open lots to the newest minute bar evaluated.'''
+        if not self.exit_evaluator:
+            return
+        operations = list()
+        for w, count in zip(snapshot.watchlists, snapshot.lot_count()):
+            if count:
+                w.last_exit_check_at = self.exit_evaluator.last_timestamp(w.symbol) or w.last_exit_check_at
+                operations.append(self.data_client.update_op({"_id": w._id}, {"last_exit_check_at": w.last_exit_check_at}, upsert=self.shadow))
+        self.data_client.bulk_write(self.collection("watchlist"), operations)
+
+    def get_signals(self, w: Watchlist) -> Signals:
+        '''The tick's signals for `w`; outside of a Trader tick they are computed on every call.'''
+        return (self.signals or SignalCache(self)).get(w)
+
+    def buy(self, w: Watchlist, timeline: Timeline = None) -> bool:
+        status: bool = False
+        timeline = timeline or Timeline(side="buy", decided_ns=time.time_ns())
+        reserved = False
         try:
-            if watchlist.is_suspend:
+            # pre-trade limits, the notional stays reserved until the next tick reloads the portfolio
+            reason = self.risk.check(w.symbol, w.batch_size, self)
+            if reason:
                 self.data_client.log(
-                    message=f"Stock {watchlist.symbol} has is_suspend flag set.", 
-                    symbol=watchlist.symbol, 
-                    log_level=LogLevel.WARNING, 
-                    obj=hist
-                )
-                return False
-            
-            end_date = datetime.now(UTC)
-            start_date = end_date - timedelta(days=30)
-            # gets the historical bars for calculating the average daily swing
-            bars = self.get_historical_bars(watchlist.symbol, "1D", 7, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
-            hist = Helper.process_bar(bars, 7)
-            latest = self.get_latest_bar(watchlist.symbol)
-            # the current price must be 25% less than the average daily swing
-            has_25_percent_swing = (hist["day_high"] - latest[watchlist.symbol]["c"]) > hist["avg_daily_swing_25"]
-            # has_50_percent_swing = (hist["day_high"] - latest[symbol]["c"]) > hist["avg_daily_swing_50"]
-            # has_75_percent_swing = (hist["day_high"] - latest[symbol]["c"]) > hist["avg_daily_swing_75"]
-            if not has_25_percent_swing:
-                ret = False
-                self.data_client.log(
-                    message=f"Stock {watchlist.symbol} does not have 25% daily swing in price.", 
-                    symbol=watchlist.symbol, 
-                    log_level=LogLevel.WARNING, 
-                    obj=hist
+                    message=f"Risk check failed {w.symbol}; {reason}.", 
+                    symbol=w.symbol, 
+                    log_level=LogLevel.WARNING
                 )
-            return ret
-        except Exception as e:
-            self.data_client.log(
-                message=f"Error processing buy {watchlist.symbol}", 
-                symbol=watchlist.symbol, 
-                log_level=LogLevel.ERROR, 
-                obj={"error": str(e)}
-            )
-            return False
-
-    def buy(self, w: Watchlist) -> bool:
-        status: bool = False
-        try:
+                return status
+            reserved = True
             # notional/batch_size is a dollar amount
             payload = {
                 "side": "buy",
@@ -166,7 +152,13 @@ class AlpacaTradingClient(TradingClient):
                 obj=payload
             )
 
+            # the intent is on disk before the broker sees the order, recover_intents finds it if we die polling
+            client_order_id = self.journal.open(w.symbol, "buy", payload)
+            timeline.submit(payload)
             order = self.create_order(payload)
+            timeline.ack()
+            reserved = False
+            self.journal.submitted(client_order_id, order.get("id"))
             retry = 0
             while True:
                 # sometimes the order doesn't process immediately
@@ -188,12 +180,26 @@ class AlpacaTradingClient(TradingClient):
             if order:
                 # creates a new order object
                 new_order: Order = self.create_order_obj(order)
-                self.data_client.write("order", new_order.to_mongo())
+                timeline.fill(order)
+                new_order.buy_timeline = timeline.to_mongo()
+                doc = new_order.to_mongo()
+                # the id is known up front so the lot can be sold right away
+                doc["_id"] = new_order._id = ObjectId()
+                self.data_client.write(self.collection("order"), doc)
+                # a buy still working stays submitted, recover_intents records its fill
+                if fill_status(order) == "filled" or order.get("status", None) in TERMINAL:
+                    self.journal.resolve(client_order_id)
+                if new_order.buy_status == "filled":
+                    self.events.publish(buy_event(new_order))
 
                 w.update_buy(self.data_client.session_id)
-                self.data_client.update("watchlist", {"symbol": w.symbol}, w.to_mongo(), upsert=False)
+                self.data_client.update(self.collection("watchlist"), {"_id": w._id}, w.to_mongo(), upsert=self.shadow)
                 self.notifier.alert(log_message)
 
+                # a lot bought today may not be sold today under strict pdt, the strategy arms it tomorrow
+                if w.exit_mode == ExitMode.BROKER and new_order.buy_status == "filled" and not self.strict_pdt:
+                    self.arm_exit(w, new_order)
+
                 status = True
             else:
                 self.data_client.log(
@@ -203,33 +209,60 @@ class AlpacaTradingClient(TradingClient):
                     obj={"error": "order not found in API with ID created"}
                 )
 
+        except RateLimitExceeded:
+            # Trader.run_account defers the symbol, an order already submitted is settled by recover_intents
+            if reserved:
+                self.risk.release(w.symbol, w.batch_size)
+            raise
         except Exception as e:
+            if reserved:
+                self.risk.release(w.symbol, w.batch_size)
             self.data_client.log(
                 message=f"Error buying stock {w.symbol}", 
                 symbol=w.symbol, 
                 log_level=LogLevel.ERROR, 
                 obj={"error": str(e)}
             )
-        finally:
-            return status
+        return status
+
+    def arm_exit(self, w: Watchlist, lot: Order):
+        '''Places the take-profit limit of a lot at its target.
+
+        Fractional orders are day orders only and alpaca has no bracket or OCO for them, so the limit
+        expires at the close; reconcile_sells reopens the lot and the strategy arms it again.
+        '''
+        self.sell(w, [lot], limit_price=self.get_signals(w).target_price(lot.buy_price), wait=False)
+
+    def sell(self, w: Watchlist, orders: list[Order], limit_price: float = None, timeline: Timeline = None, wait: bool = True):
+        '''Sells every lot in `orders` with a single broker order and allocates the fill back to each lot.
 
-    def sell(self, w: Watchlist, o: Order):
+        Without `wait` the order is left resting, reconcile_sells picks up its fill on a later tick.
+        '''
+        timeline = timeline or Timeline(side="sell", decided_ns=time.time_ns())
         try:
             payload = {
                 "side": "sell",
                 "type": "market",
                 "time_in_force": "day",
-                "qty": o.quantity,
+                # alpaca takes up to 9 decimals, rounding also drops the float noise of the sum
+                "qty": round(sum(o.quantity for o in orders), 9),
                 "symbol": w.symbol
             }
+            if limit_price:
+                payload["type"] = "limit"
+                payload["limit_price"] = limit_price
             self.data_client.log(
-                message=f"selling stock {w.symbol}", 
+                message=f"selling stock {w.symbol}; {len(orders)} lots", 
                 symbol=w.symbol, 
                 log_level=LogLevel.INFO, 
                 obj=payload
             )
             # create sell order on alpaca
+            client_order_id = self.journal.open(w.symbol, "sell", payload, lots=[o._id for o in orders])
+            timeline.submit(payload)
             order = self.create_order(payload)
+            timeline.ack()
+            self.journal.submitted(client_order_id, order.get("id"))
             self.data_client.log(
                 message=f"Success selling stock {w.symbol}", 
                 symbol=w.symbol, 
@@ -238,7 +271,7 @@ class AlpacaTradingClient(TradingClient):
             )
 
             retry = 0
-            while True:
+            while wait:
                 # sometimes the order doesn't process immediately
                 order = self.get_order(order_id=order.get("id"))
                 if order.get("status", None) == "filled":
@@ -253,20 +286,36 @@ class AlpacaTradingClient(TradingClient):
                     break
                 retry += 1
 
-            o.sell_order_id = order.get("id", None)
-            o.sell_status = order.get("status", None)
+            status = order.get("status", None)
             filled_avg_price = order.get("filled_avg_price", 0)
-            if filled_avg_price:
-                o.sell_price = float(filled_avg_price)
-            o.sell_at_utc = datetime.now(UTC)
-            o.sell_session = self.data_client.session_id
-
-            o.calculate_profit()
-            
-            self.data_client.update("order", {"_id": o._id}, o.to_mongo(), upsert=False)
-
-            w.update_sell(self.data_client.session_id, o.profit)
-            self.notifier.alert(f"selling stock {w.symbol}; Profit {o.profit}")
+            filled_at = order.get("filled_at", None)
+            timeline.fill(order)
+            for o in orders:
+                o.sell_order_id = order.get("id", None)
+                o.sell_status = status
+                if filled_avg_price:
+                    o.sell_price = float(filled_avg_price)
+                o.sell_at_utc = datetime.fromisoformat(filled_at) if filled_at else datetime.now(UTC)
+                o.sell_session = self.data_client.session_id
+                o.sell_timeline = timeline.to_mongo()
+                if status == "filled":
+                    o.calculate_profit()
+                    w.update_sell(self.data_client.session_id, o.profit)
+
+            self.data_client.bulk_write(self.collection("order"), [self.data_client.update_op({"_id": o._id}, o.to_mongo()) for o in orders])
+            self.journal.resolve(client_order_id)
+
+            if status == "filled":
+                self.risk.on_sell(w.symbol, payload["qty"] * float(filled_avg_price))
+                [self.events.publish(sell_event(o)) for o in orders]
+                self.notifier.alert(f"selling stock {w.symbol}; {len(orders)} lots; Profit {round(sum(o.profit for o in orders), 2)}")
+            elif wait and limit_price:
+                # an intrabar limit still open after polling, reconcile_sells picks up the fill on a later tick;
+                # take-profits placed with wait=False are re-armed every day and not alerted
+                self.notifier.alert(f"sell order placed {w.symbol}@{limit_price}; {len(orders)} lots; status {status}")
+        except RateLimitExceeded:
+            # as in buy, the journal's intent records the lots of an order already submitted
+            raise
         except Exception as e:
             self.data_client.log(
                 message=f"Error selling stock {w.symbol}", 
@@ -277,25 +326,174 @@ class AlpacaTradingClient(TradingClient):
 
     def update_sell(self, w: Watchlist) -> bool:
         try:
-            orders: list[Order] = self.data_client.read("order", {"symbol": w.symbol, "sell_order_id": { "$ne": None }, "sell_status": { "$ne": "filled"}})
-            for order in orders:
-                o = Order.from_mongo(order)
-                sell = self.get_order(order_id=order.get("sell_order_id"))
-                # update status
-                o.sell_status = sell.get("status", None)
-                # update fill price
-                filled_avg_price = sell.get("filled_avg_price", None)
-                filled_avg_price = float(filled_avg_price) if filled_avg_price else None
-                o.sell_price = filled_avg_price
-                # update profit
-                o.calculate_profit()
-
-                self.data_client.update("order", {"_id": o._id}, o.to_mongo(), upsert=False)
+            orders = [Order.from_mongo(doc) for doc in self.data_client.read(self.collection("order"), {"symbol": w.symbol, "account": self.account, "sell_order_id": { "$ne": None }, "sell_status": { "$ne": "filled"}})]
+            self.reconcile_sells(w, orders)
             return True
         except Exception as e:
             self.data_client.log(f"Error updating sell", LogLevel.ERROR, symbol=w.symbol, obj={"Error": str(e)})
             return False
 
+    def reconcile_sells(self, w: Watchlist, orders: list[Order]) -> list[Order]:
+        '''Refreshes sells that were not filled when placed; returns the lots whose sell died and are open again.
+
+        A sell that ended after a partial fill (a broker exit limit expiring at the close) closes its lots in
+        turn up to the filled quantity. The lot the fill runs out in is split: its filled part is closed and
+        the rest is reopened as a new lot.
+        '''
+        reopened = list()
+        filled = list()
+        changed = list()
+        split = list()
+        # lots sold together share one broker order, prefetch_sells usually has it already
+        sells = dict()
+        # filled quantity of each sell not yet allocated to its lots
+        unallocated = dict()
+        for o in orders:
+            if o.sell_order_id not in sells:
+                sells[o.sell_order_id] = self.sell_orders.get(o.sell_order_id, None) or self.get_order(order_id=o.sell_order_id)
+                unallocated[o.sell_order_id] = fixed_point.to_fixed(float(sells[o.sell_order_id].get("filled_qty", None) or 0), fixed_point.QUANTITY_SCALE)
+            sell = sells[o.sell_order_id]
+            status = sell.get("status", None)
+            # sell() records the status of a sell that ended while it waited, such a lot is settled here
+            if status != o.sell_status or status in TERMINAL:
+                changed.append(o)
+            if status == "filled":
+                self.close_lot(w, o, sell)
+                filled.append(o)
+            elif status in TERMINAL:
+                quantity = fixed_point.to_fixed(o.quantity, fixed_point.QUANTITY_SCALE)
+                allocated = min(quantity, unallocated[o.sell_order_id])
+                unallocated[o.sell_order_id] -= allocated
+                if allocated < quantity:
+                    rest = self.reopen_lot(o) if not allocated else self.split_lot(o, allocated)
+                    reopened.append(rest)
+                    if allocated:
+                        split.append(rest)
+                if allocated:
+                    self.close_lot(w, o, sell)
+                    filled.append(o)
+            else:
+                o.sell_status = status
+        if split:
+            self.data_client.log(
+                message=f"Sell partially filled {w.symbol}; {len(split)} lots split.",
+                symbol=w.symbol,
+                log_level=LogLevel.WARNING,
+                obj={"lots": [str(o._id) for o in split]}
+            )
+        # a limit still resting is not rewritten every tick
+        operations = [self.data_client.update_op({"_id": o._id}, o.to_mongo()) for o in changed]
+        operations += [self.data_client.update_op({"_id": o._id}, None, upsert=True, on_insert=o.to_mongo()) for o in split]
+        self.data_client.bulk_write(self.collection("order"), operations)
+        if filled:
+            self.risk.on_sell(w.symbol, sum(o.quantity * o.sell_price for o in filled))
+            [self.events.publish(sell_event(o)) for o in filled]
+            self.notifier.alert(f"sold stock {w.symbol}; {len(filled)} lots; Profit {round(sum(o.profit for o in filled), 2)}")
+        return reopened
+
+    def close_lot(self, w: Watchlist, o: Order, sell: dict):
+        '''Settles the lot `o` (or the part of it that was sold) at the fill of the broker order `sell`.'''
+        o.sell_status = "filled"
+        o.sell_price = float(sell.get("filled_avg_price"))
+        filled_at = sell.get("filled_at", None) or sell.get("updated_at", None)
+        o.sell_at_utc = datetime.fromisoformat(filled_at) if filled_at else datetime.now(UTC)
+        if o.sell_timeline:
+            # a resting limit, its timeline ends at the broker's fill
+            timeline = Timeline.from_mongo(o.sell_timeline)
+            timeline.fill(sell)
+            o.sell_timeline = timeline.to_mongo()
+        o.calculate_profit()
+        w.update_sell(self.data_client.session_id, o.profit)
+
+    @staticmethod
+    def reopen_lot(o: Order) -> Order:
+        '''Clears the dead sell of `o`, the lot goes back to being evaluated every tick.'''
+        o.sell_order_id = None
+        o.sell_status = None
+        o.sell_price = 0
+        o.sell_at_utc = None
+        o.sell_session = None
+        o.sell_timeline = None
+        return o
+
+    @staticmethod
+    def split_lot(o: Order, sold: int) -> Order:
+        '''Cuts `o` down to the `sold` quantity (QUANTITY_SCALE units); returns the rest as a new open lot.'''
+        quantity = fixed_point.to_fixed(o.quantity, fixed_point.QUANTITY_SCALE)
+        rest = AlpacaTradingClient.reopen_lot(replace(o, _id=ObjectId(), quantity=fixed_point.from_fixed(quantity - sold, fixed_point.QUANTITY_SCALE)))
+        o.quantity = fixed_point.from_fixed(sold, fixed_point.QUANTITY_SCALE)
+        if o.notional:
+            # the buy's dollar amount follows the quantity
+            rest.notional = round(o.notional * (quantity - sold) / quantity, 2)
+            o.notional = round(o.notional - rest.notional, 2)
+        return rest
+
+    def prefetch_sells(self, lots: list[Order]):
+        '''Reads every order behind the pending sells of `lots` with one listing, reconcile_sells looks them up.'''
+        self.sell_orders = dict()
+        pending = [aware(o.sell_at_utc) for o in lots if o.sell_order_id and o.sell_at_utc]
+        if not pending:
+            return
+        after = (min(pending) - timedelta(minutes=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        ids = {o.sell_order_id for o in lots}
+        self.sell_orders = {order["id"]: order for order in self.list_orders(after=after) if order.get("id") in ids}
+
+    def recover_intents(self) -> set[str]:
+        '''Resolves the order intents left behind by a previous process against one listing of broker orders.
+
+        Returns the symbols whose intents are still in flight, they are not traded this tick.
+        '''
+        intents = self.journal.unresolved()
+        self.pending_intents = set()
+        if not intents:
+            return self.pending_intents
+
+        after = (aware(intents[0]["created_at"]) - timedelta(minutes=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        broker = {order.get("client_order_id"): order for order in self.list_orders(after=after)}
+        order_ids = [broker[i["_id"]]["id"] for i in intents if i["_id"] in broker]
+        recorded = {doc["buy_order_id"]: doc.get("buy_status", None) for doc in self.data_client.read(self.collection("order"), {"buy_order_id": {"$in": order_ids}}, {"buy_order_id": 1, "buy_status": 1})}
+
+        operations = list()
+        for intent in intents:
+            order = broker.get(intent["_id"], None)
+            if order is None:
+                if self.journal.is_stale(intent):
+                    self.journal.fail(intent["_id"], "order not found at broker")
+                else:
+                    self.pending_intents.add(intent["symbol"])
+                continue
+
+            status = order.get("status", None)
+            if status in TERMINAL and not float(order.get("filled_qty", None) or 0):
+                if intent["side"] == "buy" and order["id"] in recorded:
+                    operations.append(self.data_client.update_op({"buy_order_id": order["id"]}, {"buy_status": status}))
+                self.journal.fail(intent["_id"], f"order {status}")
+                continue
+
+            if intent["side"] == "buy":
+                # a buy canceled or expired after a partial fill is settled like a fill of that quantity
+                if fill_status(order) != "filled":
+                    self.pending_intents.add(intent["symbol"])
+                    continue
+                doc = self.create_order_obj(order).to_mongo()
+                if order["id"] not in recorded:
+                    operations.append(self.data_client.update_op({"buy_order_id": order["id"]}, None, upsert=True, on_insert=doc))
+                elif recorded[order["id"]] != "filled":
+                    # buy() recorded it before the fill when polling gave up
+                    operations.append(self.data_client.update_op({"buy_order_id": order["id"]}, {f: doc[f] for f in ("buy_status", "quantity", "buy_price", "buy_at_utc")}))
+            else:
+                # reconcile_sells settles the lots from the broker order on this tick
+                for lot in intent["lots"]:
+                    operations.append(self.data_client.update_op({"_id": lot, "sell_order_id": None}, {"sell_order_id": order["id"], "sell_status": IntentStatus.SUBMITTED, "sell_at_utc": datetime.now(UTC), "sell_session": self.data_client.session_id}))
+            self.journal.resolve(intent["_id"])
+
+        self.data_client.bulk_write(self.collection("order"), operations)
+        self.data_client.log(
+            message=f"Recovered order intents; {len(intents)} unresolved; {len(self.pending_intents)} symbols pending.",
+            log_level=LogLevel.WARNING,
+            obj={"pending": sorted(self.pending_intents), "recovered": len(operations)}
+        )
+        return self.pending_intents
 
     def create_order_obj(self, order) -> Order:
         filled_avg_price = order.get("filled_avg_price", None)
@@ -303,7 +501,7 @@ class AlpacaTradingClient(TradingClient):
         filled_qty = order.get("filled_qty", None)
         filled_qty = float(filled_qty) if filled_qty else None
         notional = order.get("notional", None)
-        notional = float(order.get("notional", None)) if filled_qty else None
+        notional = float(notional) if notional else None
         
         if order.get("filled_at", None):
             filled_at = datetime.fromisoformat(order.get("filled_at", None))
@@ -324,9 +522,10 @@ class AlpacaTradingClient(TradingClient):
             order = Order(
                 symbol = order.get("symbol", None),
                 type = AssetType.STOCK.value,
+                account = self.account,
                 quantity = filled_qty,
                 notional = notional,
-                buy_status = order.get("status", None),
+                buy_status = fill_status(order),
                 buy_order_id = order.get("id", None),
                 buy_price = filled_avg_price,
                 buy_at_utc = filled_at,
@@ -346,14 +545,34 @@ class AlpacaTradingClient(TradingClient):
         
         return order
 
+    def enable_shadow(self, venue):
+        '''Routes orders to `venue` and keeps their records in shadow_ collections.'''
+        self.venue = venue
+        self.collection_prefix = "shadow_"
+        self.journal.collection = self.collection(OrderJournal.COLLECTION)
+        # simulated fills stay off the dashboard stream and the telegram channel
+        self.events = EventBus()
+        self.notifier = NullNotifier()
+
+    @property
+    def shadow(self) -> bool:
+        return self.venue is not None
+
     # api methods
     def get_account(self):
-        return requests.get(f"{self.base_url}/v2/account", headers=self.headers)
+        if self.venue:
+            return self.venue.get_account()
+        return self.get(f"{self.base_url}/v2/account")
 
     def get_asset(self, asset: str):
         return self.get(f"{self.base_url}/v2/assets/{asset}")
 
+    def get_assets(self, status: str = "active", asset_class: str = "us_equity") -> list:
+        return self.get(f"{self.base_url}/v2/assets?status={status}&asset_class={asset_class}")
+
     def get_order(self, symbol: str = None, order_id: str = None, status: str = 'all') -> list:
+        if self.venue:
+            return self.venue.get_order(order_id) if order_id else self.venue.list_orders(symbol)
         if order_id:
             return self.get(f"{self.base_url}/v2/orders/{order_id}")
         else:
@@ -367,60 +586,163 @@ class AlpacaTradingClient(TradingClient):
         return self.get(f"{self.base_url}/v2/watchlists")
         
     def get_clock(self):
+        if self.market_data:
+            return self.market_data.clock()
+        return self.fetch_clock()
+
+    def fetch_clock(self):
         return self.get(f"{self.base_url}/v2/clock")
     
     def get_positions(self):
+        if self.venue:
+            return self.venue.get_positions()
         return self.get(f"{self.base_url}/v2/positions")
 
     def create_order(self, payload: str):
+        if self.venue:
+            return self.venue.create_order(payload)
         return self.post(f"{self.base_url}/v2/orders", payload)
     
     def create_watchlist(self, name: str, symbols: list[str]):
         return self.post(f"{self.base_url}/v2/watchlist", {"name": name, "symbols": symbols})
 
     # data
+    def get_data(self, url: str):
+        return self.get(url, endpoint=EndpointClass.MARKET_DATA, priority=Priority.DATA)
+
     def get_latest_bar(self, symbol: str, feed: str = "iex"):
-        return self.get(f"{self.data_base_url}/v2/stocks/bars/latest?symbols={symbol}&feed={feed}")['bars']
+        if self.market_data:
+            return self.market_data.latest_bar(symbol)
+        return self.fetch_latest_bars([symbol], feed)
+
+    def fetch_latest_bars(self, symbols: list[str], feed: str = "iex") -> dict:
+        return self.get_data(f"{self.data_base_url}/v2/stocks/bars/latest?symbols={','.join(symbols)}&feed={feed}")['bars']
 
     def get_latest_quote(self, symbol: str, feed: str = "iex"):
-        return self.get(f"{self.data_base_url}/v2/stocks/quotes/latest?symbols={symbol}&feed={feed}")
+        return self.get_data(f"{self.data_base_url}/v2/stocks/quotes/latest?symbols={symbol}&feed={feed}")
 
     def get_snapshot(self, asset: str, feed: str = "iex"):
         url = f"{self.data_base_url}/v2/stocks/{asset}/snapshot?feed={feed}"
-        return self.get(url)
+        return self.get_data(url)
     
-    def get_historical_bars(self, asset: str, timeframe: str, limit: int, start: str, end: str):
+    def get_historical_bars(self, asset: str, timeframe: str, limit: int, start: str, end: str, page_token: str = None):
         '''Gets the historical bars for a given asset, within the specified timeframe for regular trading days.'''
+        if self.market_data:
+            return self.market_data.historical_bars(asset, timeframe, limit, start, end, page_token)
+        return self.fetch_historical_bars(asset, timeframe, limit, start, end, page_token)
+
+    def fetch_bars(self, symbols: list[str], timeframe: str, start: str, end: str = None, limit: int = 10000, page_token: str = None) -> dict:
+        '''Multi-symbol bars, oldest first; returns {"bars": {symbol: [...]}, "next_page_token": ...}.'''
+        params = {"symbols": ",".join(symbols), "timeframe": timeframe, "start": start, "limit": limit, "adjustment": "raw", "feed": "iex", "sort": "asc"}
+        if end:
+            params["end"] = end
+        if page_token:
+            params["page_token"] = page_token
+        return self.get_data(f"{self.data_base_url}/v2/stocks/bars?{urlencode(params)}")
+
+    def fetch_historical_bars(self, asset: str, timeframe: str, limit: int, start: str, end: str, page_token: str = None):
         url = f"{self.data_base_url}/v2/stocks/{asset}/bars?timeframe={timeframe}&start={start}&end={end}&limit={limit}&adjustment=raw&feed=iex&sort=desc"
-        r = self.get(url)
+        if page_token:
+            url += f"&page_token={page_token}"
+        r = self.get_data(url)
         return r
 
-    def backfill(self, symbol: str = None, dry_run: bool = True) -> bool:
-
-        # this logic was originally in the run method, but was moved here not sure if its needed of if this is duplicated here :/
-        # # get all order from alpaca and all order the the database
-        # alpaca_orders = self.trading_client.get_order(a.symbol)
-        # all_orders = [Order.from_mongo(doc) for doc in self.mongo_client.read("order", {"symbol": a.symbol})]
-        # missing_orders = [order for order in alpaca_orders if order.get("id") not in [o.buy_order_id for o in all_orders]]
-        # if missing_orders:
-        #     self.log(f"Missing orders found {a.symbol}; total orders {len(missing_orders)}", LogLevel.WARNING)
-        #     [self.mongo_client.write("order", order.to_mongo()) for order in missing_orders]
-
-        ret = False
-        # if symbol:
-        #     orders = self.alpaca_trading_client.get_order(symbol=symbol)
-        # else:
-        #     orders = self.alpaca_trading_client.get_order()
-        # for order in orders:
-        #     side = order.get("side")
-        #     if side == "buy":
-        #         matching_order = self.mongo_client.read("order", {"buy_order_id": order.get("id")})
-        #         if not matching_order:
-        #             ret = True
-        #             print(f"buy: {order.get("id")} {order.get("symbol")} created at {order.get("created_at")}")
-        #     if side == "sell":
-        #         matching_order = self.mongo_client.read("order", {"sell_order_id": order.get("id")})
-        #         if not matching_order:
-        #             ret = True
-        #             print(f"sell: {order.get("id")} {order.get("symbol")} created at {order.get("created_at")}")
+    def list_orders(self, symbol: str = None, status: str = "all", after: str = None, until: str = None, limit: int = 500) -> list:
+        '''Pages through /v2/orders oldest first, using the submitted_at of the last order as the next cursor.'''
+        if self.venue:
+            return self.venue.list_orders(symbol)
+        ret = list()
+        seen = set()
+        while True:
+            params = {"status": status, "limit": limit, "direction": "asc"}
+            if symbol:
+                params["symbols"] = symbol
+            if after:
+                params["after"] = after
+            if until:
+                params["until"] = until
+            page = self.get(f"{self.base_url}/v2/orders?{urlencode(params)}")
+            new = [order for order in page if order.get("id") not in seen]
+            ret.extend(new)
+            seen.update(order.get("id") for order in new)
+            # a full page of orders we already have would return the same page forever
+            if len(page) < limit or not new:
+                break
+            # after is exclusive and orders can share a submitted_at, so the next page starts a microsecond
+            # before the last one and seen drops the repeats
+            last = datetime.fromisoformat(page[-1].get("submitted_at")).astimezone(UTC) - timedelta(microseconds=1)
+            after = last.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
         return ret
+
+    def backfill(self, symbol: str = None, dry_run: bool = True, after: str = None, until: str = None) -> dict:
+        '''Reconciles broker orders against the order collection; with dry_run only the report is returned.'''
+        broker_orders = self.list_orders(symbol=symbol, after=after, until=until)
+
+        # one projected query for everything we know about
+        query = {"type": AssetType.STOCK.value, "account": self.account}
+        if symbol:
+            query["symbol"] = symbol
+        projection = {"_id": 1, "symbol": 1, "quantity": 1, "buy_order_id": 1, "buy_status": 1, "buy_price": 1, "buy_at_utc": 1, "sell_order_id": 1, "sell_status": 1, "sell_price": 1}
+        docs = self.data_client.read(self.collection("order"), query, projection)
+        buys = {doc.get("buy_order_id"): doc for doc in docs if doc.get("buy_order_id")}
+        sells = {doc.get("sell_order_id"): doc for doc in docs if doc.get("sell_order_id")}
+
+        report = {"broker_orders": len(broker_orders), "known_orders": len(docs), "missing_buy": [], "stale_buy": [], "stale_sell": [], "orphan_sell": []}
+        operations = list()
+        for order in broker_orders:
+            order_id = order.get("id")
+            status = order.get("status", None)
+            filled_avg_price = order.get("filled_avg_price", None)
+            filled_avg_price = float(filled_avg_price) if filled_avg_price else None
+
+            if order.get("side") == "buy":
+                known = buys.get(order_id, None)
+                status = fill_status(order)
+                if not known:
+                    # only filled buys open a lot
+                    if status == "filled":
+                        report["missing_buy"].append(order_id)
+                        new_order = self.create_order_obj(order)
+                        if new_order:
+                            operations.append(self.data_client.update_op({"buy_order_id": order_id}, None, upsert=True, on_insert=new_order.to_mongo()))
+                elif known.get("buy_status") != status or fixed_point.from_decimal128(known.get("buy_price")) != filled_avg_price:
+                    report["stale_buy"].append(order_id)
+                    filled_qty = order.get("filled_qty", None)
+                    filled_at = order.get("filled_at", None)
+                    operations.append(self.data_client.update_op({"_id": known["_id"]}, {
+                        "buy_status": status,
+                        "buy_price": fixed_point.to_decimal128(filled_avg_price),
+                        "quantity": fixed_point.to_decimal128(filled_qty or known.get("quantity")),
+                        # the feed's buy and sell events format it
+                        "buy_at_utc": datetime.fromisoformat(filled_at) if filled_at else known.get("buy_at_utc", None),
+                    }))
+
+            elif order.get("side") == "sell":
+                known = sells.get(order_id, None)
+                if not known:
+                    # we can't tell which lot an unknown sell closed, report it only
+                    report["orphan_sell"].append(order_id)
+                elif known.get("sell_status") != status or fixed_point.from_decimal128(known.get("sell_price")) != filled_avg_price:
+                    report["stale_sell"].append(order_id)
+                    o = Order.from_mongo(known)
+                    o.sell_status = status
+                    o.sell_price = filled_avg_price
+                    data = {"sell_status": o.sell_status, "sell_price": fixed_point.to_decimal128(o.sell_price)}
+                    if o.sell_price and o.buy_price and o.quantity:
+                        o.calculate_profit()
+                        data["profit"] = fixed_point.to_decimal128(o.profit)
+                    operations.append(self.data_client.update_op({"_id": o._id}, data))
+
+        report["operations"] = len(operations)
+        if not dry_run and operations:
+            res = self.data_client.bulk_write(self.collection("order"), operations)
+            report["upserted"] = res.upserted_count
+            report["modified"] = res.modified_count
+
+        self.data_client.log(
+            message=f"Backfill {'dry run' if dry_run else 'complete'}; {len(operations)} changes",
+            log_level=LogLevel.WARNING if operations else LogLevel.INFO,
+            symbol=symbol,
+            obj={k: v if isinstance(v, int) else len(v) for k, v in report.items()}
+        )
+        return report
@@ -1,28 +1,32 @@
-import jwt
 from urllib.parse import urlencode
-from cryptography.hazmat.primitives import serialization
 import time
 import secrets
 
 from data.data_client import DataClient
 from common.helper import Notifier
 from trading.trading_client import TradingClient
+from trading.rate_limiter import RateLimiter
+from strategy.base import Snapshot
 
 
 class CoinbaseTradingClient(TradingClient):
     HOST = "api.coinbase.com"
 
-    def __init__(self, api_key: str, api_secret_key: str, base_url: str, data_client: DataClient, notifier: Notifier=None):
+    def __init__(self, api_key: str, api_secret_key: str, base_url: str, data_client: DataClient, notifier: Notifier=None, rate_limiter: RateLimiter = None):
         self.headers = { 
             'Content-Type': 'application/json'
         }
-        super().__init__(self.headers, data_client, notifier)
+        super().__init__(self.headers, data_client, notifier, rate_limiter)
 
         self.api_key = api_key
         self.api_secret_key = api_secret_key
         self.base_url = base_url
 
     def build_jwt(self, uri):
+        # jwt and cryptography are slow to import, only load them when coinbase is actually called
+        import jwt
+        from cryptography.hazmat.primitives import serialization
+
         private_key_bytes = self.api_secret_key.encode('utf-8')
         private_key = serialization.load_pem_private_key(private_key_bytes, password=None)
         jwt_payload = {
@@ -50,14 +54,12 @@ class CoinbaseTradingClient(TradingClient):
         # POST /orders
         return super().create_order()
     
-    def process_sell(self):
-        return super().process_sell()
-    
-    def process_buy(self):
-        return super().process_buy()
+    def snapshot(self, watchlists, lots):
+        # crypto is not traded yet, an empty snapshot gives the strategies nothing to decide
+        return Snapshot()
     
-    def process_rebuy(self):
-        return super().process_rebuy()
+    def execute(self, decision):
+        return super().execute(decision)
     
     def buy(self):
         return super().buy()
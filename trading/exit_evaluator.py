@@ -0,0 +1,62 @@
+import threading
+from bisect import bisect_left
+from datetime import datetime, timedelta, UTC
+
+from common.helper import aware
+
+
+class ExitEvaluator():
+    '''Minute bars since the last exit check for every symbol with open lots, fetched in one batched request.
+
+    SwingStrategy sells on the intrabar high so a target crossed between two ticks is not missed.
+    '''
+    TIMEFRAME = "1Min"
+    MAX_LOOKBACK = timedelta(days=1)
+
+    def __init__(self, fetcher):
+        self.fetcher = fetcher
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self, since: dict = None):
+        '''Starts a tick; `since` maps each symbol to the last time its exits were evaluated.'''
+        now = datetime.now(UTC)
+        with self.lock:
+            floor = now - self.MAX_LOOKBACK
+            self.since = {symbol: max(aware(t) or floor, floor) for symbol, t in (since or {}).items()}
+            self.bars = None
+
+    def _load(self):
+        with self.lock:
+            if self.bars is not None:
+                return self.bars
+            bars = {symbol: ([], []) for symbol in self.since}
+            if self.since:
+                start = min(self.since.values()).strftime("%Y-%m-%dT%H:%M:%SZ")
+                page_token = None
+                while True:
+                    res = self.fetcher.fetch_bars(sorted(self.since), self.TIMEFRAME, start, page_token=page_token)
+                    for symbol, symbol_bars in (res.get("bars") or {}).items():
+                        times, highs = bars.setdefault(symbol, ([], []))
+                        for bar in symbol_bars:
+                            times.append(datetime.fromisoformat(bar["t"]))
+                            highs.append(float(bar["h"]))
+                    page_token = res.get("next_page_token", None)
+                    if not page_token:
+                        break
+            self.bars = bars
+            return self.bars
+
+    def high_since(self, symbol: str, *since: datetime) -> float | None:
+        '''Highest minute high for bars starting at or after the latest of `since` (and the tick's lookback).'''
+        times, highs = self._load().get(symbol, ([], []))
+        bounds = [aware(t) for t in since if t]
+        if symbol in self.since:
+            bounds.append(self.since[symbol])
+        since = max(bounds, default=None)
+        start = bisect_left(times, since) if since else 0
+        return max(highs[start:]) if start < len(highs) else None
+
+    def last_timestamp(self, symbol: str) -> datetime | None:
+        times, _ = self._load().get(symbol, ([], []))
+        return times[-1] if times else None
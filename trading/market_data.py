@@ -0,0 +1,96 @@
+import threading
+from datetime import datetime, UTC
+
+
+class MarketDataCache():
+    '''Per-tick market data shared by every account, so each symbol is only requested once.
+
+    Reads go through `fetcher`, an AlpacaTradingClient, and are single-flight:
+    concurrent callers asking for the same key wait for the first request.
+    '''
+    BATCH_SIZE = 200
+
+    def __init__(self, fetcher):
+        self.fetcher = fetcher
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        '''Drops everything, called at the start of each tick.'''
+        with self.lock:
+            self.registered = set()
+            self.latest = dict()
+            self.values = dict()
+            self.pending = dict()
+            self.requests = 0
+            self.hits = 0
+            # the clock stored by the pre-market warm-up, see clock()
+            self.session = None
+
+    def register(self, symbols: list[str]):
+        '''Symbols the tick will need, fetched together on the first latest bar miss.'''
+        with self.lock:
+            self.registered.update(symbols)
+
+    def _once(self, key, fetch):
+        while True:
+            with self.lock:
+                if key in self.values:
+                    self.hits += 1
+                    return self.values[key]
+                event = self.pending.get(key, None)
+                if event is None:
+                    event = self.pending[key] = threading.Event()
+                    break
+            # the owner failed when nothing was stored, the next waiter to get the lock becomes the owner
+            event.wait()
+        try:
+            value = fetch()
+            with self.lock:
+                self.values[key] = value
+                self.requests += 1
+            return value
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+            event.set()
+
+    def _fetch_latest(self, symbol: str) -> dict:
+        with self.lock:
+            symbols = sorted((self.registered - set(self.latest)) | {symbol})
+        for i in range(0, len(symbols), self.BATCH_SIZE):
+            bars = self.fetcher.fetch_latest_bars(symbols[i:i + self.BATCH_SIZE])
+            with self.lock:
+                self.latest.update(bars)
+        return self.latest
+
+    def latest_bar(self, symbol: str) -> dict:
+        '''Returns {symbol: bar} like AlpacaTradingClient.get_latest_bar.'''
+        if symbol not in self.latest:
+            # registered symbols share one batched request
+            key = ("latest",) if symbol in self.registered else ("latest", symbol)
+            self._once(key, lambda: self._fetch_latest(symbol))
+        return {symbol: self.latest[symbol]}
+
+    def historical_bars(self, asset: str, timeframe: str, limit: int, start: str, end: str, page_token: str = None) -> dict:
+        key = ("bars", asset, timeframe, limit, start, end, page_token)
+        return self._once(key, lambda: self.fetcher.fetch_historical_bars(asset, timeframe, limit, start, end, page_token))
+
+    def preload_clock(self, clock: dict):
+        with self.lock:
+            self.session = clock
+
+    def clock(self) -> dict:
+        '''Within the session a pre-market clock announced the market is open without asking again.'''
+        session = self.session
+        if session and not session.get("is_open", False):
+            now = datetime.now(UTC)
+            if datetime.fromisoformat(session["next_open"]) <= now < datetime.fromisoformat(session["next_close"]):
+                with self.lock:
+                    self.hits += 1
+                return {**session, "is_open": True, "timestamp": now.isoformat(), "preloaded": True}
+        return self._once(("clock",), self.fetcher.fetch_clock)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"requests": self.requests, "hits": self.hits, "symbols": len(self.latest)}
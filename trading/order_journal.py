@@ -0,0 +1,68 @@
+import uuid
+from datetime import datetime, timedelta, UTC
+
+from common.helper import aware
+from data.data_client import DataClient
+
+
+class IntentStatus:
+    PENDING = "pending"
+    SUBMITTED = "submitted"
+    RESOLVED = "resolved"
+    FAILED = "failed"
+
+
+class OrderJournal():
+    '''Write-ahead log of broker orders, one order_intent document per client_order_id.
+
+    An intent is written before the order is submitted and resolved once the order collection
+    reflects it, so an order created by a process that died in between can be found again.
+    '''
+    COLLECTION = "order_intent"
+    # an intent the broker still does not know about after this was never submitted
+    STALE_AFTER = timedelta(minutes=5)
+
+    def __init__(self, data_client: DataClient, account: str = None, collection: str = COLLECTION):
+        self.data_client = data_client
+        self.account = account
+        self.collection = collection
+
+    def open(self, symbol: str, side: str, payload: dict, lots: list = None) -> str:
+        '''Records the intent and tags `payload` with its client_order_id.'''
+        client_order_id = uuid.uuid4().hex
+        payload["client_order_id"] = client_order_id
+        self.data_client.write(self.collection, {
+            "_id": client_order_id,
+            "account": self.account,
+            "symbol": symbol,
+            "side": side,
+            "payload": payload,
+            "lots": lots or list(),
+            "status": IntentStatus.PENDING,
+            "order_id": None,
+            "created_at": datetime.now(UTC),
+            "session": self.data_client.session_id
+        })
+        return client_order_id
+
+    def submitted(self, client_order_id: str, order_id: str):
+        self.set_status(client_order_id, IntentStatus.SUBMITTED, order_id=order_id)
+
+    def resolve(self, client_order_id: str):
+        self.set_status(client_order_id, IntentStatus.RESOLVED)
+
+    def fail(self, client_order_id: str, error: str):
+        self.set_status(client_order_id, IntentStatus.FAILED, error=error)
+
+    def set_status(self, client_order_id: str, status: str, **data):
+        self.data_client.update(self.collection, {"_id": client_order_id}, {"status": status, "updated_at": datetime.now(UTC), **data})
+
+    def unresolved(self) -> list[dict]:
+        return self.data_client.read(
+            self.collection,
+            {"account": self.account, "status": {"$in": [IntentStatus.PENDING, IntentStatus.SUBMITTED]}},
+            sort=[("created_at", 1)]
+        )
+
+    def is_stale(self, intent: dict) -> bool:
+        return aware(intent["created_at"]) < datetime.now(UTC) - self.STALE_AFTER
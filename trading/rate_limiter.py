@@ -0,0 +1,165 @@
+import threading
+import time
+from collections import deque
+from enum import Enum
+
+
+class EndpointClass(Enum):
+    TRADING = "trading"
+    MARKET_DATA = "market_data"
+
+
+class Priority(Enum):
+    '''Request lanes, lower values win when the bucket runs low.'''
+    ORDER = 0
+    TRADING = 1
+    DATA = 2
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, endpoint: EndpointClass, priority: Priority, wait: float):
+        self.endpoint = endpoint
+        self.priority = priority
+        self.wait = wait
+        super().__init__(f"Rate limit exceeded for {endpoint.value} ({priority.name}); next token in {wait:.2f}s")
+
+
+# alpaca allows 200 requests per minute per api key on both the trading and the market data api
+DEFAULT_LIMITS = {
+    EndpointClass.TRADING: 200,
+    EndpointClass.MARKET_DATA: 200,
+}
+# fraction of the bucket a lane has to leave untouched for the lanes above it
+DEFAULT_RESERVE = {
+    Priority.ORDER: 0.0,
+    Priority.TRADING: 0.1,
+    Priority.DATA: 0.25,
+}
+# seconds a lane will wait for a token before giving up
+DEFAULT_MAX_WAIT = {
+    Priority.ORDER: 30.0,
+    Priority.TRADING: 10.0,
+    Priority.DATA: 2.0,
+}
+
+
+class TokenBucket():
+    def __init__(self, capacity: int, period: float = 60.0, reserve: dict = None, max_wait: dict = None):
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+        self.reserve = reserve if reserve else DEFAULT_RESERVE
+        self.max_wait = max_wait if max_wait else DEFAULT_MAX_WAIT
+
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.condition = threading.Condition()
+        self.waiting = {priority: 0 for priority in Priority}
+        self.history = deque()
+
+        self.granted = 0
+        self.throttled = 0
+        self.rejected = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _prune(self, now: float):
+        while self.history and self.history[0] <= now - self.period:
+            self.history.popleft()
+
+    def _wait_time(self, priority: Priority, now: float) -> float:
+        '''Seconds until the lane may take a token, 0 if it can take one now.'''
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        # a higher priority lane is queued, let it go first
+        if any(self.waiting[p] for p in Priority if p.value < priority.value):
+            return 1 / self.rate
+        floor = self.reserve.get(priority, 0.0) * self.capacity
+        if self.tokens - 1 >= floor:
+            return 0.0
+        return (floor + 1 - self.tokens) / self.rate
+
+    def acquire(self, priority: Priority = Priority.TRADING, endpoint: EndpointClass = EndpointClass.TRADING):
+        with self.condition:
+            deadline = time.monotonic() + self.max_wait.get(priority, 0.0)
+            throttled = False
+            self.waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = self._wait_time(priority, now)
+                    if wait <= 0:
+                        self.tokens -= 1
+                        self.granted += 1
+                        self._prune(now)
+                        self.history.append(now)
+                        return
+                    if now + wait > deadline:
+                        self.rejected += 1
+                        raise RateLimitExceeded(endpoint, priority, wait)
+                    if not throttled:
+                        throttled = True
+                        self.throttled += 1
+                    self.condition.wait(wait)
+            finally:
+                self.waiting[priority] -= 1
+                self.condition.notify_all()
+
+    def penalize(self, retry_after: float):
+        '''The broker rejected a request, drain the bucket until it says we can retry.'''
+        with self.condition:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = 0.0
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def observe(self, remaining: int):
+        '''Syncs the bucket with the quota the broker reports as remaining.'''
+        with self.condition:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, float(remaining))
+
+    def utilization(self) -> dict:
+        with self.condition:
+            now = time.monotonic()
+            self._refill(now)
+            self._prune(now)
+            return {
+                "capacity": self.capacity,
+                "available": round(self.tokens, 2),
+                "used": len(self.history),
+                "utilization": round(len(self.history) / self.capacity, 4),
+                "granted": self.granted,
+                "throttled": self.throttled,
+                "rejected": self.rejected,
+            }
+
+
+class RateLimiter():
+    def __init__(self, limits: dict = None, period: float = 60.0):
+        limits = limits if limits else DEFAULT_LIMITS
+        self.buckets = {endpoint: TokenBucket(capacity, period) for endpoint, capacity in limits.items()}
+
+    @classmethod
+    def from_config(cls, config: dict | None):
+        '''Builds a limiter from the `rate_limits` config block, e.g. {"trading": 200, "market_data": 200}.'''
+        limits = dict(DEFAULT_LIMITS)
+        for key, value in (config or {}).items():
+            limits[EndpointClass(key)] = int(value)
+        return cls(limits)
+
+    def acquire(self, endpoint: EndpointClass = EndpointClass.TRADING, priority: Priority = Priority.TRADING):
+        self.buckets[endpoint].acquire(priority, endpoint)
+
+    def penalize(self, endpoint: EndpointClass, retry_after: float):
+        self.buckets[endpoint].penalize(retry_after)
+
+    def observe(self, endpoint: EndpointClass, remaining: int):
+        self.buckets[endpoint].observe(remaining)
+
+    def utilization(self) -> dict:
+        return {endpoint.value: bucket.utilization() for endpoint, bucket in self.buckets.items()}
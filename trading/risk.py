@@ -0,0 +1,95 @@
+import threading
+
+
+# dollar limits, None disables the check
+DEFAULT_LIMITS = {
+    # market value of every position plus buys not yet filled
+    "max_exposure": None,
+    "max_symbol_exposure": None,
+    "max_sector_exposure": None,
+    # buying power that is never spent
+    "min_buying_power": 0.0,
+}
+
+
+class RiskEngine():
+    '''Pre-trade limits checked against an in-memory portfolio of one account.
+
+    The portfolio is loaded from the account and positions on the first check of a tick and then
+    kept current from our own orders, so a check is a few dict lookups under a lock.
+    '''
+
+    def __init__(self, limits: dict = None, sectors: dict = None):
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        # symbol -> sector for max_sector_exposure
+        self.sectors = sectors or dict()
+        self.lock = threading.Lock()
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config: dict = None) -> "RiskEngine":
+        config = dict(config or {})
+        sectors = config.pop("sectors", None)
+        return cls(config, sectors)
+
+    @property
+    def enabled(self) -> bool:
+        return any(self.limits[k] for k in DEFAULT_LIMITS)
+
+    def reset(self):
+        '''Called at the start of each tick, the next check reloads the portfolio.'''
+        with self.lock:
+            self.loaded = False
+            self.buying_power = 0.0
+            self.exposure = dict()
+
+    def load(self, account: dict, positions: list):
+        with self.lock:
+            self._load(account, positions)
+
+    def _load(self, account: dict, positions: list):
+        self.buying_power = float(account.get("buying_power", None) or 0)
+        self.exposure = {p["symbol"]: float(p.get("market_value", None) or 0) for p in positions or []}
+        self.loaded = True
+
+    def _sector_exposure(self, sector: str) -> float:
+        return sum(value for symbol, value in self.exposure.items() if self.sectors.get(symbol, None) == sector)
+
+    def check(self, symbol: str, notional: float, client=None) -> str | None:
+        '''Reserves `notional` for a buy of `symbol`; returns why it was refused, or None.
+
+        `client` loads the portfolio the first time a tick needs it.
+        '''
+        if not self.enabled:
+            return None
+        with self.lock:
+            if not self.loaded and client:
+                self._load(client.get_account(), client.get_positions())
+
+            if notional > self.buying_power - self.limits["min_buying_power"]:
+                return f"buying power {self.buying_power:.2f}"
+            limit = self.limits["max_exposure"]
+            if limit and sum(self.exposure.values()) + notional > limit:
+                return f"exposure limit {limit}"
+            limit = self.limits["max_symbol_exposure"]
+            if limit and self.exposure.get(symbol, 0.0) + notional > limit:
+                return f"{symbol} exposure limit {limit}"
+            sector = self.sectors.get(symbol, None)
+            limit = self.limits["max_sector_exposure"]
+            if limit and sector and self._sector_exposure(sector) + notional > limit:
+                return f"{sector} exposure limit {limit}"
+
+            self.buying_power -= notional
+            self.exposure[symbol] = self.exposure.get(symbol, 0.0) + notional
+            return None
+
+    def release(self, symbol: str, notional: float):
+        '''Returns a reservation whose order was never placed.'''
+        self.on_sell(symbol, notional)
+
+    def on_sell(self, symbol: str, notional: float):
+        with self.lock:
+            if not self.loaded:
+                return
+            self.buying_power += notional
+            self.exposure[symbol] = max(self.exposure.get(symbol, 0.0) - notional, 0.0)
@@ -0,0 +1,154 @@
+import threading
+from datetime import datetime, UTC
+
+from models.order import Order
+from models.watchlist import Watchlist
+from strategy.base import Snapshot
+from common.helper import aware
+from trading.alpaca_client import TERMINAL
+
+
+DEFAULTS = {
+    # seconds between cron ticks, the shortest interval a symbol is evaluated at
+    "tick_seconds": 60,
+    # the longest a symbol goes without a full evaluation
+    "max_interval_seconds": 900,
+    # distance in average daily swings within which a symbol is evaluated every tick
+    "near": 1.0,
+    # estimated api calls a tick may spend on evaluations per account, None is unlimited
+    "budget": None,
+}
+
+
+class PriorityScheduler():
+    '''Picks the watchlists a tick evaluates, nearest to a threshold first.
+
+    After a watchlist is evaluated the band between its thresholds (the entry or rebuy price below,
+    the lowest sell target above) and its average daily swing are stored on it. The next tick prices
+    it against that band with the batched latest bar: within `near` swings of either side it is
+    evaluated every tick, each further swing doubles the interval up to max_interval_seconds. A
+    symbol that moves out of its band is due at once, whatever its interval.
+    '''
+
+    def __init__(self, tick_seconds: float = 60, max_interval_seconds: float = 900, near: float = 1.0, budget: int = None, enabled: bool = True):
+        self.tick_seconds = tick_seconds
+        self.max_interval_seconds = max_interval_seconds
+        self.near = near
+        self.budget = budget
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config: dict = None) -> "PriorityScheduler":
+        '''Without a "scheduler" config block every watchlist is evaluated every tick.'''
+        if config is None:
+            return cls(enabled=False)
+        return cls(**{**DEFAULTS, **config})
+
+    def reset(self):
+        with self.lock:
+            self.evaluated = 0
+            self.waiting = 0
+            self.over_budget = 0
+
+    @staticmethod
+    def distance(w: Watchlist, last: float) -> float | None:
+        '''Swings between `last` and the nearest side of the stored band, 0 outside of it; None before the first evaluation.'''
+        if not w.threshold_swing or not w.evaluated_at:
+            return None
+        gaps = [last - w.threshold_low if w.threshold_low else None, w.threshold_high - last if w.threshold_high else None]
+        gaps = [gap for gap in gaps if gap is not None]
+        if not gaps:
+            return None
+        return max(min(gaps), 0.0) / w.threshold_swing
+
+    @staticmethod
+    def resting(order: dict | None) -> bool:
+        '''A broker order prefetch_sells listed that has neither filled nor ended, e.g. a broker exit take-profit.'''
+        return order is not None and order.get("status", None) not in ("filled",) + TERMINAL
+
+    def interval(self, distance: float) -> float:
+        '''Seconds between evaluations of a symbol `distance` swings from its threshold.'''
+        steps = min(int(distance / self.near), 32) if self.near else 0
+        return min(self.tick_seconds * 2 ** steps, self.max_interval_seconds)
+
+    def select(self, client, watchlists: list[Watchlist], orders: dict) -> tuple[list[Watchlist], list[Watchlist]]:
+        '''(watchlists to evaluate this tick, due watchlists left for the next one because of the budget).'''
+        if not self.enabled:
+            return watchlists, list()
+        now = datetime.now(UTC)
+        due = list()
+        waiting = 0
+        for w in watchlists:
+            lots: list[Order] = orders.get((w.type, w.account, w.symbol), list())
+            # a sell placed on an earlier tick is reconciled every tick, unless the tick's listing shows it still resting
+            pending = {o.sell_order_id for o in lots if o.sell_status is not None and not self.resting(client.sell_orders.get(o.sell_order_id, None))}
+            distance = None
+            try:
+                # registered symbols share one batched latest bar request
+                last = float(client.get_latest_bar(w.symbol)[w.symbol]["c"])
+                distance = self.distance(w, last)
+            except Exception:
+                # evaluated, the snapshot surfaces the error
+                pass
+            # half a tick of slack so cron jitter does not push a symbol a whole interval back
+            if distance and not pending and (now - aware(w.evaluated_at)).total_seconds() + self.tick_seconds / 2 < self.interval(distance):
+                waiting += 1
+                continue
+            # daily bars on a signal cache miss, plus one order read per pending sell prefetch_sells did not list
+            due.append((distance if distance is not None else 0.0, 1 + len(pending - client.sell_orders.keys()), w))
+        due.sort(key=lambda x: x[0])
+
+        selected, over_budget = list(), list()
+        spent = 0
+        for _, cost, w in due:
+            if self.budget is not None and spent + cost > self.budget and selected:
+                over_budget.append(w)
+                continue
+            spent += cost
+            selected.append(w)
+        with self.lock:
+            self.evaluated += len(selected)
+            self.waiting += waiting
+            self.over_budget += len(over_budget)
+        return selected, over_budget
+
+    @staticmethod
+    def thresholds(snapshot: Snapshot) -> list[tuple[Watchlist, float, float, float]]:
+        '''(watchlist, buy threshold below, lowest sell target above, average daily swing) per row; None where there is none.'''
+        high = [None] * len(snapshot)
+        counts = snapshot.lot_count()
+        for row, buy_price in zip(snapshot.lot_row, snapshot.buy_price):
+            target = round(buy_price + snapshot.target_swing[row], 2)
+            high[row] = target if high[row] is None else min(high[row], target)
+        ret = list()
+        for row, w in enumerate(snapshot.watchlists):
+            low = None
+            newest = snapshot.last_lot[row]
+            if newest < 0:
+                low = snapshot.entry_price[row]
+            elif counts[row] < snapshot.allowed_batches[row]:
+                newest = snapshot.buy_price[newest]
+                low = newest - newest * snapshot.rebuy_drop[row]
+            ret.append((w, low, high[row], snapshot.signals[row].exit["avg_daily_swing"]))
+        return ret
+
+    def record(self, client, snapshot: Snapshot):
+        '''Stores the band of every evaluated watchlist for the next tick's select.'''
+        if not self.enabled:
+            return
+        now = datetime.now(UTC)
+        operations = list()
+        for w, low, high, swing in self.thresholds(snapshot):
+            w.threshold_low, w.threshold_high, w.threshold_swing, w.evaluated_at = low, high, swing, now
+            operations.append(client.data_client.update_op(
+                {"_id": w._id},
+                {"threshold_low": low, "threshold_high": high, "threshold_swing": swing, "evaluated_at": now},
+                upsert=client.shadow
+            ))
+        client.data_client.bulk_write(client.collection("watchlist"), operations)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"evaluated": self.evaluated, "waiting": self.waiting, "over_budget": self.over_budget}
@@ -0,0 +1,133 @@
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, UTC
+from itertools import accumulate
+
+from models.base import AssetType
+from models.watchlist import Watchlist
+from data.data_client import DataClient, LogLevel
+
+
+class Screener():
+    '''Scores every tradable us equity on the swing metrics of Helper.process_bar and upserts the best as watchlists.
+
+    Daily bars come from multi-symbol requests of BATCH symbols. The metrics are computed over flat
+    columns of the whole universe, each window is a difference of prefix sums. New watchlists are
+    inserted inactive, a screened symbol is traded once someone activates it.
+    '''
+    TIMEFRAME = "1D"
+    # symbols per bars request, bounded by the length of the url
+    BATCH = 200
+    WORKERS = 4
+    MIN_PRICE = 5.0
+    # average close * volume over the exit period
+    MIN_DOLLAR_VOLUME = 1000000.0
+
+    def __init__(self, client, data_client: DataClient, min_price: float = MIN_PRICE, min_dollar_volume: float = MIN_DOLLAR_VOLUME):
+        self.client = client
+        self.data_client = data_client
+        self.min_price = min_price
+        self.min_dollar_volume = min_dollar_volume
+        # new watchlists trade with the default parameters, the screen scores them with the same ones
+        self.defaults = Watchlist()
+
+    def universe(self) -> list[str]:
+        # buys are notional, only fractionable assets can be bought for batch_size dollars
+        return sorted(a["symbol"] for a in self.client.get_assets() if a.get("tradable", False) and a.get("fractionable", False))
+
+    def bars(self, symbols: list[str]) -> dict:
+        '''Daily bars of `symbols` oldest first, {symbol: [bar, ...]}.'''
+        period = max(self.defaults.entry_period, self.defaults.exit_period)
+        start = (datetime.now(UTC) - timedelta(days=Watchlist.lookback_days(period))).strftime("%Y-%m-%d")
+
+        def fetch(batch: list[str]) -> dict:
+            ret = dict()
+            page_token = None
+            while True:
+                res = self.client.fetch_bars(batch, self.TIMEFRAME, start, page_token=page_token)
+                for symbol, symbol_bars in (res.get("bars") or {}).items():
+                    ret.setdefault(symbol, list()).extend(symbol_bars)
+                page_token = res.get("next_page_token", None)
+                if not page_token:
+                    return ret
+
+        ret = dict()
+        batches = [symbols[i:i + self.BATCH] for i in range(0, len(symbols), self.BATCH)]
+        # the rate limiter paces the workers
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            for bars in pool.map(fetch, batches):
+                ret.update(bars)
+        return ret
+
+    def score(self, bars: dict) -> list[dict]:
+        '''Swing metrics of every symbol with a full exit period of bars, best swing relative to price first.'''
+        entry_period = self.defaults.entry_period
+        exit_period = self.defaults.exit_period
+        symbols = [symbol for symbol, symbol_bars in bars.items() if len(symbol_bars) >= max(entry_period, exit_period)]
+        # one column per field for the whole universe, symbol i owns [ends[i-1], ends[i])
+        high = array("d", (float(bar["h"]) for symbol in symbols for bar in bars[symbol]))
+        low = array("d", (float(bar["l"]) for symbol in symbols for bar in bars[symbol]))
+        close = array("d", (float(bar["c"]) for symbol in symbols for bar in bars[symbol]))
+        volume = array("d", (float(bar.get("v", 0)) for symbol in symbols for bar in bars[symbol]))
+        ends = array("l", accumulate(len(bars[symbol]) for symbol in symbols))
+        swing = array("d", accumulate((h - l for h, l in zip(high, low)), initial=0))
+        turnover = array("d", accumulate((c * v for c, v in zip(close, volume)), initial=0))
+
+        ret = list()
+        for symbol, end in zip(symbols, ends):
+            last = close[end - 1]
+            dollar_volume = (turnover[end] - turnover[end - exit_period]) / exit_period
+            if last < self.min_price or dollar_volume < self.min_dollar_volume:
+                continue
+            entry_swing = (swing[end] - swing[end - entry_period]) / entry_period
+            exit_swing = (swing[end] - swing[end - exit_period]) / exit_period
+            day_high = max(high[end - entry_period:end])
+            entry_price = day_high - entry_swing * self.defaults.entry_swing
+            target_swing = exit_swing * self.defaults.exit_swing
+            ret.append({
+                "symbol": symbol,
+                "last": last,
+                "day_high": day_high,
+                "avg_daily_swing": exit_swing,
+                "entry_price": round(entry_price, 4),
+                "target_swing": round(target_swing, 4),
+                # the return of one swing trade
+                "score": round(target_swing / last, 6),
+                # below zero the entry holds now
+                "entry_gap": round((last - entry_price) / last, 6),
+                "dollar_volume": round(dollar_volume, 2),
+            })
+        ret.sort(key=lambda x: x["score"], reverse=True)
+        return ret
+
+    def run(self, top: int = 20, dry_run: bool = True) -> dict:
+        '''Screens the universe and upserts the `top` candidates for the client's account.
+
+        An existing watchlist only gets its score updated, its parameters and is_active are left alone.
+        '''
+        started = datetime.now(UTC)
+        symbols = self.universe()
+        scored = self.score(self.bars(symbols))
+        candidates = scored[:top]
+        ret = {
+            "universe": len(symbols),
+            "scored": len(scored),
+            "candidates": candidates,
+            "dry_run": dry_run,
+        }
+        if not dry_run:
+            operations = list()
+            for c in candidates:
+                w = Watchlist(type=AssetType.STOCK.value, account=self.client.account, symbol=c["symbol"], is_active=False, created_at=started)
+                score = {"screen_score": c["score"], "screened_at": started}
+                on_insert = {k: v for k, v in w.to_mongo().items() if k not in score}
+                operations.append(self.data_client.update_op({"account": w.account, "symbol": w.symbol}, score, upsert=True, on_insert=on_insert))
+            res = self.data_client.bulk_write("watchlist", operations)
+            ret["upserted"] = res.upserted_count if res else 0
+        ret["seconds"] = round((datetime.now(UTC) - started).total_seconds(), 3)
+        self.data_client.log(
+            message=f"Screened {len(symbols)} symbols; {len(scored)} scored.",
+            log_level=LogLevel.INFO,
+            obj={k: v for k, v in ret.items() if k != "candidates"}
+        )
+        return ret
@@ -0,0 +1,137 @@
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+
+from common.helper import Helper
+from models.watchlist import Watchlist
+
+
+@dataclass
+class Signals():
+    '''Everything a strategy derives from the daily bars of one watchlist.'''
+    symbol: str
+    timeframe: str
+    window: int
+    entry: dict
+    exit: dict
+    # buy when the price is below this, entry_swing of the average swing below the entry_period high
+    entry_price: float
+    # a lot is sold once the price is this far above its buy price
+    target_swing: float
+    rebuy_drop: float
+
+    def target_price(self, buy_price: float) -> float:
+        return round(buy_price + self.target_swing, 2)
+
+    def rebuy_price(self, buy_price: float) -> float:
+        return buy_price - (buy_price * self.rebuy_drop)
+
+
+class SignalCache():
+    '''Per-tick Signals keyed by (symbol, timeframe, window); the bars behind a key are fetched once.
+
+    Watchlists for the same symbol in other accounts share the bars; the snapshot is rebuilt
+    only if their parameters differ. Trader calls reset() at the start of each tick.
+
+    With a preloaded history (the completed sessions stored by Trader.warm_up) a symbol's bars are
+    that history plus today's bar, and today's bars of every preloaded symbol are one request.
+    '''
+    TIMEFRAME = "1D"
+
+    def __init__(self, fetcher):
+        self.fetcher = fetcher
+        self.lock = threading.Lock()
+        self.today_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.bars = dict()
+            self.signals = dict()
+            self.hits = 0
+            self.misses = 0
+            # symbol -> daily bars before today, newest first
+            self.history = dict()
+            # the first day the history covers
+            self.history_start = None
+            self.today = None
+
+    def preload(self, history: dict, start: str):
+        with self.lock:
+            self.history = history
+            self.history_start = start
+
+    def fetch(self, symbols: list[str], start: str) -> dict:
+        '''Daily bars of `symbols` since `start` from multi-symbol requests, {symbol: [bar, ...]} newest first.'''
+        ret = dict()
+        page_token = None
+        while True:
+            res = self.fetcher.fetch_bars(symbols, self.TIMEFRAME, start, page_token=page_token)
+            for symbol, bars in (res.get("bars") or {}).items():
+                ret.setdefault(symbol, list()).extend(bars)
+            page_token = res.get("next_page_token", None)
+            if not page_token:
+                break
+        # fetch_bars is oldest first, process_bar reads newest first
+        return {symbol: bars[::-1] for symbol, bars in ret.items()}
+
+    def _today(self) -> dict:
+        with self.today_lock:
+            if self.today is None:
+                self.today = self.fetch(sorted(self.history), datetime.now(UTC).strftime("%Y-%m-%d"))
+            return self.today
+
+    @staticmethod
+    def window(w: Watchlist) -> int:
+        '''Calendar days of bars covering both the entry and the exit period.'''
+        return w.lookback_days(max(w.entry_period, w.exit_period))
+
+    @staticmethod
+    def params(w: Watchlist) -> tuple:
+        return (w.entry_period, w.exit_period, w.entry_swing, w.exit_swing, w.rebuy_drop)
+
+    def _bars(self, key: tuple) -> dict:
+        symbol, timeframe, window = key
+        end_date = datetime.now(UTC)
+        start_date = end_date - timedelta(days=window)
+        history = self.history.get(symbol, None)
+        start = start_date.strftime("%Y-%m-%d")
+        # a window longer than the stored one (the parameters changed since the warm up) is fetched whole
+        if history is not None and self.history_start <= start:
+            return {"bars": self._today().get(symbol, list()) + [bar for bar in history if bar["t"] >= start]}
+        return self.fetcher.get_historical_bars(symbol, timeframe, 1000, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+
+    def get(self, w: Watchlist) -> Signals:
+        key = (w.symbol, self.TIMEFRAME, self.window(w))
+        params = self.params(w)
+        with self.lock:
+            signals = self.signals.get(key, None)
+            if signals and signals[0] == params:
+                self.hits += 1
+                return signals[1]
+            self.misses += 1
+            bars = self.bars.get(key, None)
+        if bars is None:
+            # historical bars are single-flight in MarketDataCache, a concurrent miss does not refetch
+            bars = self._bars(key)
+        entry = Helper.process_bar(bars, w.entry_period)
+        exit = Helper.process_bar(bars, w.exit_period)
+        signals = Signals(
+            symbol=w.symbol,
+            timeframe=self.TIMEFRAME,
+            window=key[2],
+            entry=entry,
+            exit=exit,
+            entry_price=entry["day_high"] - entry["avg_daily_swing"] * w.entry_swing,
+            target_swing=exit["avg_daily_swing"] * w.exit_swing,
+            rebuy_drop=w.rebuy_drop,
+        )
+        with self.lock:
+            self.bars[key] = bars
+            self.signals[key] = (params, signals)
+        return signals
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 3) if total else None}
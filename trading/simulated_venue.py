@@ -0,0 +1,111 @@
+import threading
+import uuid
+from datetime import datetime, UTC
+
+
+class SimulatedVenue():
+    '''An in-process stand-in for the alpaca order endpoints used by shadow mode.
+
+    Market orders fill at the latest bar close moved against us by `slippage_bps`; limit orders fill
+    at their limit once the latest bar trades through it. Orders live for the life of the process,
+    an unknown id (e.g. after a restart) reads back as expired so its lots are reopened.
+    '''
+    # orders are shared by every venue in the process, the api builds a new Trader per request
+    ORDERS = dict()
+    LOCK = threading.Lock()
+
+    def __init__(self, client, slippage_bps: float = 5.0, cash: float = 100000.0):
+        # the AlpacaTradingClient the venue prices from
+        self.client = client
+        self.slippage = slippage_bps / 10000
+        # starting cash, buying power is what the filled orders leave of it
+        self.cash = cash
+
+    def price(self, symbol: str, side: str) -> tuple[float, float]:
+        '''(fill price for a market order, high of the latest bar).'''
+        bar = self.client.get_latest_bar(symbol)[symbol]
+        close = float(bar["c"])
+        slipped = close * (1 + self.slippage) if side == "buy" else close * (1 - self.slippage)
+        return round(slipped, 4), float(bar.get("h", close))
+
+    def create_order(self, payload: dict) -> dict:
+        now = datetime.now(UTC).isoformat()
+        order = {
+            "id": uuid.uuid4().hex,
+            "client_order_id": payload.get("client_order_id", None) or uuid.uuid4().hex,
+            "account": self.client.account,
+            "symbol": payload["symbol"],
+            "side": payload["side"],
+            "type": payload.get("type", "market"),
+            "time_in_force": payload.get("time_in_force", "day"),
+            "qty": payload.get("qty", None),
+            "notional": payload.get("notional", None),
+            "limit_price": payload.get("limit_price", None),
+            "status": "new",
+            "filled_qty": "0",
+            "filled_avg_price": None,
+            "filled_at": None,
+            "created_at": now,
+            "submitted_at": now,
+            "updated_at": now,
+        }
+        with self.LOCK:
+            self.ORDERS[order["id"]] = order
+        return self.fill(order)
+
+    def fill(self, order: dict) -> dict:
+        if order["status"] != "new":
+            return dict(order)
+        price, high = self.price(order["symbol"], order["side"])
+        if order["type"] == "limit":
+            limit = float(order["limit_price"])
+            marketable = price <= limit if order["side"] == "buy" else max(price, high) >= limit
+            if not marketable:
+                return dict(order)
+            price = limit
+        qty = float(order["qty"]) if order["qty"] else round(float(order["notional"]) / price, 9)
+        with self.LOCK:
+            order.update({
+                "status": "filled",
+                "filled_qty": str(qty),
+                "filled_avg_price": str(price),
+                "filled_at": datetime.now(UTC).isoformat(),
+                "updated_at": datetime.now(UTC).isoformat(),
+            })
+        return dict(order)
+
+    def get_order(self, order_id: str) -> dict:
+        order = self.ORDERS.get(order_id, None)
+        if order is None:
+            return {"id": order_id, "status": "expired", "filled_qty": "0"}
+        # resting limits are checked against the latest bar every time they are read
+        return self.fill(order)
+
+    def list_orders(self, symbol: str = None) -> list:
+        with self.LOCK:
+            orders = [dict(o) for o in self.ORDERS.values() if o["account"] == self.client.account]
+        return sorted([o for o in orders if not symbol or o["symbol"] == symbol], key=lambda o: o["submitted_at"])
+
+    def get_account(self) -> dict:
+        buying_power = self.cash
+        for order in self.list_orders():
+            if order["status"] == "filled":
+                value = float(order["filled_qty"]) * float(order["filled_avg_price"])
+                buying_power += -value if order["side"] == "buy" else value
+        return {"buying_power": str(round(buying_power, 2)), "account": self.client.account, "shadow": True}
+
+    def get_positions(self) -> list:
+        positions = dict()
+        for order in self.list_orders():
+            if order["status"] != "filled":
+                continue
+            qty = float(order["filled_qty"]) * (1 if order["side"] == "buy" else -1)
+            position = positions.setdefault(order["symbol"], {"symbol": order["symbol"], "qty": 0.0, "cost_basis": 0.0})
+            position["qty"] += qty
+            position["cost_basis"] += qty * float(order["filled_avg_price"])
+        ret = list()
+        for position in positions.values():
+            if position["qty"] > 0:
+                price, _ = self.price(position["symbol"], "sell")
+                ret.append({**position, "market_value": str(round(position["qty"] * price, 2))})
+        return ret
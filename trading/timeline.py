@@ -0,0 +1,102 @@
+import time
+from dataclasses import dataclass, asdict, fields
+from datetime import datetime, UTC
+
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+PERCENTILES = (50, 90, 99)
+
+
+def to_ns(value: str) -> int:
+    '''Nanoseconds since the epoch of a broker timestamp, e.g. filled_at.'''
+    at = datetime.fromisoformat(value)
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=UTC)
+    delta = at - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
+
+
+@dataclass
+class Timeline():
+    '''Wall-clock nanosecond timestamps of one broker order, from the strategy's decision to the fill.
+
+    Stored as a dict on the Order (buy_timeline/sell_timeline). acked_ns is when the create order
+    response arrived, filled_ns is the broker's filled_at.
+    '''
+    side: str = None
+    # order side and type, e.g. "sell limit"
+    endpoint: str = None
+    decision_price: float = None
+    decided_ns: int = None
+    submitted_ns: int = None
+    acked_ns: int = None
+    filled_ns: int = None
+    fill_price: float = None
+
+    @classmethod
+    def from_mongo(cls, doc: dict):
+        if not doc:
+            return None
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in doc.items() if k in names})
+
+    def to_mongo(self) -> dict:
+        return asdict(self)
+
+    def submit(self, payload: dict):
+        self.endpoint = f"{payload['side']} {payload['type']}"
+        self.submitted_ns = time.time_ns()
+
+    def ack(self):
+        self.acked_ns = time.time_ns()
+
+    def fill(self, order: dict):
+        if order.get("status", None) != "filled":
+            return
+        filled_at = order.get("filled_at", None)
+        self.filled_ns = to_ns(filled_at) if filled_at else time.time_ns()
+        self.fill_price = float(order.get("filled_avg_price"))
+
+    def latency_ms(self) -> dict:
+        '''decision to submit, submit to ack, ack to fill and decision to fill; None where a timestamp is missing.'''
+        def between(start, end):
+            return (end - start) / 1e6 if start is not None and end is not None else None
+        return {
+            "submit_ms": between(self.decided_ns, self.submitted_ns),
+            "ack_ms": between(self.submitted_ns, self.acked_ns),
+            "fill_ms": between(self.acked_ns, self.filled_ns),
+            "total_ms": between(self.decided_ns, self.filled_ns),
+        }
+
+    def slippage_bps(self) -> float:
+        '''Fill against the price at decision, positive when the fill is worse for us.'''
+        if not self.decision_price or not self.fill_price:
+            return None
+        moved = (self.fill_price - self.decision_price) / self.decision_price * 10000
+        return round(moved if self.side == "buy" else -moved, 4)
+
+
+def percentiles(values: list[float]) -> dict:
+    '''Nearest-rank percentiles of `values`.'''
+    values = sorted(values)
+    if not values:
+        return None
+    return {f"p{p}": values[max(0, -(-p * len(values) // 100) - 1)] for p in PERCENTILES}
+
+
+def latency_report(timelines: list[tuple[str, Timeline]]) -> dict:
+    '''Latency and slippage percentiles per endpoint and per symbol of (symbol, Timeline) pairs.
+
+    Lots sold together share one sell timeline, pass each broker order once.
+    '''
+    groups = {"endpoints": dict(), "symbols": dict()}
+    for symbol, timeline in timelines:
+        sample = {**timeline.latency_ms(), "slippage_bps": timeline.slippage_bps()}
+        for group, key in (("endpoints", timeline.endpoint), ("symbols", symbol)):
+            metrics = groups[group].setdefault(key, dict())
+            for metric, value in sample.items():
+                if value is not None:
+                    metrics.setdefault(metric, list()).append(value)
+    return {
+        group: {key: {metric: {"count": len(values), **percentiles(values)} for metric, values in metrics.items()} for key, metrics in keys.items()}
+        for group, keys in groups.items()
+    }
@@ -1,6 +1,7 @@
 from enum import Enum
 import json
-import requests
+import threading
+import time
 from abc import ABCMeta, abstractmethod
 
 from models.order import Order
@@ -8,6 +9,8 @@ from models.watchlist import Watchlist
 
 from data.data_client import DataClient
 from common.helper import Notifier
+from common import recording
+from trading.rate_limiter import RateLimiter, EndpointClass, Priority
 
 
 class OrderStatus(Enum):
@@ -21,27 +24,86 @@ class OrderSide(Enum):
 
 
 class TradingClient(metaclass=ABCMeta):
-    def __init__ (self, headers, data_client: DataClient, notifier: Notifier): 
+    MAX_RETRIES = 2
+    DEFAULT_RETRY_AFTER = 1.0
+    # keep-alive connections shared by every client of the process, see session()
+    SESSION = None
+    SESSION_LOCK = threading.Lock()
+    POOL_SIZE = 32
+
+    def __init__ (self, headers, data_client: DataClient, notifier: Notifier, rate_limiter: RateLimiter = None): 
         self.headers = headers
         self.data_client = data_client
         self.notifier = notifier
+        self.rate_limiter = rate_limiter if rate_limiter else RateLimiter()
+        # symbols with an order intent still in flight, see AlpacaTradingClient.recover_intents
+        self.pending_intents = set()
+        # "shadow_" in shadow mode
+        self.collection_prefix = ""
+        # broker orders behind the tick's pending sells, see AlpacaTradingClient.prefetch_sells
+        self.sell_orders = dict()
+
+    @classmethod
+    def session(cls):
+        '''The process wide requests.Session, connections to each host are reused across ticks.'''
+        if cls.SESSION is None:
+            with cls.SESSION_LOCK:
+                if TradingClient.SESSION is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    # one pooled connection per concurrent request: accounts, screener workers and the api threadpool
+                    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=cls.POOL_SIZE)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    TradingClient.SESSION = session
+        return TradingClient.SESSION
+
+    def collection(self, name: str) -> str:
+        '''The mongo collection this client keeps `name` records in.'''
+        return f"{self.collection_prefix}{name}"
         
-    def get(self, url, headers=None) -> dict | None:
-        hdrs = headers if headers else self.headers
-        req = requests.get(url, headers=hdrs)
-        if req.status_code == 200:
-            return json.loads(req.content)
-        else:
-            raise Exception(f"Error: {req.content}")
+    def get(self, url, headers=None, endpoint: EndpointClass = EndpointClass.TRADING, priority: Priority = Priority.TRADING) -> dict | None:
+        return self.request("GET", url, headers=headers, endpoint=endpoint, priority=priority)
     
-    def post(self, url, payload, headers=None) -> dict | None:
+    def post(self, url, payload, headers=None, endpoint: EndpointClass = EndpointClass.TRADING, priority: Priority = Priority.ORDER) -> dict | None:
+        return self.request("POST", url, payload=payload, headers=headers, endpoint=endpoint, priority=priority)
+
+    def request(self, method: str, url: str, payload: dict = None, headers=None, endpoint: EndpointClass = EndpointClass.TRADING, priority: Priority = Priority.TRADING) -> dict | None:
         hdrs = headers if headers else self.headers
-        req = requests.post(url, json=payload, headers=hdrs)
-        if req.status_code == 200:
-            return json.loads(req.content)
-        else:
+        retry = 0
+        while True:
+            # raises RateLimitExceeded when the lane can't get a token in time
+            self.rate_limiter.acquire(endpoint, priority)
+            # a no-op unless a tick is being recorded or replayed, see common/recording.py
+            req = recording.http(method, url, lambda: self.session().request(method, url, json=payload, headers=hdrs), account=getattr(self, "account", None))
+
+            remaining = req.headers.get("X-RateLimit-Remaining", None)
+            if remaining is not None and remaining.isdigit():
+                self.rate_limiter.observe(endpoint, int(remaining))
+
+            if req.status_code == 200:
+                return json.loads(req.content)
+            # 429 means the request was not processed, so it is safe to retry (even orders)
+            if req.status_code == 429 and retry < self.MAX_RETRIES:
+                self.rate_limiter.penalize(endpoint, self.retry_after(req))
+                retry += 1
+                continue
             raise Exception(f"Error: {req.content}")
 
+    def retry_after(self, req) -> float:
+        retry_after = req.headers.get("Retry-After", None)
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        # alpaca sends the unix time the quota resets instead of retry-after
+        reset = req.headers.get("X-RateLimit-Reset", None)
+        if reset and reset.isdigit():
+            return max(int(reset) - time.time(), self.DEFAULT_RETRY_AFTER)
+        return self.DEFAULT_RETRY_AFTER
+
     @abstractmethod
     def create_order(self, payload: dict):
         pass
@@ -51,7 +113,8 @@ class TradingClient(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def process_sell(self) -> bool:
+    def snapshot(self, watchlists: list[Watchlist], lots: dict):
+        '''Builds the strategy.base.Snapshot a strategy evaluates.'''
         pass
 
     @abstractmethod
@@ -63,15 +126,16 @@ class TradingClient(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def process_buy(self) -> bool:
+    def execute(self, decision) -> bool:
+        '''Places the orders of a strategy.base.Decision.'''
         pass
-    
-    @abstractmethod
-    def process_rebuy(self, w: Watchlist):
+
+    def mark_exit_checked(self, snapshot):
+        '''Records how far the exits of the evaluated watchlists were checked, see AlpacaTradingClient.'''
         pass
 
     @abstractmethod
-    def sell(self, w: Watchlist, o: Order):
+    def sell(self, w: Watchlist, orders: list[Order]):
         pass    
 
     @abstractmethod